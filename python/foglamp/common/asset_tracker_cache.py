@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+"""Asset tracker events cache for the south and north processes"""
+
+import asyncio
+
+from foglamp.common import logger
+from foglamp.common.microservice_management_client.microservice_management_client import \
+    MicroserviceManagementClientAsync
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+_logger = logger.setup(__name__)
+
+_FLUSH_TIMEOUT = 10
+""" Maximum number of seconds stop() waits for the pending events to be registered """
+
+
+class AssetTrackerCache(object):
+    """ Set of the asset tracker events known to the core, keyed by (asset, event, service, plugin)
+
+    Events not yet in the set are queued and registered with the core in batches by a background task,
+    so that callers on the ingest and egress paths never wait on core I/O.
+    """
+
+    _BATCH_SIZE = 100
+    """ Maximum number of queued events registered by one flush """
+
+    def __init__(self, core_management_host, core_management_port):
+        self._management_client = MicroserviceManagementClientAsync(core_management_host, core_management_port)
+        self._events = set()
+        self._queue = asyncio.Queue()
+        self._flush_task = None
+
+    def load(self, events):
+        """ Adds the events already registered with the core
+
+        :param events: list of dict as returned by MicroserviceManagementClient.get_asset_tracker_events()['track']
+        """
+        for e in events:
+            self._events.add((e['asset'], e['event'], e['service'], e['plugin']))
+
+    def add(self, asset, event, service, plugin):
+        """ Queues the event for registration with the core, unless it is already known """
+        key = (asset, event, service, plugin)
+        if key in self._events:
+            return
+        self._events.add(key)
+        self._queue.put_nowait(key)
+
+    def start(self):
+        """ Starts the background task registering queued events """
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def stop(self):
+        """ Registers the pending events and stops the background task """
+        if self._flush_task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), _FLUSH_TIMEOUT)
+        except asyncio.TimeoutError:
+            _logger.warning('%d asset tracker events were not registered', self._queue.qsize())
+        self._flush_task.cancel()
+        self._flush_task = None
+
+    async def _register(self, batch):
+        """ Registers a batch of events with the core
+
+        :return: the events that could not be registered
+        """
+        failed = []
+        for asset, event, service, plugin in batch:
+            try:
+                await self._management_client.create_asset_tracker_event(
+                    {"asset": asset, "event": event, "service": service, "plugin": plugin})
+            except Exception as ex:
+                _logger.error('Unable to register asset tracker event %s for asset %s, %s', event, asset, str(ex))
+                failed.append((asset, event, service, plugin))
+        return failed
+
+    async def _flush(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self._BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                failed = await self._register(batch)
+                # Forget the failed ones, so that they are queued again the next time they are seen
+                self._events.difference_update(failed)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
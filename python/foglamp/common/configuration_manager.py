@@ -6,11 +6,13 @@
 
 from importlib import import_module
 from urllib.parse import urlparse
+from collections import OrderedDict
 import copy
 import json
 import inspect
 import ipaddress
 import datetime
+import time
 
 from foglamp.common.storage_client.payload_builder import PayloadBuilder
 from foglamp.common.storage_client.storage_client import StorageClientAsync
@@ -40,17 +42,35 @@ class ConfigurationCache(object):
 
     MAX_CACHE_SIZE = 10
 
-    def __init__(self):
+    TREE_TTL_SECONDS = 5
+    """ Seconds a category tree query is cached, the purge task and the backup create categories and children
+    straight in the storage layer without invalidating the cache """
+
+    def __init__(self, max_cache_size=MAX_CACHE_SIZE):
         """
-        cache: value stored in dictionary as per category_name
-        max_cache_size: Hold the 10 recently requested categories in the cache
+        cache: value stored in dictionary as per category_name, in least recently used order
+        max_cache_size: Hold the 10 (by default) recently requested categories in the cache
         hit: number of times an item is read from the cache
         miss: number of times an item was not found in the cache and a read of the storage layer was required
+        tree: (expiry, result) of the category tree queries, i.e. the children of a category and the groups of categories
+        tree_hit: number of times a category tree query is answered from the cache
+        tree_miss: number of times a category tree query required a read of the storage layer
         """
-        self.cache = {}
-        self.max_cache_size = self.MAX_CACHE_SIZE
+        self.cache = OrderedDict()
+        self.max_cache_size = max_cache_size
         self.hit = 0
         self.miss = 0
+        self.tree = {}
+        self.tree_hit = 0
+        self.tree_miss = 0
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, value):
+        self._cache = OrderedDict(value)
 
     def __contains__(self, category_name):
         """Returns True or False depending on whether or not the key is in the cache
@@ -63,6 +83,7 @@ class ConfigurationCache(object):
 
             self.hit += 1
             self.cache[category_name].update({'date_accessed': datetime.datetime.now(), 'hit': current_hit + 1})
+            self.cache.move_to_end(category_name)
             return True
         self.miss += 1
         return False
@@ -73,30 +94,71 @@ class ConfigurationCache(object):
             self.remove_oldest()
         display_name = category_name if display_name is None else display_name
         self.cache[category_name] = {'date_accessed': datetime.datetime.now(), 'value': category_val, 'displayName': display_name}
-        _logger.info("Updated Configuration Cache %s", self.cache)
+        self.cache.move_to_end(category_name)
+        _logger.debug("Updated Configuration Cache for %s, size %s", category_name, len(self.cache))
 
     def remove_oldest(self):
-        """Remove the entry that has the oldest accessed date"""
-        oldest_entry = None
-        for category_name in self.cache:
-            if oldest_entry is None:
-                oldest_entry = category_name
-            elif self.cache[category_name]['date_accessed'] < self.cache[oldest_entry]['date_accessed']:
-                oldest_entry = category_name
-        self.cache.pop(oldest_entry)
+        """Remove the least recently accessed entry"""
+        self.cache.popitem(last=False)
 
     def remove(self, key):
         """Remove the entry with given key name"""
-        for category_name in self.cache:
-            if key == category_name:
-                self.cache.pop(key)
-                break
+        self.cache.pop(key, None)
+
+    def resize(self, max_cache_size):
+        """Change the maximum number of categories in the cache, the least recently accessed entries are removed"""
+        self.max_cache_size = max_cache_size
+        while len(self.cache) > self.max_cache_size:
+            self.remove_oldest()
+
+    def get_tree(self, key):
+        """Return a copy of the cached result of a category tree query, or None if not cached or expired"""
+        if key in self.tree:
+            expiry, value = self.tree[key]
+            if time.monotonic() < expiry:
+                self.tree_hit += 1
+                return copy.deepcopy(value)
+            del self.tree[key]
+        self.tree_miss += 1
+        return None
+
+    def update_tree(self, key, value):
+        """Cache a copy of the result of a category tree query
+
+        key is ('child', category_name) for the children of a category or ('groups', root, children) for the groups
+        """
+        self.tree[key] = (time.monotonic() + self.TREE_TTL_SECONDS, copy.deepcopy(value))
+
+    def invalidate_tree(self, parent=None, category_name=None):
+        """Remove the cached category tree queries that a write may have changed
+
+        The groups are always removed, the children of parent and the children lists in which category_name
+        appears are removed too.
+        """
+        for key in list(self.tree):
+            if key[0] == 'groups':
+                del self.tree[key]
+            elif parent is not None and key[1] == parent:
+                del self.tree[key]
+            elif category_name is not None and any(c['key'] == category_name for c in self.tree[key][1]):
+                del self.tree[key]
 
     @property
     def size(self):
         """Return the size of the cache"""
         return len(self.cache)
 
+    @property
+    def stats(self):
+        """Return the size, hits and misses of the cache"""
+        return {'size': self.size,
+                'maxSize': self.max_cache_size,
+                'hit': self.hit,
+                'miss': self.miss,
+                'treeSize': len(self.tree),
+                'treeHit': self.tree_hit,
+                'treeMiss': self.tree_miss}
+
 
 class ConfigurationManagerSingleton(object):
     """ ConfigurationManagerSingleton
@@ -313,6 +375,7 @@ class ConfigurationManager(ConfigurationManagerSingleton):
             result = await self._storage.insert_into_tbl("configuration", payload)
             response = result['response']
             self._cacheManager.update(category_name, new_category_val, display_name)
+            self._cacheManager.invalidate_tree()
         except KeyError:
             raise ValueError(result['message'])
         except StorageServerError as ex:
@@ -332,6 +395,10 @@ class ConfigurationManager(ConfigurationManagerSingleton):
         return category_info
 
     async def _read_all_groups(self, root, children):
+        cached = self._cacheManager.get_tree(('groups', root, children))
+        if cached is not None:
+            return cached
+
         async def nested_children(child):
             # Recursively find children
             if not child:
@@ -370,9 +437,12 @@ class ConfigurationManager(ConfigurationManagerSingleton):
             for branch in tree:
                 await nested_children(branch)
 
+            self._cacheManager.update_tree(('groups', root, children), tree)
             return tree
 
-        return list_root if root else list_not_root
+        groups = list_root if root else list_not_root
+        self._cacheManager.update_tree(('groups', root, children), groups)
+        return groups
 
     async def _read_category_val(self, category_name):
         # SELECT configuration.key, configuration.description, configuration.value,
@@ -516,11 +586,9 @@ class ConfigurationManager(ConfigurationManagerSingleton):
             response = result['response']
             # Re-read category from DB
             new_category_val_db = await self._read_category_val(category_name)
-            if category_name in self._cacheManager.cache:
-                self._cacheManager.cache[category_name]['value'] = new_category_val_db
-                self._cacheManager.cache[category_name]['displayName'] = display_name
-            else:
-                self._cacheManager.cache.update({category_name: {"value": new_category_val_db, "displayName": display_name}})
+            self._cacheManager.update(category_name, new_category_val_db, display_name)
+            # The description and display name are part of the category tree
+            self._cacheManager.invalidate_tree(category_name=category_name)
         except KeyError:
             raise ValueError(result['message'])
         except StorageServerError as ex:
@@ -844,6 +912,10 @@ class ConfigurationManager(ConfigurationManagerSingleton):
         Return Values:
         JSON
         """
+        cached = self._cacheManager.get_tree(('child', category_name))
+        if cached is not None:
+            return cached
+
         category = await self._read_category_val(category_name)
         if category is None:
             raise ValueError('No such {} category exist'.format(category_name))
@@ -851,7 +923,9 @@ class ConfigurationManager(ConfigurationManagerSingleton):
         try:
             child_cat_names = await self._read_all_child_category_names(category_name)
             children = await self._read_child_info(child_cat_names)
-            return [{"key": c['key'], "description": c['description'], "displayName": c['display_name']} for c in children]
+            children = [{"key": c['key'], "description": c['description'], "displayName": c['display_name']} for c in children]
+            self._cacheManager.update_tree(('child', category_name), children)
+            return children
         except:
             _logger.exception(
                 'Unable to read all child category names')
@@ -894,6 +968,8 @@ class ConfigurationManager(ConfigurationManagerSingleton):
             for a_new_child in new_children:
                 result = await self._create_child(category_name, a_new_child)
                 children_from_storage.append(a_new_child)
+            if new_children:
+                self._cacheManager.invalidate_tree(parent=category_name)
 
             return {"children": children_from_storage}
 
@@ -928,6 +1004,7 @@ class ConfigurationManager(ConfigurationManagerSingleton):
         try:
             payload = PayloadBuilder().WHERE(["parent", "=", category_name]).AND_WHERE(["child", "=", child_category]).payload()
             result = await self._storage.delete_from_tbl("category_children", payload)
+            self._cacheManager.invalidate_tree(parent=category_name)
 
             if result['response'] == 'deleted':
                 child_dict = await self._read_all_child_category_names(category_name)
@@ -964,6 +1041,7 @@ class ConfigurationManager(ConfigurationManagerSingleton):
         try:
             payload = PayloadBuilder().WHERE(["parent", "=", category_name]).payload()
             result = await self._storage.delete_from_tbl("category_children", payload)
+            self._cacheManager.invalidate_tree(parent=category_name)
             response = result["response"]
             # TODO: Shall we write audit trail code entry here? log_code?
 
@@ -1036,6 +1114,7 @@ class ConfigurationManager(ConfigurationManagerSingleton):
             # Remove cat from cache
             if cat in self._cacheManager.cache:
                 self._cacheManager.remove(cat)
+            self._cacheManager.invalidate_tree(parent=cat, category_name=cat)
         except KeyError as ex:
             raise ValueError(ex)
         except StorageServerError as ex:
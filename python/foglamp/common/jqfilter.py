@@ -26,6 +26,9 @@ class JQFilter:
     def __init__(self):
         """Initialise the JQFilter"""
         self._logger = logger.setup("JQFilter")
+        self._filter_string = None
+        self._script = None
+        """ The filter compiled by the last transform, it is compiled again only when the filter changes """
 
     def transform(self, reading_block, filter_string):
         """
@@ -43,7 +46,11 @@ class JQFilter:
 
         """
         try:
-            return pyjq.all(filter_string, reading_block)
+            if self._script is None or filter_string != self._filter_string:
+                self._script = None
+                self._script = pyjq.compile(filter_string)
+                self._filter_string = filter_string
+            return self._script.all(reading_block)
         except TypeError as ex:
             self._logger.error("Invalid JSON passed, exception %s", str(ex))
             raise
@@ -6,9 +6,11 @@
 
 """ FogLAMP Logger """
 
+import atexit
 import sys
 import logging
-from logging.handlers import SysLogHandler
+import queue
+from logging.handlers import SysLogHandler, QueueHandler, QueueListener
 
 __author__ = "Praveen Garg"
 __copyright__ = "Copyright (c) 2017 OSIsoft, LLC"
@@ -24,11 +26,117 @@ r"""Send log entries to /var/log/syslog
 CONSOLE = 1
 """Send log entries to STDOUT"""
 
+QUEUE_SIZE = 10000
+"""Maximum number of log entries waiting to be sent when the logging is queued"""
+
+_queued = False
+"""Whether the log entries of the process are queued"""
+
+_queue_handlers = {}
+"""Queue handler per destination, once the logging is queued"""
+
+_listeners = []
+
+_loggers = {}
+"""Destination and handlers of the loggers configured by setup"""
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Puts the log entries in a bounded queue, the entries that do not fit are dropped and counted"""
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        # The traceback is already in the message
+        record.exc_text = None
+        return record
+
+
+class _Listener(QueueListener):
+    """Sends the log entries of a queue, the queue may be full when stopped"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def _handler(destination: int) -> logging.Handler:
+    if destination == SYSLOG:
+        handler = SysLogHandler(address='/dev/log')
+    elif destination == CONSOLE:
+        handler = logging.StreamHandler(sys.stdout)
+    else:
+        raise ValueError("Invalid destination {}".format(destination))
+
+    # TODO: Consider using %r with message when using syslog .. \n looks better than #
+    formatter = logging.Formatter(fmt='FogLAMP[%(process)d] %(levelname)s: %(module)s: %(name)s: %(message)s')
+
+    handler.setFormatter(formatter)
+    return handler
+
+
+def _queue_handler(destination: int) -> logging.Handler:
+    """Returns the queue handler of a destination, a background thread sends its log entries"""
+    if destination not in _queue_handlers:
+        queue_ = queue.Queue(QUEUE_SIZE)
+        listener = _Listener(queue_, _handler(destination))
+        listener.start()
+        if not _listeners:
+            atexit.register(shutdown)
+        _listeners.append(listener)
+        _queue_handlers[destination] = _DroppingQueueHandler(queue_)
+    return _queue_handlers[destination]
+
+
+def shutdown():
+    """Sends the log entries still in the queues and stops the background threads, then logs the number of entries
+    dropped, if any
+
+    Called at exit, a process ending with os._exit must call it first so that its last log entries are not lost.
+    """
+    for listener in _listeners:
+        listener.stop()
+        dropped = sum(handler.dropped for handler in _queue_handlers.values() if handler.queue is listener.queue)
+        if dropped:
+            record = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                       "%d log entries were dropped, the logging queue was full", (dropped,), None)
+            for handler in listener.handlers:
+                handler.handle(record)
+    _listeners.clear()
+
+
+def _enable_queue():
+    """Queues the log entries of the whole process, the loggers already configured by setup are switched to the queue"""
+    global _queued
+    _queued = True
+    for logger_name, (destination, handlers) in _loggers.items():
+        logger = logging.getLogger(logger_name)
+        for handler in handlers:
+            logger.removeHandler(handler)
+            handler.close()
+        handler = _queue_handler(destination)
+        logger.addHandler(handler)
+        _loggers[logger_name] = (destination, [handler])
+
+
+def dropped_records() -> int:
+    """Returns the number of log entries dropped because the queue was full"""
+    return sum(handler.dropped for handler in _queue_handlers.values())
+
 
 def setup(logger_name: str = None,
           destination: int = SYSLOG,
           level: int = logging.WARNING,
-          propagate: bool = False) -> logging.Logger:
+          propagate: bool = False,
+          queued: bool = False) -> logging.Logger:
     """Configures a `logging.Logger`_ object
 
     Once configured, a logger can also be retrieved via
@@ -54,6 +162,15 @@ def setup(logger_name: str = None,
                 - View with: ``tail -f /var/log/syslog | sed 's/#012/\n\t/g'``
             - CONSOLE: Send message to stdout
 
+        queued:
+            Whether to queue the log entries of the whole process, so that
+            logging does not block on the destination. Once set, every
+            logger of the process configured by setup puts the log entries
+            in a queue of at most QUEUE_SIZE entries, a background thread
+            sends them. The entries that do not fit are dropped, their
+            number is logged by shutdown(), see also dropped_records().
+            Defaults to False.
+
     Returns:
         A `logging.Logger`_ object
 
@@ -66,20 +183,23 @@ def setup(logger_name: str = None,
 
     logger = logging.getLogger(logger_name)
 
-    if destination == SYSLOG:
-        handler = SysLogHandler(address='/dev/log')
-    elif destination == CONSOLE:
-        handler = logging.StreamHandler(sys.stdout)
-    else:
-        raise ValueError("Invalid destination {}".format(destination))
+    if queued and not _queued:
+        _enable_queue()
 
-    # TODO: Consider using %r with message when using syslog .. \n looks better than #
-    formatter = logging.Formatter(fmt='FogLAMP[%(process)d] %(levelname)s: %(module)s: %(name)s: %(message)s')
+    if _queued:
+        if destination not in (SYSLOG, CONSOLE):
+            raise ValueError("Invalid destination {}".format(destination))
+        handler = _queue_handler(destination)
+    else:
+        handler = _handler(destination)
 
-    handler.setFormatter(formatter)
+    _, handlers = _loggers.get(logger_name, (destination, []))
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+        handlers.append(handler)
+    _loggers[logger_name] = (destination, handlers)
 
     logger.setLevel(level)
     logger.propagate = propagate
-    logger.addHandler(handler)
 
     return logger
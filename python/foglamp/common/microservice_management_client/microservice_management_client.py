@@ -4,9 +4,17 @@
 # See: http://foglamp.readthedocs.io/
 # FOGLAMP_END
 
+from abc import ABC, abstractmethod
+import asyncio
 import http.client
 import json
+import socket
+import time
 import urllib.parse
+import weakref
+
+import aiohttp
+
 from foglamp.common import logger
 from foglamp.common.microservice_management_client import exceptions as client_exceptions
 
@@ -17,12 +25,59 @@ __version__ = "${VERSION}"
 
 _logger = logger.setup(__name__)
 
+_TIMEOUT = 30
+""" Seconds to wait for the core to answer a request """
 
-class MicroserviceManagementClient(object):
-    _management_client_conn = None
+_MAX_ATTEMPTS = 3
+""" Attempts made for a request when the connection to the core fails """
 
-    def __init__(self, microservice_management_host, microservice_management_port):
-        self._management_client_conn = http.client.HTTPConnection("{0}:{1}".format(microservice_management_host, microservice_management_port))
+_RETRY_WAIT = 0.5
+""" Seconds to wait before the second attempt, doubled at every further attempt """
+
+_IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')
+""" Methods retried after a timeout too, a timed out POST may have been applied by the core """
+
+
+class _MicroserviceManagementApi(ABC):
+    """ Requests of the core microservice management API
+
+    Every request is made by _call, which returns the response as a dict in the synchronous client and a coroutine
+    returning it in the asynchronous one.
+    """
+
+    @abstractmethod
+    def _call(self, method, url, body=None, check=None):
+        pass
+
+    @staticmethod
+    def _check_status(status, reason):
+        if status in range(400, 500):
+            _logger.error("Client error code: %d, Reason: %s", status, reason)
+            raise client_exceptions.MicroserviceManagementClientError(status=status, reason=reason)
+        if status in range(500, 600):
+            _logger.error("Server error code: %d, Reason: %s", status, reason)
+            raise client_exceptions.MicroserviceManagementClientError(status=status, reason=reason)
+
+    @staticmethod
+    def _check_response(response, check):
+        """ Ensures the response has the key given by check, as (key, message, message arguments), if any """
+        if check is None:
+            return
+        key, message, args = check
+        try:
+            response[key]
+        except (KeyError, Exception) as ex:
+            _logger.exception(message, *args, str(ex))
+            raise
+
+    @staticmethod
+    def _is_retryable(method, ex, attempt):
+        if attempt >= _MAX_ATTEMPTS:
+            return False
+        if method not in _IDEMPOTENT_METHODS and isinstance(ex, (socket.timeout, asyncio.TimeoutError)):
+            return False
+        _logger.warning("%s request to core failed, attempt %d of %d: %s", method, attempt, _MAX_ATTEMPTS, str(ex))
+        return True
 
     def register_service(self, service_registration_payload):
         """ Registers a newly created microservice with the core service
@@ -36,25 +91,20 @@ class MicroserviceManagementClient(object):
         :return: a JSON object containing the UUID of the newly registered service
         """
         url = '/foglamp/service'
+        payload = json.dumps(service_registration_payload)
+        return self._call('POST', url, payload,
+                          check=('id', "Could not register the microservice, From request %s, Reason: %s", (payload,)))
 
-        self._management_client_conn.request(method='POST', url=url, body=json.dumps(service_registration_payload))
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        try:
-            response["id"]
-        except (KeyError, Exception) as ex:
-            _logger.exception("Could not register the microservice, From request %s, Reason: %s", json.dumps(service_registration_payload), str(ex))
-            raise
+    def bootstrap(self, bootstrap_payload):
+        """ Applies the categories, children and interests a microservice declares at start-up in a single request
 
-        return response
+        :param bootstrap_payload: A dict object with the "categories" to create, the "children" to add, the
+        "service" to register, the "interests" to register for it or for "service_id" and whether to return the
+        asset "track" events
+        :return: a JSON object with the resolved "categories" by name and the results of the other requests
+        """
+        url = '/foglamp/service/bootstrap'
+        return self._call('POST', url, json.dumps(bootstrap_payload))
 
     def unregister_service(self, microservice_id):
         """ Removes the registration record for a microservice
@@ -67,26 +117,9 @@ class MicroserviceManagementClient(object):
         :return: a JSON object containing the UUID of the unregistered service
         """
         url = '/foglamp/service/{}'.format(microservice_id)
-
-        self._management_client_conn.request(method='DELETE', url=url)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        try:
-            response["id"]
-        except (KeyError, Exception) as ex:
-            _logger.exception("Could not unregister the micro-service having uuid %s, Reason: %s",
-                              microservice_id, str(ex))
-            raise
-
-        return response
+        return self._call('DELETE', url,
+                          check=('id', "Could not unregister the micro-service having uuid %s, Reason: %s",
+                                 (microservice_id,)))
 
     def register_interest(self, category, microservice_id):
         """ Register an interest of microservice in a configuration category
@@ -95,29 +128,10 @@ class MicroserviceManagementClient(object):
         :param microservice_id: microservice's UUID string
         :return: A JSON object containing a registration ID for this registration
         """
-
         url = '/foglamp/interest'
-
         payload = json.dumps({"category": category, "service": microservice_id}, sort_keys=True)
-        self._management_client_conn.request(method='POST', url=url, body=payload)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        try:
-            response["id"]
-        except (KeyError, Exception) as ex:
-            _logger.exception("Could not register interest, for request payload %s, Reason: %s",
-                              payload, str(ex))
-            raise
-
-        return response
+        return self._call('POST', url, payload,
+                          check=('id', "Could not register interest, for request payload %s, Reason: %s", (payload,)))
 
     def unregister_interest(self, registered_interest_id):
         """ Remove a previously registered interest in a configuration category
@@ -126,25 +140,8 @@ class MicroserviceManagementClient(object):
         :return: A JSON object containing the unregistered interest id
         """
         url = '/foglamp/interest/{}'.format(registered_interest_id)
-
-        self._management_client_conn.request(method='DELETE', url=url)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        try:
-            response["id"]
-        except (KeyError, Exception) as ex:
-            _logger.exception("Could not unregister interest for %s, Reason: %s", registered_interest_id, str(ex))
-            raise
-
-        return response
+        return self._call('DELETE', url,
+                          check=('id', "Could not unregister interest for %s, Reason: %s", (registered_interest_id,)))
 
     def get_services(self, service_name=None, service_type=None):
         """ Retrieve the details of one or more services that are registered
@@ -161,24 +158,9 @@ class MicroserviceManagementClient(object):
         if service_type:
             url = '{}{}type={}'.format(url, delimeter, service_type)
 
-        self._management_client_conn.request(method='GET', url=url)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        try:
-            response["services"]
-        except (KeyError, Exception) as ex:
-            _logger.exception("Could not find the micro-service for requested url %s, Reason: %s", url, str(ex))
-            raise
-
-        return response
+        return self._call('GET', url,
+                          check=('services', "Could not find the micro-service for requested url %s, Reason: %s",
+                                 (url,)))
 
     def get_configuration_category(self, category_name=None):
         """
@@ -191,18 +173,7 @@ class MicroserviceManagementClient(object):
         if category_name:
             url = "{}/{}".format(url, urllib.parse.quote(category_name))
 
-        self._management_client_conn.request(method='GET', url=url)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        return response
+        return self._call('GET', url)
 
     def get_configuration_item(self, category_name, config_item):
         """
@@ -212,19 +183,7 @@ class MicroserviceManagementClient(object):
         :return:
         """
         url = "/foglamp/service/category/{}/{}".format(urllib.parse.quote(category_name), urllib.parse.quote(config_item))
-
-        self._management_client_conn.request(method='GET', url=url)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        return response
+        return self._call('GET', url)
 
     def create_configuration_category(self, category_data):
         """
@@ -240,18 +199,7 @@ class MicroserviceManagementClient(object):
         else:
             url = '/foglamp/service/category'
 
-        self._management_client_conn.request(method='POST', url=url, body=json.dumps(data))
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        return response
+        return self._call('POST', url, json.dumps(data))
 
     def create_child_category(self, parent, children):
         """
@@ -261,19 +209,7 @@ class MicroserviceManagementClient(object):
         """
         data = {"children": children}
         url = '/foglamp/service/category/{}/children'.format(urllib.parse.quote(parent))
-
-        self._management_client_conn.request(method='POST', url=url, body=json.dumps(data))
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        return response
+        return self._call('POST', url, json.dumps(data))
 
     def update_configuration_item(self, category_name, config_item, category_data):
         """
@@ -284,19 +220,7 @@ class MicroserviceManagementClient(object):
         :return:
         """
         url = "/foglamp/service/category/{}/{}".format(urllib.parse.quote(category_name), urllib.parse.quote(config_item))
-
-        self._management_client_conn.request(method='PUT', url=url, body=category_data)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        return response
+        return self._call('PUT', url, category_data)
 
     def delete_configuration_item(self, category_name, config_item):
         """
@@ -306,34 +230,11 @@ class MicroserviceManagementClient(object):
         :return:
         """
         url = "/foglamp/service/category/{}/{}/value".format(urllib.parse.quote(category_name), urllib.parse.quote(config_item))
-
-        self._management_client_conn.request(method='DELETE', url=url)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        return response
+        return self._call('DELETE', url)
 
     def get_asset_tracker_events(self):
         url = '/foglamp/track'
-        self._management_client_conn.request(method='GET', url=url)
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
-        response = json.loads(res)
-        return response
+        return self._call('GET', url)
 
     def create_asset_tracker_event(self, asset_event):
         """
@@ -343,15 +244,87 @@ class MicroserviceManagementClient(object):
         :return:
         """
         url = '/foglamp/track'
-        self._management_client_conn.request(method='POST', url=url, body=json.dumps(asset_event))
-        r = self._management_client_conn.getresponse()
-        if r.status in range(400, 500):
-            _logger.error("Client error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        if r.status in range(500, 600):
-            _logger.error("Server error code: %d, Reason: %s", r.status, r.reason)
-            raise client_exceptions.MicroserviceManagementClientError(status=r.status, reason=r.reason)
-        res = r.read().decode()
-        self._management_client_conn.close()
+        return self._call('POST', url, json.dumps(asset_event))
+
+
+class MicroserviceManagementClient(_MicroserviceManagementApi):
+    """ Blocking client of the core management API, for the callers not running on an event loop
+
+    Coroutines must use MicroserviceManagementClientAsync, a call of this client blocks the event loop.
+    """
+    _management_client_conn = None
+
+    def __init__(self, microservice_management_host, microservice_management_port):
+        # The connection is kept open between the requests, http.client reopens it when the core closed it
+        self._management_client_conn = http.client.HTTPConnection(
+            "{0}:{1}".format(microservice_management_host, microservice_management_port), timeout=_TIMEOUT)
+
+    def _call(self, method, url, body=None, check=None):
+        attempt = 1
+        while True:
+            try:
+                if body is None:
+                    self._management_client_conn.request(method=method, url=url)
+                else:
+                    self._management_client_conn.request(method=method, url=url, body=body)
+                r = self._management_client_conn.getresponse()
+                # The body is read on errors too, the connection can only be reused once the response is consumed
+                res = r.read().decode()
+                self._check_status(r.status, r.reason)
+                break
+            except (ConnectionError, http.client.HTTPException, socket.timeout) as ex:
+                self._management_client_conn.close()
+                if not self._is_retryable(method, ex, attempt):
+                    raise
+                time.sleep(_RETRY_WAIT * 2 ** (attempt - 1))
+                attempt += 1
+        response = json.loads(res)
+        self._check_response(response, check)
+        return response
+
+
+class MicroserviceManagementClientAsync(_MicroserviceManagementApi):
+    """ asyncio client of the core management API, with the same methods as MicroserviceManagementClient """
+
+    _sessions = weakref.WeakKeyDictionary()
+    """ Keep-alive aiohttp.ClientSession per event loop, shared by all the management clients of a process """
+
+    def __init__(self, microservice_management_host, microservice_management_port):
+        self._base_url = 'http://{0}:{1}'.format(microservice_management_host, microservice_management_port)
+
+    @classmethod
+    def _get_session(cls):
+        """ Return the session bound to the running event loop, creating it on first use """
+        loop = asyncio.get_event_loop()
+        session = cls._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(loop=loop),
+                                            timeout=aiohttp.ClientTimeout(total=_TIMEOUT), loop=loop)
+            cls._sessions[loop] = session
+        return session
+
+    @classmethod
+    async def close_session(cls):
+        """ Close the session bound to the running event loop, if any """
+        loop = asyncio.get_event_loop()
+        session = cls._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def _call(self, method, url, body=None, check=None):
+        session = self._get_session()
+        attempt = 1
+        while True:
+            try:
+                async with session.request(method, self._base_url + url, data=body) as resp:
+                    self._check_status(resp.status, resp.reason)
+                    res = await resp.text()
+                break
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as ex:
+                if not self._is_retryable(method, ex, attempt):
+                    raise
+                await asyncio.sleep(_RETRY_WAIT * 2 ** (attempt - 1))
+                attempt += 1
         response = json.loads(res)
+        self._check_response(response, check)
         return response
@@ -11,7 +11,8 @@ import argparse
 import time
 from foglamp.common.storage_client.storage_client import StorageClientAsync, ReadingsStorageClientAsync
 from foglamp.common import logger
-from foglamp.common.microservice_management_client.microservice_management_client import MicroserviceManagementClient
+from foglamp.common.microservice_management_client.microservice_management_client import MicroserviceManagementClient, \
+    MicroserviceManagementClientAsync
 
 __author__ = "Ashwin Gopalakrishnan, Amarendra K Sinha"
 __copyright__ = "Copyright (c) 2017 OSIsoft, LLC"
@@ -57,6 +58,9 @@ class FoglampProcess(ABC):
     _core_microservice_management_client = None
     """ MicroserviceManagementClient instance """
 
+    _core_microservice_management_client_async = None
+    """ MicroserviceManagementClientAsync instance, to be used by coroutines """
+
     _readings_storage_async = None
     """ foglamp.common.storage_client.storage_client.ReadingsStorageClientAsync """
 
@@ -90,6 +94,8 @@ class FoglampProcess(ABC):
             raise ValueError("--name is not specified")
 
         self._core_microservice_management_client = MicroserviceManagementClient(self._core_management_host,self._core_management_port)
+        self._core_microservice_management_client_async = MicroserviceManagementClientAsync(
+            self._core_management_host, self._core_management_port)
 
         self._readings_storage_async = ReadingsStorageClientAsync(self._core_management_host, self._core_management_port)
         self._storage_async = StorageClientAsync(self._core_management_host, self._core_management_port)
@@ -118,6 +124,15 @@ class FoglampProcess(ABC):
         parser = SilentArgParse()
         return parser.silent_arg_parse(argument_name)
         
+    async def close_storage_connections(self):
+        """ Closes the pooled keep-alive connections shared by the storage clients, and the one of the async core
+        management client, of this process
+
+        Must be awaited on the process event loop before it is stopped.
+        """
+        await StorageClientAsync.close_session()
+        await MicroserviceManagementClientAsync.close_session()
+
     def get_services_from_core(self, name=None, _type=None):
         return self._core_microservice_management_client.get_services(name, _type)
 
@@ -4,9 +4,12 @@
 # See: http://foglamp.readthedocs.io/
 # FOGLAMP_END
 
+import asyncio
 import json
+import aiohttp
 from foglamp.common import logger
 from foglamp.common.storage_client.payload_builder import PayloadBuilder
+from foglamp.common.storage_client.exceptions import StorageServerError
 from foglamp.common.storage_client.storage_client import StorageClientAsync
 
 
@@ -18,6 +21,9 @@ __version__ = "${VERSION}"
 
 _logger = logger.setup(__name__)
 
+_DEFERRED_WRITES_INTERVAL_SECONDS = 1
+_DEFERRED_WRITES_MAX_KEYS = 100
+
 
 async def create_statistics(storage=None):
     stat = Statistics(storage)
@@ -38,6 +44,12 @@ class Statistics(object):
     _registered_keys = None
     """ Set of keys already in the storage tables """
 
+    _pending = None
+    """ Increments per key not yet written to the storage, when the writes are deferred """
+
+    _flush_task = None
+    _flush_needed = None
+
     def __init__(self, storage=None):
         self.__dict__ = self._shared_state
         if self._storage is None:
@@ -49,6 +61,90 @@ class Statistics(object):
         if self._registered_keys is None:
             await self._load_keys()
 
+    def start_deferred_writes(self):
+        """ Defers the writes of update, update_bulk and add_update
+
+        The increments are added up per key in memory and written with one bulk update every
+        _DEFERRED_WRITES_INTERVAL_SECONDS, or as soon as _DEFERRED_WRITES_MAX_KEYS keys are pending.
+        """
+        if self._flush_task is not None:
+            return
+        self._pending = {}
+        self._flush_needed = asyncio.Event()
+        self._flush_task = asyncio.ensure_future(self._flush_pending_loop())
+
+    async def stop_deferred_writes(self):
+        """ Writes the pending increments and stops deferring the writes """
+        if self._flush_task is None:
+            return
+        self._flush_task.cancel()
+        try:
+            await self._flush_task
+        except asyncio.CancelledError:
+            pass
+        self._flush_task = None
+        await self.flush()
+        self._pending = None
+
+    async def _defer(self, stat_list):
+        unknown_keys = [k for k in stat_list if k not in self._registered_keys]
+        if unknown_keys:
+            # The keys may have been registered by another process since they were loaded
+            await self._load_keys()
+            for key in unknown_keys:
+                if key not in self._registered_keys:
+                    _logger.error('Statistics key %s has not been registered', key)
+                    raise KeyError(key)
+        for k, v in stat_list.items():
+            self._pending[k] = self._pending.get(k, 0) + v
+        if len(self._pending) >= _DEFERRED_WRITES_MAX_KEYS:
+            self._flush_needed.set()
+
+    async def flush(self):
+        """ Writes the pending increments with one bulk update
+
+        The increments are taken before the write and added back when the update has surely not been
+        applied: the connection to the storage was refused, or the storage replied with an error, as it
+        runs the updates in a single transaction. After a failure once the request was sent, like a
+        disconnection or a timeout, the update may have been applied and the increments are dropped
+        rather than counted twice.
+        """
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = {}
+        try:
+            await self._update_bulk(pending)
+        except (aiohttp.ClientConnectorError, StorageServerError) as ex:
+            for k, v in pending.items():
+                self._pending[k] = self._pending.get(k, 0) + v
+            if isinstance(ex, StorageServerError):
+                # A key removed from the storage since it was registered would fail every flush
+                await self._load_keys()
+                if self._registered_keys:
+                    for key in [k for k in self._pending if k not in self._registered_keys]:
+                        _logger.error('Dropped the increments of the statistics key %s, not registered anymore', key)
+                        del self._pending[key]
+            raise
+        except Exception:
+            _logger.error('Dropped the statistics increments %s', pending)
+            raise
+
+    async def _flush_pending_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), _DEFERRED_WRITES_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Already logged by flush
+                pass
+
     async def update_bulk(self, stat_list):
         """ Bulk update statistics table keys and their values
 
@@ -61,6 +157,13 @@ class Statistics(object):
         if not isinstance(stat_list, dict):
             raise TypeError('stat_list must be a dict')
 
+        if self._flush_task is not None:
+            await self._defer(stat_list)
+            return
+
+        await self._update_bulk(stat_list)
+
+    async def _update_bulk(self, stat_list):
         try:
             payload = {"updates": []}
             for k, v in stat_list.items():
@@ -90,6 +193,10 @@ class Statistics(object):
         if not isinstance(value_increment, int):
             raise ValueError('value must be an integer')
 
+        if self._flush_task is not None:
+            await self._defer({key: value_increment})
+            return
+
         try:
             payload = PayloadBuilder()\
                 .WHERE(["key", "=", key])\
@@ -111,6 +218,10 @@ class Statistics(object):
         Returns:
             None
         """
+        if self._flush_task is not None:
+            await self._defer(sensor_stat_dict)
+            return
+
         for key, value_increment in sensor_stat_dict.items():
             # Try updating the statistics value for given key
             try:
@@ -139,7 +250,7 @@ class Statistics(object):
         try:
             payload = PayloadBuilder().INSERT(key=key, description=description, value=0, previous_value=0).payload()
             await self._storage.insert_into_tbl("statistics", payload)
-            self._registered_keys.append(key)
+            self._registered_keys.add(key)
         except Exception as ex:
             """ The error may be because the key has been created in another process, reload keys """
             await self._load_keys()
@@ -148,11 +259,11 @@ class Statistics(object):
                 raise
 
     async def _load_keys(self):
-        self._registered_keys = []
+        self._registered_keys = set()
         try:
             payload = PayloadBuilder().SELECT("key").payload()
             results = await self._storage.query_tbl_with_payload('statistics', payload)
             for row in results['rows']:
-                self._registered_keys.append(row['key'])
+                self._registered_keys.add(row['key'])
         except Exception as ex:
             _logger.exception('Failed to retrieve statistics keys, %s', str(ex))
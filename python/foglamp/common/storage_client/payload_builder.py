@@ -124,22 +124,27 @@ class PayloadBuilder(object):
                 elif 'column' in qp_list[i] and qp_list[i]['column'] == col:
                     qp_list[i][clause] = clause_value
 
+    @staticmethod
+    def is_aggregate_col(item, col, opr):
+        """ col is either a column name or a [column, properties] list to match a single json property """
+        if item['operation'] != opr:
+            return False
+        if 'json' in item:
+            if isinstance(col, list):
+                return item['json']['column'] == col[0] and item['json']['properties'] == col[1]
+            return item['json']['column'] == col
+        return item['column'] == col
+
     @classmethod
     def add_clause_to_aggregate(cls, clause, qp_list, col, opr, clause_value):
         if isinstance(qp_list, dict):
-            if 'json' in qp_list:
-                if qp_list['json']['column'] == col and qp_list['operation'] == opr:
-                    qp_list[clause] = clause_value
-            elif qp_list['column'] == col and qp_list['operation'] == opr:
+            if cls.is_aggregate_col(qp_list, col, opr):
                 qp_list[clause] = clause_value
 
         if isinstance(qp_list, list):
             for i, item in enumerate(qp_list):
                 if isinstance(item, dict):
-                    if 'json' in qp_list[i]:
-                        if qp_list[i]['json']['column'] == col and qp_list[i]['operation'] == opr:
-                            qp_list[i][clause] = clause_value
-                    elif qp_list[i]['column'] == col and qp_list[i]['operation'] == opr:
+                    if cls.is_aggregate_col(qp_list[i], col, opr):
                         qp_list[i][clause] = clause_value
 
     @classmethod
@@ -202,6 +207,7 @@ class PayloadBuilder(object):
         :param args: each arg is a tuple. The len of tuple depends upon main_key. If main_key is "return" i.e. SELECT,
                      then each tuple will contain (col, alias). If main_key is "aggregate", then each tuple will contain
                      (col, operation, alias) because col can be repeated in aggregate with different "operations".
+                     For a json col in aggregate, col can be given as [col, properties] to alias one property only.
         :return:
         :example:
         PayloadBuilder().SELECT(("name", "id")).ALIAS('return', ('name', 'my_name'), ('id', 'my_id')).payload() returns
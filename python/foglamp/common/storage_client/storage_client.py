@@ -13,8 +13,10 @@ __license__ = "Apache 2.0"
 __version__ = "${VERSION}"
 
 import aiohttp
+import asyncio
 import http.client
 import json
+import weakref
 from abc import ABC, abstractmethod
 
 from foglamp.common import logger
@@ -48,6 +50,46 @@ class AbstractStorage(ABC):
 
 
 class StorageClientAsync(AbstractStorage):
+
+    _sessions = weakref.WeakKeyDictionary()
+    """ Pooled keep-alive aiohttp.ClientSession per event loop, shared by all storage clients of a process """
+
+    _pool_config = {
+        # Maximum number of simultaneous connections to the storage service
+        'limit': 100,
+        # Maximum number of simultaneous connections to the same endpoint, 0 means no limit
+        'limit_per_host': 0,
+        # Seconds an idle connection is kept open for reuse
+        'keepalive_timeout': 30
+    }
+
+    POOL_CATEGORY = 'STORAGE_POOL'
+    """ Configuration category of the connection pool, read at start-up by the core and the microservices """
+
+    POOL_CATEGORY_CONFIG = {
+        'limit': {
+            'description': 'Maximum number of simultaneous connections to the storage service',
+            'type': 'integer',
+            'default': '100',
+            'displayName': 'Connection Limit',
+            'order': '1'
+        },
+        'limitPerHost': {
+            'description': 'Maximum number of simultaneous connections to the same endpoint, 0 for no limit',
+            'type': 'integer',
+            'default': '0',
+            'displayName': 'Connection Limit Per Endpoint',
+            'order': '2'
+        },
+        'keepaliveTimeout': {
+            'description': 'Seconds an idle connection is kept open for reuse',
+            'type': 'float',
+            'default': '30',
+            'displayName': 'Keep-alive Timeout',
+            'order': '3'
+        }
+    }
+
     def __init__(self, core_management_host, core_management_port, svc=None):
         try:
             if svc:
@@ -119,6 +161,52 @@ class StorageClientAsync(AbstractStorage):
     def disconnect(self):
         pass
 
+    @classmethod
+    def set_connection_pool(cls, limit=None, limit_per_host=None, keepalive_timeout=None):
+        """ Configure the connection pool used for the sessions created after this call
+
+        :param limit: maximum number of simultaneous connections
+        :param limit_per_host: maximum number of simultaneous connections to the same endpoint, 0 for no limit
+        :param keepalive_timeout: seconds an idle connection is kept open for reuse
+        """
+        if limit is not None:
+            StorageClientAsync._pool_config['limit'] = int(limit)
+        if limit_per_host is not None:
+            StorageClientAsync._pool_config['limit_per_host'] = int(limit_per_host)
+        if keepalive_timeout is not None:
+            StorageClientAsync._pool_config['keepalive_timeout'] = float(keepalive_timeout)
+
+    @classmethod
+    def configure_connection_pool(cls, config):
+        """ Configure the connection pool from the items of the POOL_CATEGORY configuration category
+
+        :param config: the category, as returned by the configuration manager
+        """
+        cls.set_connection_pool(limit=config['limit']['value'], limit_per_host=config['limitPerHost']['value'],
+                                keepalive_timeout=config['keepaliveTimeout']['value'])
+
+    @classmethod
+    def _get_session(cls):
+        """ Return the pooled session bound to the running event loop, creating it on first use """
+        loop = asyncio.get_event_loop()
+        session = StorageClientAsync._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=StorageClientAsync._pool_config['limit'],
+                                             limit_per_host=StorageClientAsync._pool_config['limit_per_host'],
+                                             keepalive_timeout=StorageClientAsync._pool_config['keepalive_timeout'],
+                                             loop=loop)
+            session = aiohttp.ClientSession(connector=connector, loop=loop)
+            StorageClientAsync._sessions[loop] = session
+        return session
+
+    @classmethod
+    async def close_session(cls):
+        """ Close the pooled session bound to the running event loop, if any """
+        loop = asyncio.get_event_loop()
+        session = StorageClientAsync._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+
     # FIXME: As per JIRA-615 strict=false at python side (interim solution)
     # fix is required at storage layer (error message with escape sequence using a single quote)
     async def insert_into_tbl(self, tbl_name, data):
@@ -149,14 +237,14 @@ class StorageClientAsync(AbstractStorage):
 
         post_url = '/storage/table/{tbl_name}'.format(tbl_name=tbl_name)
         url = 'http://' + self.base_url + post_url
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=data) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.info("POST %s, with payload: %s", post_url, data)
-                    _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.post(url, data=data) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.info("POST %s, with payload: %s", post_url, data)
+                _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
 
@@ -193,14 +281,14 @@ class StorageClientAsync(AbstractStorage):
         put_url = '/storage/table/{tbl_name}'.format(tbl_name=tbl_name)
 
         url = 'http://' + self.base_url + put_url
-        async with aiohttp.ClientSession() as session:
-            async with session.put(url, data=data) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.info("PUT %s, with payload: %s", put_url, data)
-                    _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.put(url, data=data) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.info("PUT %s, with payload: %s", put_url, data)
+                _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
 
@@ -230,14 +318,14 @@ class StorageClientAsync(AbstractStorage):
             raise TypeError("condition payload must be a valid JSON")
 
         url = 'http://' + self.base_url + del_url
-        async with aiohttp.ClientSession() as session:
-            async with session.delete(url, data=condition) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.info("DELETE %s, with payload: %s", del_url, condition if condition else '')
-                    _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.delete(url, data=condition) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.info("DELETE %s, with payload: %s", del_url, condition if condition else '')
+                _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
 
@@ -261,14 +349,14 @@ class StorageClientAsync(AbstractStorage):
             get_url += '?{}'.format(query)
 
         url = 'http://' + self.base_url + get_url
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.info("GET %s", get_url)
-                    _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.get(url) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.info("GET %s", get_url)
+                _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
 
@@ -300,14 +388,14 @@ class StorageClientAsync(AbstractStorage):
         put_url = '/storage/table/{tbl_name}/query'.format(tbl_name=tbl_name)
 
         url = 'http://' + self.base_url + put_url
-        async with aiohttp.ClientSession() as session:
-            async with session.put(url, data=query_payload) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.info("PUT %s, with query payload: %s", put_url, query_payload)
-                    _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.put(url, data=query_payload) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.info("PUT %s, with query payload: %s", put_url, query_payload)
+                _LOGGER.error("Error code: %d, reason: %s, details: %s", resp.status, resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
 
@@ -354,14 +442,14 @@ class ReadingsStorageClientAsync(StorageClientAsync):
             raise TypeError("Readings payload must be a valid JSON")
 
         url = 'http://' + self._base_url + '/storage/reading'
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=readings) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.error("POST url %s with payload: %s, Error code: %d, reason: %s, details: %s",
-                                  '/storage/reading', readings, resp.status, resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.post(url, data=readings) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.error("POST url %s with payload: %s, Error code: %d, reason: %s, details: %s",
+                              '/storage/reading', readings, resp.status, resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
 
@@ -389,14 +477,14 @@ class ReadingsStorageClientAsync(StorageClientAsync):
 
         get_url = '/storage/reading?id={}&count={}'.format(reading_id, count)
         url = 'http://' + self._base_url + get_url
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.error("GET url: %s, Error code: %d, reason: %s, details: %s", url, resp.status,
-                                  resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.get(url) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.error("GET url: %s, Error code: %d, reason: %s, details: %s", url, resp.status,
+                              resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
 
@@ -425,14 +513,14 @@ class ReadingsStorageClientAsync(StorageClientAsync):
             raise TypeError("Query payload must be a valid JSON")
 
         url = 'http://' + self._base_url + '/storage/reading/query'
-        async with aiohttp.ClientSession() as session:
-            async with session.put(url, data=query_payload) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.error("PUT url %s with query payload: %s, Error code: %d, reason: %s, details: %s",
-                                  '/storage/reading/query', query_payload, resp.status, resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.put(url, data=query_payload) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.error("PUT url %s with query payload: %s, Error code: %d, reason: %s, details: %s",
+                              '/storage/reading/query', query_payload, resp.status, resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
 
@@ -484,13 +572,13 @@ class ReadingsStorageClientAsync(StorageClientAsync):
             put_url += "&flags={}".format(flag.lower())
 
         url = 'http://' + self._base_url + put_url
-        async with aiohttp.ClientSession() as session:
-            async with session.put(url, data=None) as resp:
-                status_code = resp.status
-                jdoc = await resp.json()
-                if status_code not in range(200, 209):
-                    _LOGGER.error("PUT url %s, Error code: %d, reason: %s, details: %s", put_url, resp.status,
-                                  resp.reason, jdoc)
-                    raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
+        session = self._get_session()
+        async with session.put(url, data=None) as resp:
+            status_code = resp.status
+            jdoc = await resp.json()
+            if status_code not in range(200, 209):
+                _LOGGER.error("PUT url %s, Error code: %d, reason: %s, details: %s", put_url, resp.status,
+                              resp.reason, jdoc)
+                raise StorageServerError(code=resp.status, reason=resp.reason, error=jdoc)
 
         return jdoc
@@ -9,6 +9,7 @@
 """
 
 import asyncio
+import functools
 
 from foglamp.common.configuration_manager import ConfigurationManager
 
@@ -41,10 +42,15 @@ MESSAGES_LIST = {
                "- status code |{0}| - error details |{1}|",
 }
 
+_CONVERTED_STRINGS_CACHE_SIZE = 4096
+""" Max number of string values kept with their conversion by convert_to_type """
+
 
 def convert_to_type(value):
     """Evaluates and converts to the type in relation to its actual value, for example "180.2" to float 180.2
 
+    Values already int or float are returned as they are, the conversions of the strings are cached.
+
      Args:
         value : value to evaluate and convert
      Returns:
@@ -52,6 +58,30 @@ def convert_to_type(value):
      Raises:
      """
 
+    value_type = type(value)
+
+    if value_type is float or value_type is int:
+        value_converted = value
+
+    elif value_type is str:
+        value_converted = _convert_string_to_type(value)
+
+    else:
+        value_converted = _convert_to_type(value)
+
+    return value_converted
+
+
+@functools.lru_cache(maxsize=_CONVERTED_STRINGS_CACHE_SIZE)
+def _convert_string_to_type(value):
+    """Converts a string using _convert_to_type, the results are cached as the same values are often repeated """
+
+    return _convert_to_type(value)
+
+
+def _convert_to_type(value):
+    """Evaluates and converts to the type in relation to its actual value, see convert_to_type """
+
     value_type = evaluate_type(value)
 
     if value_type == "string":
@@ -160,6 +160,18 @@ _CONFIG_DEFAULT_OMF = {
         "default": "5",
         "order": "10"
     },
+    "OMFMaxReadingsPerMessage": {
+        "description": "Max number of readings in an OMF Data message, larger blocks are sent using several messages",
+        "type": "integer",
+        "default": "1000",
+        "order": "11"
+    },
+    "OMFMaxConnections": {
+        "description": "Max number of simultaneous connections kept open with the OMF PI Connector Relay",
+        "type": "integer",
+        "default": "2",
+        "order": "12"
+    },
     "OMFHttpTimeout": {
         "description": "Timeout in seconds for the HTTP operations with the OMF PI Connector Relay",
         "type": "integer",
@@ -383,6 +395,8 @@ def plugin_init(data):
     _config['OMFMaxRetry'] = int(data['OMFMaxRetry']['value'])
     _config['OMFRetrySleepTime'] = int(data['OMFRetrySleepTime']['value'])
     _config['OMFHttpTimeout'] = int(data['OMFHttpTimeout']['value'])
+    _config['OMFMaxReadingsPerMessage'] = int(data['OMFMaxReadingsPerMessage']['value'])
+    _config['OMFMaxConnections'] = int(data['OMFMaxConnections']['value'])
     _config['StaticData'] = ast.literal_eval(data['StaticData']['value'])
 
     _config['formatNumber'] = data['formatNumber']['value']
@@ -440,6 +454,9 @@ async def plugin_send(data, raw_data, stream_id):
         data_to_send : True, data successfully sent to the destination system
         new_position : Last row_id already sent
         num_sent     : Number of rows sent, used for the update of the statistics
+        A block is sent in several OMF Data messages, when a message fails after some of them were accepted
+        False is returned with the position and the rows of the last message accepted, only the rows following
+        it are to be sent again.
     Raises:
     """
     
@@ -457,26 +474,36 @@ async def plugin_send(data, raw_data, stream_id):
     ocs_north = OCSNorthPlugin(data['sending_process_instance'], data, _config_omf_types, _logger)
 
     try:
-        # Alloc the in memory buffer
-        buffer_size = len(raw_data)
-        data_to_send = [None for x in range(buffer_size)]
+        # OMF Data messages, each one a list of containers, and the (row_id, rows) reached by each of them
+        data_to_send = []
+        messages_positions = []
 
-        is_data_available, new_position, num_sent = ocs_north.transform_in_memory_data(data_to_send, raw_data)
+        is_data_available, new_position, num_sent = ocs_north.transform_in_memory_data(data_to_send, raw_data,
+                                                                                       messages_positions)
 
         if is_data_available:
 
             await ocs_north.create_omf_objects(raw_data, config_category_name, type_id)
 
+            messages_sent = 0
             try:
-                await ocs_north.send_in_memory_data_to_picromf("Data", data_to_send)
+                for omf_message in data_to_send:
+                    await ocs_north.send_in_memory_data_to_picromf("Data", omf_message)
+                    messages_sent += 1
 
             except Exception as ex:
                 # Forces the recreation of PIServer's objects on the first error occurred
                 if _recreate_omf_objects:
-                    await ocs_north.deleted_omf_types_already_created(config_category_name, type_id)
+                    # Cleared first, the blocks sent concurrently may fail too
                     _recreate_omf_objects = False
+                    await ocs_north.deleted_omf_types_already_created(config_category_name, type_id)
                     _logger.debug("{0} - Forces objects recreation ".format("plugin_send"))
-                raise ex
+                if not messages_sent:
+                    raise ex
+
+                # The messages already accepted are not sent again
+                _logger.error(plugin_common.MESSAGES_LIST["e000031"].format(ex))
+                new_position, num_sent = messages_positions[messages_sent - 1]
             else:
                 is_data_sent = True
 
@@ -495,12 +522,19 @@ def plugin_shutdown(data):
     """
     try:
         _logger.debug("{0} - plugin_shutdown".format(_MODULE_NAME))
-
     except Exception as ex:
         _logger.error(plugin_common.MESSAGES_LIST["e000013"].format(ex))
         raise
 
 
+async def plugin_close_session(data):
+    """ Closes the connections kept open with the destination, awaited by the Sending Process before it stops
+    Returns:
+    Raises:
+    """
+    await OCSNorthPlugin.close_session()
+
+
 def plugin_reconfigure():
     """ Reconfigures the plugin, it should be called when the configuration of the plugin is changed during the
         operation of the South service.
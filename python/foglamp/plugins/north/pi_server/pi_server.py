@@ -19,6 +19,7 @@ import resource
 import datetime
 import time
 import json
+import weakref
 import logging
 import foglamp.plugins.north.common.common as plugin_common
 import foglamp.plugins.north.common.exceptions as plugin_exceptions
@@ -149,6 +150,18 @@ _CONFIG_DEFAULT_OMF = {
         "default": "3",
         "order": "10"
     },
+    "OMFMaxReadingsPerMessage": {
+        "description": "Max number of readings in an OMF Data message, larger blocks are sent using several messages",
+        "type": "integer",
+        "default": "1000",
+        "order": "11"
+    },
+    "OMFMaxConnections": {
+        "description": "Max number of simultaneous connections kept open with the OMF PI Connector Relay",
+        "type": "integer",
+        "default": "2",
+        "order": "12"
+    },
     "OMFHttpTimeout": {
         "description": "Timeout in seconds for HTTP operations with the OMF PI Connector Relay",
         "type": "integer",
@@ -255,7 +268,21 @@ _OMF_TEMPLATE_LINK_DATA = [
 
 
 def _performance_log(_function):
-    """ Logs information for performance measurement """
+    """ Logs information for performance measurement, coroutines are measured until their completion """
+
+    def _log(start):
+        """ Logs the elapsed time since start and the memory used by the process """
+
+        if _log_performance:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            memory_process = (usage[2]) / 1000
+            delta = datetime.datetime.now() - start
+            delta_milliseconds = int(delta.total_seconds() * 1000)
+
+            _logger.info("PERFORMANCE - {0} - milliseconds |{1:>8,}| - memory MB |{2:>8,}|".format(
+                _function.__name__,
+                delta_milliseconds,
+                memory_process))
 
     def wrapper(*arg):
         """ wrapper """
@@ -268,16 +295,28 @@ def _performance_log(_function):
             # Code execution
             result = _function(*arg)
 
-            if _log_performance:
-                usage = resource.getrusage(resource.RUSAGE_SELF)
-                memory_process = (usage[2]) / 1000
-                delta = datetime.datetime.now() - start
-                delta_milliseconds = int(delta.total_seconds() * 1000)
+            _log(start)
+
+            return result
+
+        except Exception as ex:
+            print("ERROR - {func} - error details |{error}|".format(
+                                                                        func="_performance_log",
+                                                                        error=ex), file=sys.stderr)
+            raise
 
-                _logger.info("PERFORMANCE - {0} - milliseconds |{1:>8,}| - memory MB |{2:>8,}|".format(
-                    _function.__name__,
-                    delta_milliseconds,
-                    memory_process))
+    async def wrapper_async(*arg):
+        """ wrapper """
+
+        # Avoids any exceptions related to the performance measurement
+        try:
+
+            start = datetime.datetime.now()
+
+            # Code execution
+            result = await _function(*arg)
+
+            _log(start)
 
             return result
 
@@ -287,7 +326,7 @@ def _performance_log(_function):
                                                                         error=ex), file=sys.stderr)
             raise
 
-    return wrapper
+    return wrapper_async if asyncio.iscoroutinefunction(_function) else wrapper
 
 
 def plugin_info():
@@ -386,6 +425,8 @@ def plugin_init(data):
     _config['OMFMaxRetry'] = int(data['OMFMaxRetry']['value'])
     _config['OMFRetrySleepTime'] = int(data['OMFRetrySleepTime']['value'])
     _config['OMFHttpTimeout'] = int(data['OMFHttpTimeout']['value'])
+    _config['OMFMaxReadingsPerMessage'] = int(data['OMFMaxReadingsPerMessage']['value'])
+    _config['OMFMaxConnections'] = int(data['OMFMaxConnections']['value'])
 
     _config['StaticData'] = ast.literal_eval(data['StaticData']['value'])
     _config['notBlockingErrors'] = ast.literal_eval(data['notBlockingErrors']['value'])
@@ -436,6 +477,9 @@ async def plugin_send(data, raw_data, stream_id):
         data_to_send : True, data successfully sent to the destination system
         new_position : Last row_id already sent
         num_sent     : Number of rows sent, used for the update of the statistics
+        A block is sent in several OMF Data messages, when a message fails after some of them were accepted
+        False is returned with the position and the rows of the last message accepted, only the rows following
+        it are to be sent again.
     Raises:
     """
 
@@ -447,26 +491,36 @@ async def plugin_send(data, raw_data, stream_id):
 
     omf_north = PIServerNorthPlugin(data['sending_process_instance'], data, _config_omf_types, _logger)
 
-    # Alloc the in memory buffer
-    buffer_size = len(raw_data)
-    data_to_send = [None for _ in range(buffer_size)]
+    # OMF Data messages, each one a list of containers, and the (row_id, rows) reached by each of them
+    data_to_send = []
+    messages_positions = []
 
-    is_data_available, new_position, num_sent = omf_north.transform_in_memory_data(data_to_send, raw_data)
+    is_data_available, new_position, num_sent = omf_north.transform_in_memory_data(data_to_send, raw_data,
+                                                                                   messages_positions)
 
     if is_data_available:
 
         await omf_north.create_omf_objects(raw_data, config_category_name, type_id)
 
+        messages_sent = 0
         try:
-            await omf_north.send_in_memory_data_to_picromf("Data", data_to_send)
+            for omf_message in data_to_send:
+                await omf_north.send_in_memory_data_to_picromf("Data", omf_message)
+                messages_sent += 1
 
         except Exception as ex:
             # Forces the recreation of PIServer's objects on the first error occurred
             if _recreate_omf_objects:
-                await omf_north.deleted_omf_types_already_created(config_category_name, type_id)
+                # Cleared first, the blocks sent concurrently may fail too
                 _recreate_omf_objects = False
+                await omf_north.deleted_omf_types_already_created(config_category_name, type_id)
                 _logger.debug("{0} - Forces objects recreation ".format("plugin_send"))
-            raise ex
+            if not messages_sent:
+                raise ex
+
+            # The messages already accepted are not sent again
+            _logger.error(plugin_common.MESSAGES_LIST["e000031"].format(ex))
+            new_position, num_sent = messages_positions[messages_sent - 1]
         else:
             is_data_sent = True
 
@@ -485,6 +539,14 @@ def plugin_shutdown(data):
         raise
 
 
+async def plugin_close_session(data):
+    """ Closes the connections kept open with the destination, awaited by the Sending Process before it stops
+    Returns:
+    Raises:
+    """
+    await PIServerNorthPlugin.close_session()
+
+
 def plugin_reconfigure():
     """ plugin_reconfigure """
 
@@ -494,6 +556,17 @@ def plugin_reconfigure():
 class PIServerNorthPlugin(object):
     """ North OMF North Plugin """
 
+    _omf_types_created = {}
+    """ Sets of the asset codes having the OMF types already created, by (configuration_key, type_id).
+    Loaded once from the omf_created_objects table, the instances of the plugin are created at every send. """
+
+    _sessions = weakref.WeakKeyDictionary()
+    """ aiohttp.ClientSession per event loop, keeps the connections with the destination open between the sends """
+
+    _omf_types_locks = {}
+    """ asyncio.Lock by (configuration_key, type_id), the blocks sent concurrently create and delete the OMF types
+    one at a time so that a type is posted and stored in omf_created_objects once """
+
     def __init__(self, sending_process_instance, config, config_omf_types, _logger):
 
         self._sending_process_instance = sending_process_instance
@@ -502,6 +575,45 @@ class PIServerNorthPlugin(object):
         self._config_omf_types = config_omf_types
         self._logger = _logger
 
+    def _get_session(self):
+        """ Returns the session bound to the running event loop, creating it on first use
+         Args:
+         Returns:
+            aiohttp.ClientSession pooling up to OMFMaxConnections keep-alive connections
+         Raises:
+         """
+        loop = asyncio.get_event_loop()
+        session = PIServerNorthPlugin._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(verify_ssl=False, limit=self._config['OMFMaxConnections'], loop=loop)
+            session = aiohttp.ClientSession(connector=connector, loop=loop)
+            PIServerNorthPlugin._sessions[loop] = session
+        return session
+
+    def _omf_types_lock(self, configuration_key, type_id):
+        """ Returns the lock of the OMF types identified by configuration_key and type_id, creating it on first use
+         Args:
+            configuration_key - part of the key to identify the type
+            type_id           - part of the key to identify the type
+         Returns:
+            asyncio.Lock
+         Raises:
+         """
+        key = (configuration_key, type_id)
+        lock = PIServerNorthPlugin._omf_types_locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            PIServerNorthPlugin._omf_types_locks[key] = lock
+        return lock
+
+    @classmethod
+    async def close_session(cls):
+        """ Closes the session bound to the running event loop, if any """
+        loop = asyncio.get_event_loop()
+        session = PIServerNorthPlugin._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+
     async def deleted_omf_types_already_created(self, config_category_name, type_id):
         """ Deletes OMF types/objects tracked as already created, it is used to force the recreation of the types
          Args:
@@ -510,12 +622,16 @@ class PIServerNorthPlugin(object):
          Returns:
          Raises:
          """
-        payload = payload_builder.PayloadBuilder() \
-            .WHERE(['configuration_key', '=', config_category_name]) \
-            .AND_WHERE(['type_id', '=', type_id]) \
-            .payload()
+        async with self._omf_types_lock(config_category_name, type_id):
+            # Reloaded from the Storage layer at the next send
+            self._omf_types_created.pop((config_category_name, type_id), None)
+
+            payload = payload_builder.PayloadBuilder() \
+                .WHERE(['configuration_key', '=', config_category_name]) \
+                .AND_WHERE(['type_id', '=', type_id]) \
+                .payload()
 
-        await self._sending_process_instance._storage_async.delete_from_tbl("omf_created_objects", payload)
+            await self._sending_process_instance._storage_async.delete_from_tbl("omf_created_objects", payload)
 
     async def _retrieve_omf_types_already_created(self, configuration_key, type_id):
         """ Retrieves the list of OMF types already defined/sent to the PICROMF
@@ -523,9 +639,14 @@ class PIServerNorthPlugin(object):
              configuration_key - part of the key to identify the type
              type_id           - part of the key to identify the type
          Returns:
-            List of Asset code already defined into the PI Server
+            Set of Asset code already defined into the PI Server
          Raises:
          """
+        try:
+            return self._omf_types_created[(configuration_key, type_id)]
+        except KeyError:
+            pass
+
         payload = payload_builder.PayloadBuilder() \
             .WHERE(['configuration_key', '=', configuration_key]) \
             .AND_WHERE(['type_id', '=', type_id]) \
@@ -536,9 +657,8 @@ class PIServerNorthPlugin(object):
                                                                     func="_retrieve_omf_types_already_created",
                                                                     item=omf_created_objects))
         # Extracts only the asset_code column
-        rows = []
-        for row in omf_created_objects['rows']:
-            rows.append(row['asset_code'])
+        rows = {row['asset_code'] for row in omf_created_objects['rows']}
+        self._omf_types_created[(configuration_key, type_id)] = rows
 
         return rows
 
@@ -558,6 +678,10 @@ class PIServerNorthPlugin(object):
             .payload()
         await self._sending_process_instance._storage_async.insert_into_tbl("omf_created_objects", payload)
 
+        asset_codes_already_created = self._omf_types_created.get((configuration_key, type_id))
+        if asset_codes_already_created is not None:
+            asset_codes_already_created.add(asset_code)
+
     def _generate_omf_asset_id(self, asset_code):
         """ Generates an asset id usable by AF/PI Server from an asset code stored into the Storage layer
          Args:
@@ -774,38 +898,43 @@ class PIServerNorthPlugin(object):
         Raises:
         """
         asset_codes_to_evaluate = plugin_common.identify_unique_asset_codes(raw_data)
-        asset_codes_already_created = await self._retrieve_omf_types_already_created(config_category_name, type_id)
 
-        for item in asset_codes_to_evaluate:
-            asset_code = item["asset_code"]
+        # The types already created are read once the blocks sent concurrently have created theirs
+        async with self._omf_types_lock(config_category_name, type_id):
+            asset_codes_already_created = await self._retrieve_omf_types_already_created(config_category_name, type_id)
 
-            # Evaluates if it is a new OMF type
-            if not any(tmp_item == asset_code for tmp_item in asset_codes_already_created):
+            for item in asset_codes_to_evaluate:
+                asset_code = item["asset_code"]
 
-                asset_code_omf_type = ""
-                try:
-                    asset_code_omf_type = copy.deepcopy(self._config_omf_types[asset_code]["value"])
-                except KeyError:
-                    configuration_based = False
-                else:
-                    configuration_based = True
+                # Evaluates if it is a new OMF type
+                if asset_code not in asset_codes_already_created:
 
-                if configuration_based:
-                    self._logger.debug("creates type - configuration based - asset |{0}| ".format(asset_code))
-                    await self._create_omf_objects_configuration_based(asset_code, asset_code_omf_type)
-                else:
+                    asset_code_omf_type = ""
+                    try:
+                        asset_code_omf_type = copy.deepcopy(self._config_omf_types[asset_code]["value"])
+                    except KeyError:
+                        configuration_based = False
+                    else:
+                        configuration_based = True
 
-                    # handling - Automatic OMF Type Mapping
-                    self._logger.debug("creates type - automatic handling - asset |{0}| ".format(asset_code))
-                    await self._create_omf_objects_automatic(item)
+                    if configuration_based:
+                        self._logger.debug("creates type - configuration based - asset |{0}| ".format(asset_code))
+                        await self._create_omf_objects_configuration_based(asset_code, asset_code_omf_type)
+                    else:
 
-                await self._flag_created_omf_type(config_category_name, type_id, asset_code)
-            else:
-                self._logger.debug("asset already created - asset |{0}| ".format(asset_code))
+                        # handling - Automatic OMF Type Mapping
+                        self._logger.debug("creates type - automatic handling - asset |{0}| ".format(asset_code))
+                        await self._create_omf_objects_automatic(item)
 
+                    await self._flag_created_omf_type(config_category_name, type_id, asset_code)
+                else:
+                    self._logger.debug("asset already created - asset |{0}| ".format(asset_code))
+
+    @_performance_log
     async def send_in_memory_data_to_picromf(self, message_type, omf_data):
         """ Sends data to PICROMF - it retries the operation using a sleep time increased *2 for every retry
             it logs a WARNING only at the end of the retry mechanism in case of a communication error
+            The connections are reused between the sends, the compression is executed outside the event loop.
         Args:
             message_type: possible values {Type, Container, Data}
             omf_data:     OMF message to send
@@ -830,29 +959,34 @@ class PIServerNorthPlugin(object):
         if _log_debug_level == 3:
             self._logger.debug("OMF message : |{0}| |{1}| " .format(message_type, omf_data_json))
 
+        # The message is compressed once, outside the event loop, and reused by the retries
+        use_compression = True if self._config['compression'].upper() == 'TRUE' else False
+        if use_compression:
+            msg_body = await asyncio.get_event_loop().run_in_executor(None,
+                                                                      gzip.compress,
+                                                                      bytes(omf_data_json, 'utf-8'))
+            msg_header.update({'compression': 'gzip'})
+            # https://docs.aiohttp.org/en/stable/client_advanced.html#uploading-pre-compressed-data
+            msg_header.update({'Content-Encoding': 'gzip'})
+        else:
+            msg_body = omf_data_json
+
+        session = self._get_session()
+
         while num_retry <= self._config['OMFMaxRetry']:
             _error = False
             try:
-                use_compression = True if self._config['compression'].upper() == 'TRUE' else False
-                if use_compression:
-                    msg_body = gzip.compress(bytes(omf_data_json, 'utf-8'))
-                    msg_header.update({'compression': 'gzip'})
-                    # https://docs.aiohttp.org/en/stable/client_advanced.html#uploading-pre-compressed-data
-                    msg_header.update({'Content-Encoding': 'gzip'})
-                else:
-                    msg_body = omf_data_json
-
-                self._logger.info("SEND requested with compression: %s started at: %s", str(use_compression), datetime.datetime.now().isoformat())
-                async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-                    async with session.post(
-                                            url=self._config['URL'],
-                                            headers=msg_header,
-                                            data=msg_body,
-                                            timeout=self._config['OMFHttpTimeout']
-                                            ) as resp:
-
-                        status_code = resp.status
-                        text = await resp.text()
+                start = datetime.datetime.now()
+                self._logger.info("SEND requested with compression: %s started at: %s", str(use_compression), start.isoformat())
+                async with session.post(
+                                        url=self._config['URL'],
+                                        headers=msg_header,
+                                        data=msg_body,
+                                        timeout=self._config['OMFHttpTimeout']
+                                        ) as resp:
+
+                    status_code = resp.status
+                    text = await resp.text()
             except (TimeoutError, asyncio.TimeoutError) as ex:
                 _message = plugin_common.MESSAGES_LIST["e000024"].format(self._config['URL'], "connection Timeout")
                 _error = plugin_exceptions.URLConnectionError(_message)
@@ -863,8 +997,17 @@ class PIServerNorthPlugin(object):
                 _error = plugin_exceptions.URLConnectionError(_message)
 
             else:
+                end = datetime.datetime.now()
                 self._logger.info("PI Server responded with status: %s received at: %s", str(status_code),
-                                     datetime.datetime.now().isoformat())
+                                     end.isoformat())
+
+                if _log_performance:
+                    delta_seconds = max((end - start).total_seconds(), 0.001)
+                    self._logger.info("PERFORMANCE - {0} - bytes sent |{1:>10,}| - KB/s |{2:>10,.1f}|".format(
+                        "send_in_memory_data_to_picromf",
+                        len(msg_body),
+                        len(msg_body) / 1024 / delta_seconds))
+
                 # Evaluate the HTTP status codes
                 if not str(status_code).startswith('2'):
                     if any(_['id'] == status_code and _['message'] in text for _ in self._config['notBlockingErrors']):
@@ -894,11 +1037,16 @@ class PIServerNorthPlugin(object):
             raise _error
 
     @_performance_log
-    def transform_in_memory_data(self, data_to_send, raw_data):
+    def transform_in_memory_data(self, data_to_send, raw_data, messages_positions=None):
         """ Transforms the in memory data into a new structure that could be converted into JSON for the PICROMF
+
+        The readings are grouped by container, keeping their order, into OMF Data messages holding up to
+        OMFMaxReadingsPerMessage readings each, larger blocks are split into several messages.
         Args:
-            data_to_send - Transformed/generated data
+            data_to_send - list extended with the OMF Data messages, each one a list of containers
             raw_data - Input data
+            messages_positions - if given, list extended with the (row_id, number of elements) reached at the end
+                                 of each OMF Data message
         Returns:
             data_available - True, there are new data
             _new_position - It corresponds to the row_id of the last element
@@ -912,14 +1060,23 @@ class PIServerNorthPlugin(object):
         # statistics
         _num_sent = 0
 
-        idx = 0
+        max_readings = self._config['OMFMaxReadingsPerMessage']
+        measurement_ids = {}
+
+        # Message being filled, its readings and its containers by measurement id
+        omf_message = None
+        omf_message_readings = 0
+        containers = {}
 
         try:
 
             for row in raw_data:
 
                 # Identification of the object/sensor
-                measurement_id = self._generate_omf_measurement(row['asset_code'])
+                asset_code = row['asset_code']
+                measurement_id = measurement_ids.get(asset_code)
+                if measurement_id is None:
+                    measurement_id = measurement_ids[asset_code] = self._generate_omf_measurement(asset_code)
 
                 try:
                     # The expression **row['reading'] - joins the 2 dictionaries
@@ -928,29 +1085,39 @@ class PIServerNorthPlugin(object):
                     # without using python date library for performance reason and
                     # because it is expected to receive the date in a precise/fixed format :
                     #   2018-05-28 16:56:55.000000+00
-                    data_to_send[idx] = {
-                            "containerid": measurement_id,
-                            "values": [
-                                {
-                                    "Time": row['user_ts'][0:10] + "T" + row['user_ts'][11:23] + "Z",
-                                    **row['reading']
-                                }
-                            ]
-                        }
+                    value = {
+                        "Time": row['user_ts'][0:10] + "T" + row['user_ts'][11:23] + "Z",
+                        **row['reading']
+                    }
+
+                    if omf_message is None or omf_message_readings >= max_readings:
+                        omf_message = []
+                        omf_message_readings = 0
+                        containers = {}
+                        data_to_send.append(omf_message)
+                        if messages_positions is not None:
+                            messages_positions.append(None)
+
+                    container = containers.get(measurement_id)
+                    if container is None:
+                        container = containers[measurement_id] = {"containerid": measurement_id, "values": []}
+                        omf_message.append(container)
+                    container["values"].append(value)
+                    omf_message_readings += 1
 
                     if _log_debug_level == 3:
                         self._logger.debug("stream ID : |{0}| sensor ID : |{1}| row ID : |{2}|  "
-                                           .format(measurement_id, row['asset_code'], str(row['id'])))
-
-                        self._logger.debug("in memory info |{0}| ".format(data_to_send[idx]))
+                                           .format(measurement_id, asset_code, str(row['id'])))
 
-                    idx += 1
+                        self._logger.debug("in memory info |{0}| ".format(value))
 
                     # Used for the statistics update
                     _num_sent += 1
 
                     # Latest position reached
                     _new_position = row['id']
+                    if messages_positions is not None:
+                        messages_positions[-1] = (_new_position, _num_sent)
 
                     data_available = True
 
@@ -10,10 +10,10 @@ from aiohttp import web
 from foglamp.services.common.microservice_management import routes
 from foglamp.common import logger
 from foglamp.common.process import FoglampProcess
+from foglamp.common.storage_client.storage_client import StorageClientAsync
 from foglamp.common.web import middleware
 from abc import abstractmethod
 import time
-import json
 import asyncio
 
 __author__ = "Ashwin Gopalakrishnan"
@@ -68,15 +68,24 @@ class FoglampMicroservice(FoglampProcess):
             category = "Security"
             config = default_config
             config_descr = 'Microservices Security'
-            config_payload = json.dumps({
-                "key": category,
-                "description": config_descr,
-                "value": config,
-                "keep_original_items": True
+            # Create the category, add it to General and read it back with the storage connection pool category
+            # in a single request
+            result = self._core_microservice_management_client.bootstrap({
+                "categories": [{
+                    "key": category,
+                    "description": config_descr,
+                    "value": config,
+                    "keep_original_items": True
+                }, {
+                    "key": StorageClientAsync.POOL_CATEGORY,
+                    "description": 'Storage Client Connection Pool',
+                    "value": StorageClientAsync.POOL_CATEGORY_CONFIG,
+                    "keep_original_items": True
+                }],
+                "children": [{"parent": "General", "children": [category]}]
             })
-            self._core_microservice_management_client.create_configuration_category(config_payload)
-            self._core_microservice_management_client.create_child_category("General", ["Security"])
-            config = self._core_microservice_management_client.get_configuration_category(category_name=category)
+            config = result['categories'][category]
+            StorageClientAsync.configure_connection_pool(result['categories'][StorageClientAsync.POOL_CATEGORY])
             is_local_services = True if config['local_services']['value'].lower() == 'true' else False
             host = '127.0.0.1' if is_local_services is True else '0.0.0.0'
 
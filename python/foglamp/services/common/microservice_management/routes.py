@@ -37,6 +37,7 @@ def setup(app, obj, is_core=False):
         app.router.add_route('POST', '/foglamp/service', obj.register)
         app.router.add_route('DELETE', '/foglamp/service/{service_id}', obj.unregister)
         app.router.add_route('GET', '/foglamp/service', obj.get_service)
+        app.router.add_route('POST', '/foglamp/service/bootstrap', obj.bootstrap)
 
         # Interest Registration
         app.router.add_route('POST', '/foglamp/interest', obj.register_interest)
@@ -4,7 +4,9 @@
 # See: http://foglamp.readthedocs.io/
 # FOGLAMP_END
 
-import copy
+import json
+import time
+import urllib.parse
 from datetime import datetime
 from enum import IntEnum
 from aiohttp import web
@@ -21,6 +23,8 @@ __version__ = "${VERSION}"
 
 __DEFAULT_LIMIT = 20
 __DEFAULT_OFFSET = 0
+__CURSOR_TS_FORMAT = "YYYY-MM-DD HH24:MI:SS.US"
+__TOTALS_RESYNC_SECONDS = 600
 
 _help = """
     -------------------------------------------------------------------------------
@@ -32,6 +36,12 @@ _help = """
 
 _logger = logger.setup(__name__)
 
+# Known log codes, re-read when an unknown source is requested
+_log_codes = set()
+
+# Number of audit entries per (code, level), counted incrementally on the entries with an id greater than last_id
+_totals = {'counts': {}, 'last_id': 0, 'synced': 0}
+
 
 class Severity(IntEnum):
     """ Enumeration for log.severity """
@@ -124,10 +134,61 @@ async def create_audit_entry(request):
         raise web.HTTPInternalServerError(reason=str(ex))
 
 
+async def _is_log_code(storage_client, code):
+    if code not in _log_codes:
+        # SELECT * FROM log_codes
+        result = await storage_client.query_tbl("log_codes")
+        _log_codes.clear()
+        _log_codes.update(key['code'] for key in result['rows'])
+    return code in _log_codes
+
+
+async def _total_count(storage_client, source, severity):
+    """ Returns the number of audit entries matching source and severity
+
+    Only the entries added since the previous call are counted, all of them are counted again every
+    __TOTALS_RESYNC_SECONDS to pick up the entries committed out of id order.
+    """
+    if time.time() - _totals['synced'] > __TOTALS_RESYNC_SECONDS:
+        _totals.update({'counts': {}, 'last_id': 0, 'synced': time.time()})
+    counts = _totals['counts']
+    last_id = _totals['last_id']
+
+    # SELECT count(*), max(id), code, level FROM log WHERE id > last_id GROUP BY code, level
+    payload = PayloadBuilder().AGGREGATE(["count", "*"], ["max", "id"])\
+        .ALIAS("aggregate", ("*", "count", "count"), ("id", "max", "max_id"))\
+        .WHERE(["id", ">", last_id]).GROUP_BY("code", "level").payload()
+    result = await storage_client.query_tbl_with_payload('log', payload)
+
+    # A concurrent request may have counted the same entries meanwhile
+    if _totals['counts'] is counts and _totals['last_id'] == last_id:
+        for row in result['rows']:
+            key = (row['code'], int(row['level']))
+            counts[key] = counts.get(key, 0) + int(row['count'])
+            _totals['last_id'] = max(_totals['last_id'], int(row['max_id']))
+
+    return sum(count for (code, level), count in _totals['counts'].items()
+               if (source is None or code == source) and (severity is None or level == severity))
+
+
+def _parse_cursor(cursor):
+    """ Returns the (ts, id) of the last entry of the previous page, from a cursor given as ts|id """
+    ts, _, log_id = cursor.rpartition('|')
+    # The fraction of the second is optional
+    try:
+        datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f")
+    except ValueError:
+        datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+    return ts, int(log_id)
+
+
 async def get_audit_entries(request):
     """ Returns a list of audit trail entries sorted with most recent first and total count
         (including the criteria search if applied)
 
+        A page with limit entries has a nextCursor, pass it as cursor to get the following page; unlike skip the
+        cursor does not get slower on the older entries.
+
     :Example:
 
         curl -X GET http://localhost:8081/foglamp/audit
@@ -143,6 +204,8 @@ async def get_audit_entries(request):
         curl -X GET http://localhost:8081/foglamp/audit?severity=FAILURE
 
         curl -X GET http://localhost:8081/foglamp/audit?source=LOGGN&severity=INFORMATION&limit=10
+
+        curl -X GET "http://localhost:8081/foglamp/audit?limit=5&cursor=2018-01-30%2018:39:48.796263|42"
     """
 
     limit = __DEFAULT_LIMIT
@@ -163,17 +226,19 @@ async def get_audit_entries(request):
         except ValueError:
             raise web.HTTPBadRequest(reason="Skip/Offset must be a positive integer")
 
-    source = None
-    if 'source' in request.query and request.query['source'] != '':
+    cursor = None
+    if 'cursor' in request.query and request.query['cursor'] != '':
+        cursor_param = urllib.parse.unquote(request.query['cursor'])
         try:
-            source = request.query.get('source')
-            # SELECT * FROM log_codes
-            storage_client = connect.get_storage_async()
-            result = await storage_client.query_tbl("log_codes")
-            log_codes = [key['code'] for key in result['rows']]
-            if source not in log_codes:
-                raise ValueError
+            cursor = _parse_cursor(cursor_param)
         except ValueError:
+            raise web.HTTPBadRequest(reason="{} is not a valid cursor".format(cursor_param))
+
+    source = None
+    if 'source' in request.query and request.query['source'] != '':
+        source = request.query.get('source')
+        storage_client = connect.get_storage_async()
+        if not await _is_log_code(storage_client, source):
             raise web.HTTPBadRequest(reason="{} is not a valid source".format(source))
 
     severity = None
@@ -186,37 +251,35 @@ async def get_audit_entries(request):
     try:
         # HACK: This way when we can more future we do not get an exponential
         # explosion of if statements
-        payload = PayloadBuilder().SELECT("code", "level", "log", "ts")\
+        # The second ts, at full precision, is the cursor of the next page
+        payload = PayloadBuilder().SELECT("id", "code", "level", "log", "ts")\
             .ALIAS("return", ("ts", 'timestamp')).FORMAT("return", ("ts", "YYYY-MM-DD HH24:MI:SS.MS"))\
-            .WHERE(['1', '=', 1])
+            .SELECT(json.dumps({"column": "ts", "format": __CURSOR_TS_FORMAT, "alias": "cursor"}))
 
+        conditions = [['1', '=', 1]]
         if source is not None:
-            payload.AND_WHERE(['code', '=', source])
-
+            conditions.append(['code', '=', source])
         if severity is not None:
-            payload.AND_WHERE(['level', '=', severity])
-
-        _and_where_payload = payload.chain_payload()
-        # SELECT *, count(*) OVER() FROM log - No support yet from storage layer
-        # TODO: FOGL-740, FOGL-663 once ^^ resolved we should replace below storage call for getting total rows
-        _and_where_copy = copy.deepcopy(_and_where_payload)
-        total_count_payload = PayloadBuilder(_and_where_copy).AGGREGATE(["count", "*"])\
-            .ALIAS("aggregate", ("*", "count", "count")).payload()
+            conditions.append(['level', '=', severity])
+        payload.WHERE(tuple(conditions))
 
-        # SELECT count (*) FROM log <_and_where_payload>
-        storage_client = connect.get_storage_async()
-        result = await storage_client.query_tbl_with_payload('log', total_count_payload)
-        total_count = result['rows'][0]['count']
+        if cursor is not None:
+            # The storage layer has no parentheses in the where clause, the conditions are repeated in each branch:
+            # <conditions> AND ts < cursor_ts OR ts = cursor_ts AND id < cursor_id AND <conditions>
+            cursor_ts, cursor_id = cursor
+            payload.AND_WHERE(['ts', '<', cursor_ts]).OR_WHERE(['ts', '=', cursor_ts])\
+                .AND_WHERE(['id', '<', cursor_id]).AND_WHERE(tuple(conditions))
 
-        payload = PayloadBuilder(_and_where_payload)
-        payload.ORDER_BY(['ts', 'desc'])
+        payload.ORDER_BY(['ts', 'desc'], ['id', 'desc'])
         payload.LIMIT(limit)
 
         if offset > 0:
             payload.OFFSET(offset)
 
         # SELECT * FROM log <payload.payload()>
+        storage_client = connect.get_storage_async()
         results = await storage_client.query_tbl_with_payload('log', payload.payload())
+        total_count = await _total_count(storage_client, source, severity)
         res = []
         for row in results['rows']:
             r = dict()
@@ -228,10 +291,18 @@ async def get_audit_entries(request):
 
             res.append(r)
 
+        next_cursor = None
+        if limit > 0 and len(results['rows']) == limit:
+            last = results['rows'][-1]
+            next_cursor = "{}|{}".format(last["cursor"], last["id"])
+
     except Exception as ex:
         raise web.HTTPException(reason=str(ex))
 
-    return web.json_response({'audit': res, 'totalCount': total_count})
+    response = {'audit': res, 'totalCount': total_count}
+    if next_cursor is not None:
+        response['nextCursor'] = next_cursor
+    return web.json_response(response)
 
 
 async def get_audit_log_codes(request):
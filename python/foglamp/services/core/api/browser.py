@@ -36,6 +36,8 @@ Supports a number of REST API:
   Note: if datetime units are supplied then limit will not respect i.e mutually exclusive
 """
 
+import time
+
 from aiohttp import web
 
 from foglamp.common.storage_client.payload_builder import PayloadBuilder
@@ -51,6 +53,11 @@ __version__ = "${VERSION}"
 __DEFAULT_LIMIT = 20
 __DEFAULT_OFFSET = 0
 __TIMESTAMP_FMT = 'YYYY-MM-DD HH24:MI:SS.MS'
+__SUMMARY_SAMPLE_SIZE = 10
+__SUMMARY_CACHE_TTL = 5
+
+_summary_cache = {}
+""" Responses of the summary of all sensors values, keyed by asset code and query window: (expiry, response) """
 
 
 def setup(app):
@@ -226,24 +233,35 @@ async def asset_all_readings_summary(request):
     The number of records return is default to a small number (20), this may be changed by supplying
     the query parameter ?limit=xx&skip=xx and it will not respect when datetime units is supplied
 
+    The sensors are found in a sample of the latest readings and summarised in a single query, the result is
+    cached for a few seconds for the same asset code and query parameters
+
     :Example:
             curl -sX GET http://localhost:8081/foglamp/asset/fogbench_humidity/summary
             curl -sX GET http://localhost:8081/foglamp/asset/fogbench_humidity/summary?seconds=60
             curl -sX GET http://localhost:8081/foglamp/asset/fogbench_humidity/summary?limit=10
     """
     try:
-        # Get readings from asset_code
         asset_code = request.match_info.get('asset_code', '')
-        payload = PayloadBuilder().SELECT("reading").WHERE(["asset_code", "=", asset_code]).payload()
+        cache_key = (asset_code,) + tuple(request.query.get(p, '') for p in
+                                          ('seconds', 'minutes', 'hours', 'limit', 'skip'))
+        now = time.monotonic()
+        cached = _summary_cache.get(cache_key)
+        if cached is not None and cached[0] > now:
+            return web.json_response(cached[1])
+
+        # Find keys in a sample of the latest readings rather than in the whole history of the asset
+        payload = PayloadBuilder().SELECT("reading").WHERE(["asset_code", "=", asset_code]) \
+            .LIMIT(__SUMMARY_SAMPLE_SIZE).ORDER_BY(["user_ts", "desc"]).payload()
         _readings = connect.get_readings_async()
         results = await _readings.query(payload)
         if not results['rows']:
             raise web.HTTPNotFound(reason="{} asset_code not found".format(asset_code))
 
-        # TODO: FOGL-1768 when support available from storage layer then avoid multiple calls
-        # Find keys in readings
-        reading_keys = list(results['rows'][0]['reading'].keys())
-        response = []
+        reading_keys = []
+        for row in results['rows']:
+            reading_keys.extend(k for k in row['reading'] if k not in reading_keys)
+
         _where = PayloadBuilder().WHERE(["asset_code", "=", asset_code]).chain_payload()
         if 'seconds' in request.query or 'minutes' in request.query or 'hours' in request.query:
             _and_where = where_clause(request, _where)
@@ -251,21 +269,27 @@ async def asset_all_readings_summary(request):
             # Add limit, offset clause
             _and_where = prepare_limit_skip_payload(request, _where)
 
-        for reading in reading_keys:
-            _aggregate = PayloadBuilder(_and_where).AGGREGATE(["min", ["reading", reading]],
-                                                              ["max", ["reading", reading]],
-                                                              ["avg", ["reading", reading]]) \
-                .ALIAS('aggregate', ('reading', 'min', 'min'),
-                       ('reading', 'max', 'max'),
-                       ('reading', 'avg', 'average')).chain_payload()
-            payload = PayloadBuilder(_aggregate).payload()
-            results = await _readings.query(payload)
-            response.append({reading: results['rows'][0]})
+        # Aggregate all the keys in one query, the aliases are indexed as the keys may not be valid identifiers
+        _aggregates = []
+        _aliases = []
+        for i, reading in enumerate(reading_keys):
+            for operation in ('min', 'max', 'avg'):
+                _aggregates.append([operation, ["reading", reading]])
+                _aliases.append((["reading", reading], operation, "{}_{}".format(operation, i)))
+        payload = PayloadBuilder(_and_where).AGGREGATE(tuple(_aggregates)).ALIAS('aggregate', *_aliases).payload()
+        results = await _readings.query(payload)
+        row = results['rows'][0]
+        response = [{reading: {'min': row['min_{}'.format(i)],
+                               'max': row['max_{}'.format(i)],
+                               'average': row['avg_{}'.format(i)]}} for i, reading in enumerate(reading_keys)]
     except (KeyError, IndexError) as ex:
         raise web.HTTPNotFound(reason=ex)
     except (TypeError, ValueError) as ex:
         raise web.HTTPBadRequest(reason=ex)
     else:
+        for key in [k for k, v in _summary_cache.items() if v[0] <= now]:
+            del _summary_cache[key]
+        _summary_cache[cache_key] = (now + __SUMMARY_CACHE_TTL, response)
         return web.json_response(response)
 
 
@@ -31,6 +31,7 @@ _help = """
     | GET POST       | /foglamp/category/{category_name}/children                  |
     | DELETE         | /foglamp/category/{category_name}/children/{child_category} |
     | DELETE         | /foglamp/category/{category_name}/parent                    |
+    | GET PUT        | /foglamp/configuration/cache                                |
     --------------------------------------------------------------------------------
 """
 
@@ -514,6 +515,51 @@ async def delete_parent_category(request):
     return web.json_response({"message": "Parent-child relationship for the parent-{} is deleted".format(category_name)})
 
 
+async def get_configuration_cache(request):
+    """
+    Args:
+         request:
+
+    Returns:
+            the size, hits, misses and hit rates of the configuration cache
+
+    :Example:
+            curl -X GET http://localhost:8081/foglamp/configuration/cache
+    """
+    cf_mgr = ConfigurationManager(connect.get_storage_async())
+    return web.json_response(_cache_stats(cf_mgr))
+
+
+async def set_configuration_cache(request):
+    """
+    Args:
+         request: maxSize is required, the maximum number of categories held in the configuration cache
+
+    Returns:
+            the size, hits, misses and hit rates of the configuration cache
+
+    :Example:
+            curl -X PUT http://localhost:8081/foglamp/configuration/cache -d '{"maxSize": 50}'
+    """
+    data = await request.json()
+    max_size = data.get('maxSize', None)
+    if not isinstance(max_size, int) or isinstance(max_size, bool) or max_size < 1:
+        raise web.HTTPBadRequest(reason='maxSize must be a positive integer')
+
+    cf_mgr = ConfigurationManager(connect.get_storage_async())
+    cf_mgr._cacheManager.resize(max_size)
+    return web.json_response(_cache_stats(cf_mgr))
+
+
+def _cache_stats(cf_mgr):
+    stats = cf_mgr._cacheManager.stats
+    lookups = stats['hit'] + stats['miss']
+    tree_lookups = stats['treeHit'] + stats['treeMiss']
+    stats['hitRate'] = round(stats['hit'] / lookups, 4) if lookups else 0
+    stats['treeHitRate'] = round(stats['treeHit'] / tree_lookups, 4) if tree_lookups else 0
+    return stats
+
+
 async def upload_script(request):
     """ Upload script for a given config item
 
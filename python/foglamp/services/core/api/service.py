@@ -55,6 +55,14 @@ def get_service_records():
                 'status': ServiceRecord.Status(int(service_record._status)).name.lower()
             })
     recs = {'services': sr_list}
+
+    monitor = server.Server.service_monitor
+    if monitor is not None:
+        recs['monitor'] = {
+            'round_duration': monitor.round_duration,
+            'ping_rtt': {service_record._name: list(monitor.ping_rtts[service_record._id])
+                         for service_record in ServiceRegistry.all() if service_record._id in monitor.ping_rtts}
+        }
     return recs
 
 
@@ -64,7 +72,8 @@ async def get_health(request):
         request:
 
     Returns:
-            health of all registered services
+            health of all registered services, with the duration of the last round of health checks and
+            the round trip times (in milliseconds) of the last pings of each service when the service monitor runs
 
     :Example:
             curl -X GET http://localhost:8081/foglamp/service
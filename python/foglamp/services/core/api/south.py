@@ -4,6 +4,9 @@
 # See: http://foglamp.readthedocs.io/
 # FOGLAMP_END
 
+import asyncio
+import time
+
 from aiohttp import web
 
 from foglamp.common.service_record import ServiceRecord
@@ -25,11 +28,40 @@ _help = """
     -------------------------------------------------------------------------------
 """
 
+__ASSET_COUNT_CACHE_TTL = 5
+
+_asset_counts = {'expiry': 0, 'counts': {}}
+""" Snapshot of the readings count by asset code, shared by the requests until it expires """
+
 
-async def _get_schedule_status(storage_client, svc_name):
-    payload = PayloadBuilder().SELECT("enabled").WHERE(['schedule_name', '=', svc_name]).payload()
+async def _get_schedules_status(storage_client):
+    payload = PayloadBuilder().SELECT("schedule_name", "enabled").payload()
     result = await storage_client.query_tbl_with_payload('schedules', payload)
-    return True if result['rows'][0]['enabled'] == 't' else False
+    return {r['schedule_name']: r['enabled'] == 't' for r in result['rows']}
+
+
+async def _get_tracked_assets(storage_client):
+    payload = PayloadBuilder().SELECT("service", "asset").payload()
+    result = await storage_client.query_tbl_with_payload('asset_tracker', payload)
+    tracked_assets = dict()
+    for r in result['rows']:
+        tracked_assets.setdefault(r['service'], []).append(r['asset'])
+    return tracked_assets
+
+
+async def _get_asset_counts():
+    """ Returns the readings count by asset code, from a snapshot refreshed at most every __ASSET_COUNT_CACHE_TTL
+    seconds """
+    now = time.monotonic()
+    if _asset_counts['expiry'] > now:
+        return _asset_counts['counts']
+
+    payload = PayloadBuilder().AGGREGATE(["count", "*"]).ALIAS("aggregate", ("*", "count", "count")) \
+        .GROUP_BY("asset_code").payload()
+    results = await connect.get_readings_async().query(payload)
+    _asset_counts['counts'] = {r['asset_code']: r['count'] for r in results['rows']}
+    _asset_counts['expiry'] = now + __ASSET_COUNT_CACHE_TTL
+    return _asset_counts['counts']
 
 
 async def _services_with_assets(storage_client, south_services):
@@ -43,6 +75,14 @@ async def _services_with_assets(storage_client, south_services):
         def is_svc_in_service_registry(name):
             return next((svc for svc in services_from_registry if svc._name == name), None)
 
+        # One scan of each table for all the services, joined below
+        schedules_status, tracked_assets, asset_counts = await asyncio.gather(
+            _get_schedules_status(storage_client), _get_tracked_assets(storage_client), _get_asset_counts())
+
+        def assets_and_readings(svc_name):
+            return [{"count": asset_counts[asset], "asset": asset}
+                    for asset in tracked_assets.get(svc_name, []) if asset in asset_counts]
+
         for s_record in services_from_registry:
             sr_list.append(
                 {
@@ -52,8 +92,8 @@ async def _services_with_assets(storage_client, south_services):
                     'service_port': s_record._port,
                     'protocol': s_record._protocol,
                     'status': ServiceRecord.Status(int(s_record._status)).name.lower(),
-                    'assets': await _get_tracked_assets_and_readings(storage_client, s_record._name),
-                    'schedule_enabled': await _get_schedule_status(storage_client, s_record._name)
+                    'assets': assets_and_readings(s_record._name),
+                    'schedule_enabled': schedules_status.get(s_record._name, False)
                 })
         for s_name in south_services:
             south_svc = is_svc_in_service_registry(s_name)
@@ -66,8 +106,8 @@ async def _services_with_assets(storage_client, south_services):
                         'service_port': '',
                         'protocol': '',
                         'status': '',
-                        'assets': await _get_tracked_assets_and_readings(storage_client, s_name),
-                        'schedule_enabled': await _get_schedule_status(storage_client, s_name)
+                        'assets': assets_and_readings(s_name),
+                        'schedule_enabled': schedules_status.get(s_name, False)
                     })
     except:
         raise
@@ -75,27 +115,6 @@ async def _services_with_assets(storage_client, south_services):
         return sr_list
 
 
-async def _get_tracked_assets_and_readings(storage_client, svc_name):
-    asset_json = []
-    payload = PayloadBuilder().SELECT("asset").WHERE(['service', '=', svc_name]).payload()
-    try:
-        result = await storage_client.query_tbl_with_payload('asset_tracker', payload)
-        asset_records = result['rows']
-
-        _readings_client = connect.get_readings_async()
-        for r in asset_records:
-            payload = PayloadBuilder().AGGREGATE(["count", "*"]).ALIAS("aggregate", ("*", "count", "count")) \
-                .GROUP_BY("asset_code").WHERE(['asset_code', '=', r["asset"]]).payload()
-            results = await _readings_client.query(payload)
-            if int(results['count']):
-                r = results['rows'][0]
-                asset_json.append({"count": r['count'], "asset": r['asset_code']})
-    except:
-        raise
-    else:
-        return asset_json
-
-
 async def get_south_services(request):
     """
     Args:
@@ -104,6 +123,8 @@ async def get_south_services(request):
     Returns:
             list of all south services with tracked assets and readings count
 
+            The readings count of the assets is cached for a few seconds
+
     :Example:
             curl -X GET http://localhost:8081/foglamp/south
     """
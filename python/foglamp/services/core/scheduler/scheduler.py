@@ -9,6 +9,8 @@
 import asyncio
 import collections
 import datetime
+import heapq
+import itertools
 import logging
 import math
 import time
@@ -22,6 +24,7 @@ from foglamp.common import logger
 from foglamp.common.audit_logger import AuditLogger
 from foglamp.services.core.scheduler.entities import *
 from foglamp.services.core.scheduler.exceptions import *
+from foglamp.services.core.scheduler.warm_worker_pool import WarmWorkerPool
 from foglamp.common.storage_client.exceptions import *
 from foglamp.common.storage_client.payload_builder import PayloadBuilder
 from foglamp.common.storage_client.storage_client import StorageClientAsync
@@ -118,6 +121,10 @@ class Scheduler(object):
     _PURGE_TASKS_FREQUENCY_SECONDS = _DAY_SECONDS
     """How frequently to purge the tasks table"""
 
+    _MIN_SCHEDULE_HEAP_COMPACT_SIZE = 256
+    """The timer heap is rebuilt without its superseded entries when it grows beyond this size and
+    twice the number of schedule executions"""
+
     # Mostly constant class attributes
     _logger = None  # type: logging.Logger
 
@@ -158,6 +165,13 @@ class Scheduler(object):
         """Dictionary of schedules.id to _ScheduleRow"""
         self._schedule_executions = dict()
         """Dictionary of schedules.id to _ScheduleExecution"""
+        self._schedule_heap = []
+        """Timer heap of (next_start_time, sequence, schedules.id). An entry is superseded when
+        next_start_time of the schedule execution no longer matches it"""
+        self._schedule_heap_sequence = itertools.count()
+        """Orders heap entries with the same next_start_time, as ids are not meant to be compared"""
+        self._start_now_schedules = set()
+        """Set of schedules.id queued to start via :meth:`queue_task`"""
         self._task_processes = dict()
         """Dictionary of tasks.id to _TaskProcess"""
         self._check_processes_pending = False
@@ -174,6 +188,10 @@ class Scheduler(object):
         """Delete finished task rows when they become this old"""
         self._purge_tasks_task = None  # type: asyncio.Task
         """asynico task for :meth:`purge_tasks`, if scheduled to run"""
+        self._warm_workers_enabled = False
+        """When True, Python tasks are forked from a warm worker instead of started by their script"""
+        self._warm_worker_pool = None  # type: WarmWorkerPool
+        """Starts tasks through the warm worker, None when warm workers are disabled"""
 
     @property
     def max_completed_task_age(self) -> datetime.timedelta:
@@ -301,8 +319,17 @@ class Scheduler(object):
         task_process = self._TaskProcess()
         task_process.start_time = time.time()
 
+        process = None
+        if self._warm_worker_pool is not None and self._warm_worker_pool.can_run(args_to_exec):
+            try:
+                process = await self._warm_worker_pool.start_task(args_to_exec)
+            except Exception as ex:
+                self._logger.warning("Unable to start schedule '%s' process '%s' with the warm worker, %s",
+                                     schedule.name, schedule.process_name, str(ex))
+
         try:
-            process = await asyncio.create_subprocess_exec(*args_to_exec, cwd=_SCRIPTS_DIR)
+            if process is None:
+                process = await asyncio.create_subprocess_exec(*args_to_exec, cwd=_SCRIPTS_DIR)
         except EnvironmentError:
             self._logger.exception(
                 "Unable to start schedule '%s' process '%s'\n%s",
@@ -380,21 +407,54 @@ class Scheduler(object):
                     time.time() - self._last_task_purge_time) >= self._PURGE_TASKS_FREQUENCY_SECONDS):
             self._purge_tasks_task = asyncio.ensure_future(self.purge_tasks())
 
+    def _push_schedule(self, schedule_id, schedule_execution):
+        """Adds the schedule to the timer heap at its next_start_time"""
+        if schedule_execution.next_start_time is None:
+            return
+
+        if len(self._schedule_heap) > max(self._MIN_SCHEDULE_HEAP_COMPACT_SIZE,
+                                          2 * len(self._schedule_executions)):
+            self._schedule_heap = [entry for entry in self._schedule_heap
+                                   if self._is_schedule_heap_entry_current(entry)]
+            heapq.heapify(self._schedule_heap)
+
+        heapq.heappush(self._schedule_heap, (schedule_execution.next_start_time,
+                                             next(self._schedule_heap_sequence), schedule_id))
+
+    def _is_schedule_heap_entry_current(self, entry):
+        next_start_time, _, schedule_id = entry
+        schedule_execution = self._schedule_executions.get(schedule_id)
+        return schedule_execution is not None and schedule_execution.next_start_time == next_start_time
+
     async def _check_schedules(self):
-        """Starts tasks according to schedules based on the current time"""
-        earliest_start_time = None
+        """Starts tasks according to schedules based on the current time
 
-        # Can not iterate over _schedule_executions - it can change mid-iteration
-        for schedule_id in list(self._schedule_executions.keys()):
+        Only the schedules queued by :meth:`queue_task` and the schedules due at the head
+        of the timer heap are looked at.
+
+        Returns:
+            The earliest time a task is due to start, None when tasks can not be started
+        """
+        now = self.current_time if self.current_time else time.time()
+
+        # Schedules started by their queued manual execution, which stands for the run due in this call
+        started_now = set()
+
+        # Can not iterate over _start_now_schedules - it can change mid-iteration
+        for schedule_id in list(self._start_now_schedules):
             if self._paused or len(self._task_processes) >= self._max_running_tasks:
                 return None
 
-            schedule_execution = self._schedule_executions[schedule_id]
+            schedule_execution = self._schedule_executions.get(schedule_id)
+            if schedule_execution is None or not schedule_execution.start_now:
+                self._start_now_schedules.discard(schedule_id)
+                continue
 
             try:
                 schedule = self._schedules[schedule_id]
             except KeyError:
                 # The schedule has been deleted
+                self._start_now_schedules.discard(schedule_id)
                 if not schedule_execution.task_processes:
                     del self._schedule_executions[schedule_id]
                 continue
@@ -403,54 +463,71 @@ class Scheduler(object):
                 continue
 
             if schedule.exclusive and schedule_execution.task_processes:
+                # Retried when the running task completes
+                continue
+
+            # Manual start - don't change next_start_time
+            self._start_now_schedules.discard(schedule_id)
+            await self._start_task(schedule)
+            started_now.add(schedule_id)
+
+            # The choice to put this after "await" above was
+            # deliberate. The above "await" could have allowed
+            # queue_task() to run. The following line
+            # will undo that because, after all, the task started.
+            schedule_execution.start_now = False
+
+        # Entries pushed while starting the due ones wait for the next call, so that
+        # a schedule starts at most once per call
+        due_entries = []
+        while self._schedule_heap and self._schedule_heap[0][0] <= now:
+            due_entries.append(heapq.heappop(self._schedule_heap))
+
+        for index, entry in enumerate(due_entries):
+            if self._paused or len(self._task_processes) >= self._max_running_tasks:
+                for unprocessed_entry in due_entries[index:]:
+                    heapq.heappush(self._schedule_heap, unprocessed_entry)
+                return None
+
+            if not self._is_schedule_heap_entry_current(entry):
                 continue
 
-            # next_start_time is None when repeat is None until the
-            # task completes, at which time schedule_execution is removed
-            next_start_time = schedule_execution.next_start_time
-            if not next_start_time and not schedule_execution.start_now:
+            schedule_id = entry[2]
+            schedule_execution = self._schedule_executions[schedule_id]
+
+            try:
+                schedule = self._schedules[schedule_id]
+            except KeyError:
+                # The schedule has been deleted
                 if not schedule_execution.task_processes:
                     del self._schedule_executions[schedule_id]
                 continue
 
-            if next_start_time and not schedule_execution.start_now:
-                now = self.current_time if self.current_time else time.time()
-                right_time = now >= next_start_time
-            else:
-                right_time = False
+            # A disabled schedule is pushed again when it is enabled
+            if schedule.enabled is False:
+                continue
 
-            if right_time or schedule_execution.start_now:
-                # Start a task
+            # An exclusive schedule is pushed again by _schedule_next_task when its task completes
+            if schedule.exclusive and schedule_execution.task_processes:
+                continue
 
-                if not right_time:
-                    # Manual start - don't change next_start_time
-                    pass
-                elif schedule.exclusive:
-                    # Exclusive tasks won't start again until they terminate
-                    # Or the schedule doesn't repeat
-                    next_start_time = None
-                else:
-                    # _schedule_next_task alters next_start_time
-                    self._schedule_next_task(schedule)
-                    next_start_time = schedule_execution.next_start_time
+            if not schedule.exclusive:
+                # _schedule_next_task alters next_start_time and pushes the schedule
+                self._schedule_next_task(schedule)
 
-                await self._start_task(schedule)
+            if schedule_id in started_now:
+                # The task doesn't start twice even when nonexclusive
+                continue
 
-                # Queued manual execution is ignored when it was
-                # already time to run the task. The task doesn't
-                # start twice even when nonexclusive.
-                # The choice to put this after "await" above was
-                # deliberate. The above "await" could have allowed
-                # queue_task() to run. The following line
-                # will undo that because, after all, the task started.
-                schedule_execution.start_now = False
+            await self._start_task(schedule)
 
-            # Keep track of the earliest next_start_time
-            if next_start_time and (earliest_start_time is None or
-                                            earliest_start_time > next_start_time):
-                earliest_start_time = next_start_time
+            # Queued manual execution is ignored when it was
+            # already time to run the task. The task doesn't
+            # start twice even when nonexclusive.
+            schedule_execution.start_now = False
 
-        return earliest_start_time
+        # The head may have been superseded, in which case the loop wakes up early for nothing
+        return self._schedule_heap[0][0] if self._schedule_heap else None
 
     async def _scheduler_loop(self):
         """Main loop for the scheduler"""
@@ -583,6 +660,8 @@ class Scheduler(object):
                 "Scheduled task for schedule '%s' to start at %s", schedule.name,
                 datetime.datetime.fromtimestamp(schedule_execution.next_start_time))
 
+        self._push_schedule(schedule.id, schedule_execution)
+
     def _schedule_first_task(self, schedule, current_time):
         """Determines the time when a task for a schedule will start.
 
@@ -631,6 +710,8 @@ class Scheduler(object):
         elif schedule.type == Schedule.Type.STARTUP:
             schedule_execution.next_start_time = current_time
 
+        self._push_schedule(schedule.id, schedule_execution)
+
         if self._logger.isEnabledFor(logging.INFO):
             self._logger.info(
                 "Scheduled task for schedule '%s' to start at %s", schedule.name,
@@ -724,6 +805,13 @@ class Scheduler(object):
                 "default": str(self._DEFAULT_MAX_COMPLETED_TASK_AGE_DAYS),
                 "displayName": "Max Age Of Task (In days)"
             },
+            "warm_workers": {
+                "description": "Start the Python tasks, such as purge, statistics and north, from a pre-forked "
+                               "worker process that has already imported them, instead of a new interpreter",
+                "type": "boolean",
+                "default": "false",
+                "displayName": "Warm Workers"
+            },
         }
 
         cfg_manager = ConfigurationManager(self._storage_async)
@@ -733,6 +821,7 @@ class Scheduler(object):
         self._max_running_tasks = int(config['max_running_tasks']['value'])
         self._max_completed_task_age = datetime.timedelta(
             seconds=int(config['max_completed_task_age_days']['value']) * self._DAY_SECONDS)
+        self._warm_workers_enabled = config['warm_workers']['value'] == 'true'
 
     async def start(self):
         """Starts the scheduler
@@ -783,6 +872,15 @@ class Scheduler(object):
         await self._mark_tasks_interrupted()
         await self._read_storage()
 
+        if self._warm_workers_enabled:
+            warm_worker_pool = WarmWorkerPool()
+            try:
+                await warm_worker_pool.start()
+                self._warm_worker_pool = warm_worker_pool
+            except Exception as ex:
+                self._logger.warning('Unable to start the warm worker, tasks are started by their script. %s',
+                                     str(ex))
+
         self._ready = True
 
         self._scheduler_loop_task = asyncio.ensure_future(self._scheduler_loop())
@@ -875,6 +973,10 @@ class Scheduler(object):
             if task_count != 0:
                 raise TimeoutError("Timeout Error: Could not stop scheduler as {} tasks are pending".format(task_count))
 
+        if self._warm_worker_pool is not None:
+            await self._warm_worker_pool.stop()
+            self._warm_worker_pool = None
+
         self._schedule_executions = None
         self._task_processes = None
         self._schedules = None
@@ -1364,6 +1466,7 @@ class Scheduler(object):
             self._schedule_executions[schedule_row.id] = schedule_execution
 
         schedule_execution.start_now = True
+        self._start_now_schedules.add(schedule_id)
 
         self._logger.debug("Queued schedule '%s' for execution", schedule_row.name)
         self._resume_check_schedules()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+"""Starts scheduled Python tasks through the warm worker, see foglamp.tasks.common.warm_worker"""
+
+import asyncio
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+
+from foglamp.common import logger
+from foglamp.tasks.common.warm_worker import TASK_MODULES
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+_logger = logger.setup(__name__)
+
+_FOGLAMP_ROOT = os.getenv("FOGLAMP_ROOT", default='/usr/local/foglamp')
+_PYTHON_DIR = os.path.expanduser(_FOGLAMP_ROOT + '/python')
+
+
+class WarmTaskProcess(object):
+    """ A task forked by the warm worker
+
+    Provides the subset of asyncio.subprocess.Process used by the scheduler: pid, returncode, wait(),
+    terminate() and kill().
+    """
+
+    _EXITED_POLL_SECONDS = 1
+    """ How often to check whether the task is still running when the warm worker went away """
+
+    def __init__(self, pid, reader, writer):
+        self.pid = pid
+        self.returncode = None
+        self._reader = reader
+        self._writer = writer
+
+    async def wait(self):
+        """ Waits for the task to exit and returns its exit code """
+        if self.returncode is not None:
+            return self.returncode
+        try:
+            line = await self._reader.readline()
+            self.returncode = json.loads(line.decode())['exit_code']
+        except (ValueError, KeyError):
+            # The warm worker went away, its orphaned task can no longer be waited on
+            _logger.warning('Lost the exit code of task pid %s, the warm worker exited', self.pid)
+            while self._is_running():
+                await asyncio.sleep(self._EXITED_POLL_SECONDS)
+            self.returncode = 1
+        finally:
+            self._writer.close()
+        return self.returncode
+
+    def _is_running(self):
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class WarmWorkerPool(object):
+    """ Keeps a warm worker process running and starts the Python tasks it knows about through it
+
+    Each task still runs in its own process, forked from the warm worker, which saves the interpreter
+    start-up and the imports of every run.
+    """
+
+    _START_TIMEOUT_SECONDS = 30
+    """ Maximum number of seconds to wait for the warm worker to listen """
+
+    _START_POLL_SECONDS = 0.1
+
+    def __init__(self):
+        self._socket_dir = None
+        self._socket_path = None
+        self._process = None  # type: asyncio.subprocess.Process
+
+    @staticmethod
+    def can_run(args):
+        """ True when the scheduled process script, args[0], is a task the warm worker can run """
+        return len(args) > 0 and args[0] in TASK_MODULES
+
+    async def start(self):
+        """ Starts the warm worker and waits for it to listen
+
+        Raises:
+            TimeoutError: the warm worker did not start listening in time
+        """
+        if self._socket_dir is None:
+            # Only the user running FogLAMP can reach the socket
+            self._socket_dir = tempfile.mkdtemp(prefix='foglamp-warm-worker-')
+            self._socket_path = os.path.join(self._socket_dir, 'worker.sock')
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'foglamp.tasks.common.warm_worker', '--socket', self._socket_path,
+            cwd=_PYTHON_DIR if os.path.isdir(_PYTHON_DIR) else None)
+
+        for _ in range(int(self._START_TIMEOUT_SECONDS / self._START_POLL_SECONDS)):
+            if os.path.exists(self._socket_path):
+                _logger.info('Warm worker started, pid %s', self._process.pid)
+                return
+            if self._process.returncode is not None:
+                break
+            await asyncio.sleep(self._START_POLL_SECONDS)
+        await self._stop_process()
+        raise TimeoutError('The warm worker did not start')
+
+    async def start_task(self, args):
+        """ Starts a task through the warm worker, restarting the warm worker if it exited
+
+        Args:
+            args: the scheduled process script followed by the task arguments
+
+        Returns:
+            WarmTaskProcess
+
+        Raises:
+            EnvironmentError: the task could not be started
+        """
+        if self._process is None or self._process.returncode is not None:
+            await self.start()
+
+        reader, writer = await asyncio.open_unix_connection(self._socket_path)
+        writer.write((json.dumps({"script": args[0], "args": args[1:]}) + '\n').encode())
+        try:
+            response = json.loads((await reader.readline()).decode())
+        except ValueError:
+            response = {}
+        if 'pid' not in response:
+            writer.close()
+            raise EnvironmentError(response.get('error', 'The warm worker did not start the task'))
+        return WarmTaskProcess(response['pid'], reader, writer)
+
+    async def stop(self):
+        """ Stops the warm worker, tasks already started keep running """
+        await self._stop_process()
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+            self._socket_path = None
+
+    async def _stop_process(self):
+        if self._process is None:
+            return
+        if self._process.returncode is None:
+            try:
+                self._process.terminate()
+            except ProcessLookupError:
+                pass
+            await self._process.wait()
+        self._process = None
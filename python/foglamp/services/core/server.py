@@ -8,6 +8,8 @@
 """Core server module"""
 
 import asyncio
+import collections
+import contextlib
 import os
 import subprocess
 import sys
@@ -50,7 +52,8 @@ __copyright__ = "Copyright (c) 2017-2018 OSIsoft, LLC"
 __license__ = "Apache 2.0"
 __version__ = "${VERSION}"
 
-_logger = logger.setup(__name__, level=20)
+# Every REST API request is logged, the logging of the core is then queued
+_logger = logger.setup(__name__, level=20, queued=True)
 
 # FOGLAMP_ROOT env variable
 _FOGLAMP_DATA = os.getenv("FOGLAMP_DATA", default=None)
@@ -221,6 +224,9 @@ class Server:
     _asset_tracker = None
     """ Asset tracker """
 
+    start_up_phases = None
+    """ Seconds taken by each phase of the last start-up, by phase name """
+
     service_app, service_server, service_server_handler = None, None, None
     core_app, core_server, core_server_handler = None, None, None
 
@@ -422,13 +428,12 @@ class Server:
 
     @classmethod
     async def _get_storage_client(cls):
-        storage_service = None
-        while storage_service is None and cls._storage_client_async is None:
+        # resolved by the registration of the storage service, no polling of the registry
+        storage_service = await ServiceRegistry.wait_for(name="FogLAMP Storage")
+        while cls._storage_client_async is None:
             try:
-                found_services = ServiceRegistry.get(name="FogLAMP Storage")
-                storage_service = found_services[0]
                 cls._storage_client_async = StorageClientAsync(cls._host, cls.core_management_port, svc=storage_service)
-            except (service_registry_exceptions.DoesNotExist, InvalidServiceInstance, StorageServiceUnavailable, Exception) as ex:
+            except (InvalidServiceInstance, StorageServiceUnavailable, Exception) as ex:
                 await asyncio.sleep(5)
         while cls._readings_client_async is None:
             try:
@@ -528,27 +533,41 @@ class Server:
 
     @classmethod
     def _check_readings_table(cls, loop):
-        total_count_payload = payload_builder.PayloadBuilder().AGGREGATE(["count", "*"]).ALIAS("aggregate", (
-                                "*", "count", "count")).payload()
+        # Only whether the tables are empty matters, a single row is read instead of counting them all
+        exists_payload = payload_builder.PayloadBuilder().SELECT("id").LIMIT(1).payload()
         result = loop.run_until_complete(
-            cls._readings_client_async.query(total_count_payload))
-        total_count = result['rows'][0]['count']
+            cls._readings_client_async.query(exists_payload))
 
-        if (total_count == 0):
+        if len(result['rows']) == 0:
             _logger.info("'foglamp.readings' table is empty, force reset of 'foglamp.streams' last_objects")
 
-            # Get total count of streams
             result = loop.run_until_complete(
-                cls._storage_client_async.query_tbl_with_payload('streams', total_count_payload))
-            total_streams_count = result['rows'][0]['count']
+                cls._storage_client_async.query_tbl_with_payload('streams', exists_payload))
 
             # If streams table is non empty, then initialize it
-            if (total_streams_count != 0):
+            if len(result['rows']) != 0:
                 payload = payload_builder.PayloadBuilder().SET(last_object=0, ts='now()').payload()
                 loop.run_until_complete(cls._storage_client_async.update_tbl("streams", payload))
         else:
-            _logger.info("'foglamp.readings' has " + str(
-                total_count) + " rows, 'foglamp.streams' last_objects reset is not required")
+            _logger.info("'foglamp.readings' is not empty, 'foglamp.streams' last_objects reset is not required")
+
+    @classmethod
+    async def _storage_pool_config(cls):
+        """ Sizes the storage connection pool of the core from its configuration category
+
+        The session opened by the previous start-up phases is closed, the next request opens one with the pool.
+        """
+        try:
+            category = StorageClientAsync.POOL_CATEGORY
+            await cls._configuration_manager.create_category(category, StorageClientAsync.POOL_CATEGORY_CONFIG,
+                                                             'Storage Client Connection Pool', True,
+                                                             display_name='Storage Pool')
+            config = await cls._configuration_manager.get_category_all_items(category)
+            StorageClientAsync.configure_connection_pool(config)
+            await StorageClientAsync.close_session()
+        except Exception as ex:
+            _logger.exception(str(ex))
+            raise
 
     @classmethod
     async def _config_parents(cls):
@@ -563,7 +582,7 @@ class Server:
         # Create the parent category for all advanced configuration categories
         try:
             await cls._configuration_manager.create_category("Advanced", {}, 'Advanced', True)
-            await cls._configuration_manager.create_child_category("Advanced", ["SMNTR", "SCHEDULER"])
+            await cls._configuration_manager.create_child_category("Advanced", ["SMNTR", "SCHEDULER", StorageClientAsync.POOL_CATEGORY])
         except KeyError:
             _logger.error('Failed to create Advanced parent configuration category for service')
             raise
@@ -580,87 +599,110 @@ class Server:
         cls._asset_tracker = AssetTracker(cls._storage_client_async)
         await cls._asset_tracker.load_asset_records()
 
+    @classmethod
+    @contextlib.contextmanager
+    def _start_up_phase(cls, name):
+        """ Times a phase of the start-up into start_up_phases """
+        start = time.time()
+        yield
+        cls.start_up_phases[name] = round(time.time() - start, 3)
+        _logger.info("Start-up phase %s completed in %.3f seconds", name, cls.start_up_phases[name])
+
     @classmethod
     def _start_core(cls, loop=None):
         _logger.info("start core")
+        cls.start_up_phases = collections.OrderedDict()
+        start = time.time()
 
         try:
             host = cls._host
 
-            cls.core_app = cls._make_core_app()
-            cls.core_server, cls.core_server_handler = cls._start_app(loop, cls.core_app, host, 0)
-            address, cls.core_management_port = cls.core_server.sockets[0].getsockname()
-            _logger.info('Management API started on http://%s:%s', address, cls.core_management_port)
+            with cls._start_up_phase('management'):
+                cls.core_app = cls._make_core_app()
+                cls.core_server, cls.core_server_handler = cls._start_app(loop, cls.core_app, host, 0)
+                address, cls.core_management_port = cls.core_server.sockets[0].getsockname()
+                _logger.info('Management API started on http://%s:%s', address, cls.core_management_port)
             # see http://<core_mgt_host>:<core_mgt_port>/foglamp/service for registered services
-            # start storage
-            loop.run_until_complete(cls._start_storage(loop))
+            with cls._start_up_phase('storage'):
+                # start storage
+                loop.run_until_complete(cls._start_storage(loop))
 
-            # get storage client
-            loop.run_until_complete(cls._get_storage_client())
+                # get storage client
+                loop.run_until_complete(cls._get_storage_client())
 
-            # If readings table is empty, set last_object of all streams to 0
-            cls._check_readings_table(loop)
+                # If readings table is empty, set last_object of all streams to 0
+                cls._check_readings_table(loop)
 
             # obtain configuration manager and interest registry
             cls._configuration_manager = ConfigurationManager(cls._storage_client_async)
             cls._interest_registry = InterestRegistry(cls._configuration_manager)
 
+            loop.run_until_complete(cls._storage_pool_config())
+
             # start scheduler
             # see scheduler.py start def FIXME
             # scheduler on start will wait for storage service registration
-            loop.run_until_complete(cls._start_scheduler())
+            with cls._start_up_phase('scheduler'):
+                loop.run_until_complete(cls._start_scheduler())
 
             # start monitor
-            loop.run_until_complete(cls._start_service_monitor())
-
-            loop.run_until_complete(cls.rest_api_config())
-            cls.service_app = cls._make_app(auth_required=cls.is_auth_required)
-            # ssl context
-            ssl_ctx = None
-            if not cls.is_rest_server_http_enabled:
-                # ensure TLS 1.2 and SHA-256
-                # handle expiry?
-                ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-                cert, key = cls.get_certificates()
-                _logger.info('Loading certificates %s and key %s', cert, key)
-                ssl_ctx.load_cert_chain(cert, key)
-
-            # Get the service data and advertise the management port of the core
-            # to allow other microservices to find FogLAMP
-            loop.run_until_complete(cls.service_config())
-            _logger.info('Announce management API service')
-            cls.management_announcer = ServiceAnnouncer('core.{}'.format(cls._service_name), cls._MANAGEMENT_SERVICE, cls.core_management_port,
-                                                        ['The FogLAMP Core REST API'])
-
-            cls.service_server, cls.service_server_handler = cls._start_app(loop, cls.service_app, host, cls.rest_server_port, ssl_ctx=ssl_ctx)
-            address, service_server_port = cls.service_server.sockets[0].getsockname()
-
-            # Write PID file with REST API details
-            cls._write_pid(address, service_server_port)
-
-            _logger.info('REST API Server started on %s://%s:%s', 'http' if cls.is_rest_server_http_enabled else 'https',
-                         address, service_server_port)
-
-            # All services are up so now we can advertise the Admin and User REST API's
-            cls.admin_announcer = ServiceAnnouncer(cls._service_name, cls._ADMIN_API_SERVICE, service_server_port,
-                                                   [cls._service_description])
-            cls.user_announcer = ServiceAnnouncer(cls._service_name, cls._USER_API_SERVICE, service_server_port,
-                                                  [cls._service_description])
+            with cls._start_up_phase('monitor'):
+                loop.run_until_complete(cls._start_service_monitor())
+
+            with cls._start_up_phase('rest'):
+                loop.run_until_complete(cls.rest_api_config())
+                cls.service_app = cls._make_app(auth_required=cls.is_auth_required)
+                # ssl context
+                ssl_ctx = None
+                if not cls.is_rest_server_http_enabled:
+                    # ensure TLS 1.2 and SHA-256
+                    # handle expiry?
+                    ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                    cert, key = cls.get_certificates()
+                    _logger.info('Loading certificates %s and key %s', cert, key)
+                    ssl_ctx.load_cert_chain(cert, key)
+
+                # Get the service data
+                loop.run_until_complete(cls.service_config())
+
+                cls.service_server, cls.service_server_handler = cls._start_app(loop, cls.service_app, host, cls.rest_server_port, ssl_ctx=ssl_ctx)
+                address, service_server_port = cls.service_server.sockets[0].getsockname()
+
+                # Write PID file with REST API details
+                cls._write_pid(address, service_server_port)
+
+                _logger.info('REST API Server started on %s://%s:%s', 'http' if cls.is_rest_server_http_enabled else 'https',
+                             address, service_server_port)
+
+            with cls._start_up_phase('announcers'):
+                # Advertise the management port of the core to allow other microservices to find FogLAMP
+                _logger.info('Announce management API service')
+                cls.management_announcer = ServiceAnnouncer('core.{}'.format(cls._service_name), cls._MANAGEMENT_SERVICE,
+                                                            cls.core_management_port, ['The FogLAMP Core REST API'])
+
+                # All services are up so now we can advertise the Admin and User REST API's
+                cls.admin_announcer = ServiceAnnouncer(cls._service_name, cls._ADMIN_API_SERVICE, service_server_port,
+                                                       [cls._service_description])
+                cls.user_announcer = ServiceAnnouncer(cls._service_name, cls._USER_API_SERVICE, service_server_port,
+                                                      [cls._service_description])
             # register core
             # a service with 2 web server instance,
             # registering now only when service_port is ready to listen the request
             # TODO: if ssl then register with protocol https
             cls._register_core(host, cls.core_management_port, service_server_port)
 
-            # Create the configuration category parents
-            loop.run_until_complete(cls._config_parents())
+            with cls._start_up_phase('configuration'):
+                # Create the configuration category parents
+                loop.run_until_complete(cls._config_parents())
 
-            # Start asset tracker
-            loop.run_until_complete(cls._start_asset_tracker())
+                # Start asset tracker
+                loop.run_until_complete(cls._start_asset_tracker())
 
-            # Everything is complete in the startup sequence, write the audit log entry
+            # Everything is complete in the startup sequence, write the audit log entry with the time of each phase
+            total = round(time.time() - start, 3)
+            _logger.info("Start-up completed in %.3f seconds: %s", total, dict(cls.start_up_phases))
             cls._audit = AuditLogger(cls._storage_client_async)
-            loop.run_until_complete(cls._audit.information('START', None))
+            loop.run_until_complete(cls._audit.information('START', {'startUp': cls.start_up_phases, 'total': total}))
 
             loop.run_forever()
 
@@ -706,6 +748,9 @@ class Server:
             cls._audit = AuditLogger(cls._storage_client_async)
             await cls._audit.information('FSTOP', None)
 
+            # close pooled connections to storage before it goes away
+            await StorageClientAsync.close_session()
+
             # stop storage
             await cls.stop_storage()
 
@@ -867,45 +912,7 @@ class Server:
 
         try:
             data = await request.json()
-
-            service_name = data.get('name', None)
-            service_type = data.get('type', None)
-            service_address = data.get('address', None)
-            service_port = data.get('service_port', None)
-            service_management_port = data.get('management_port', None)
-            service_protocol = data.get('protocol', 'http')
-
-            if not (service_name.strip() or service_type.strip() or service_address.strip()
-                    or service_management_port.strip() or not service_management_port.isdigit()):
-                raise web.HTTPBadRequest(reason='One or more values for type/name/address/management port missing')
-
-            if service_port is not None:
-                if not (isinstance(service_port, int)):
-                    raise web.HTTPBadRequest(reason="Service's service port can be a positive integer only")
-
-            if not isinstance(service_management_port, int):
-                raise web.HTTPBadRequest(reason='Service management port can be a positive integer only')
-
-            try:
-                registered_service_id = ServiceRegistry.register(service_name, service_type, service_address,
-                                                                   service_port, service_management_port, service_protocol)
-                try:
-                    if not cls._storage_client_async is None:
-                        cls._audit = AuditLogger(cls._storage_client_async)
-                        await cls._audit.information('SRVRG', { 'name' : service_name})
-                except Exception as ex:
-                    _logger.info("Failed to audit registration: %s", str(ex))
-            except service_registry_exceptions.AlreadyExistsWithTheSameName:
-                raise web.HTTPBadRequest(reason='A Service with the same name already exists')
-            except service_registry_exceptions.AlreadyExistsWithTheSameAddressAndPort:
-                raise web.HTTPBadRequest(reason='A Service is already registered on the same address: {} and '
-                                                'service port: {}'.format(service_address, service_port))
-            except service_registry_exceptions.AlreadyExistsWithTheSameAddressAndManagementPort:
-                raise web.HTTPBadRequest(reason='A Service is already registered on the same address: {} and '
-                                                'management port: {}'.format(service_address, service_management_port))
-
-            if not registered_service_id:
-                raise web.HTTPBadRequest(reason='Service {} could not be registered'.format(service_name))
+            registered_service_id = await cls._register_service(data)
 
             _response = {
                 'id': registered_service_id,
@@ -917,6 +924,105 @@ class Server:
         except ValueError as ex:
             raise web.HTTPNotFound(reason=str(ex))
 
+    @classmethod
+    async def _register_service(cls, data):
+        service_name = data.get('name', None)
+        service_type = data.get('type', None)
+        service_address = data.get('address', None)
+        service_port = data.get('service_port', None)
+        service_management_port = data.get('management_port', None)
+        service_protocol = data.get('protocol', 'http')
+
+        if not (service_name.strip() or service_type.strip() or service_address.strip()
+                or service_management_port.strip() or not service_management_port.isdigit()):
+            raise web.HTTPBadRequest(reason='One or more values for type/name/address/management port missing')
+
+        if service_port is not None:
+            if not (isinstance(service_port, int)):
+                raise web.HTTPBadRequest(reason="Service's service port can be a positive integer only")
+
+        if not isinstance(service_management_port, int):
+            raise web.HTTPBadRequest(reason='Service management port can be a positive integer only')
+
+        try:
+            registered_service_id = ServiceRegistry.register(service_name, service_type, service_address,
+                                                               service_port, service_management_port, service_protocol)
+            try:
+                if not cls._storage_client_async is None:
+                    cls._audit = AuditLogger(cls._storage_client_async)
+                    await cls._audit.information('SRVRG', { 'name' : service_name})
+            except Exception as ex:
+                _logger.info("Failed to audit registration: %s", str(ex))
+        except service_registry_exceptions.AlreadyExistsWithTheSameName:
+            raise web.HTTPBadRequest(reason='A Service with the same name already exists')
+        except service_registry_exceptions.AlreadyExistsWithTheSameAddressAndPort:
+            raise web.HTTPBadRequest(reason='A Service is already registered on the same address: {} and '
+                                            'service port: {}'.format(service_address, service_port))
+        except service_registry_exceptions.AlreadyExistsWithTheSameAddressAndManagementPort:
+            raise web.HTTPBadRequest(reason='A Service is already registered on the same address: {} and '
+                                            'management port: {}'.format(service_address, service_management_port))
+
+        if not registered_service_id:
+            raise web.HTTPBadRequest(reason='Service {} could not be registered'.format(service_name))
+
+        return registered_service_id
+
+    @classmethod
+    async def bootstrap(cls, request):
+        """ Applies the configuration a service declares at start-up and returns it in a single response
+
+        The categories are created (keeping their original items) in the given order, then the children are added.
+        The service, when given, is registered and the interests are registered for the service, or for service_id.
+
+        :Example:
+            curl -d '{"categories": [{"key": "Security", "description": "Microservices Security", "value": {}}],
+                "children": [{"parent": "General", "children": ["Security"]}],
+                "service": {"name": "Sine", "type": "Southbound", "address": "127.0.0.1", "management_port": 1090},
+                "interests": ["Security"], "track": true}' -X POST http://localhost:<core mgt port>/foglamp/service/bootstrap
+
+            returns {"categories": {"Security": {...}}, "service": {"id": "..."}, "interests": {"Security": "..."},
+                "track": [...]}
+        """
+        try:
+            data = await request.json()
+            if not isinstance(data, dict):
+                raise ValueError('Data payload must be a dictionary')
+
+            cf_mgr = ConfigurationManager(cls._storage_client_async)
+            categories = data.get('categories', [])
+            for category in categories:
+                await cf_mgr.create_category(category_name=category['key'],
+                                             category_description=category['description'],
+                                             category_value=category['value'],
+                                             display_name=category.get('display_name'),
+                                             keep_original_items=category.get('keep_original_items', True))
+                if category.get('children'):
+                    await cf_mgr.create_child_category(category['key'], category['children'])
+            for child in data.get('children', []):
+                await cf_mgr.create_child_category(child['parent'], child['children'])
+
+            result = {'categories': {}}
+            for category in categories:
+                result['categories'][category['key']] = await cf_mgr.get_category_all_items(category['key'])
+
+            service_id = data.get('service_id')
+            if data.get('service'):
+                service_id = await cls._register_service(data['service'])
+                result['service'] = {'id': service_id, 'message': "Service registered successfully"}
+
+            if data.get('interests'):
+                result['interests'] = {category_name: cls._register_interest(category_name, service_id)
+                                       for category_name in data['interests']}
+
+            if data.get('track'):
+                res = await asset_tracker_api.get_asset_tracker_events(request)
+                result['track'] = json.loads(res.body.decode())['track']
+
+        except (KeyError, ValueError, TypeError) as ex:
+            raise web.HTTPBadRequest(reason=str(ex))
+
+        return web.json_response(result)
+
     @classmethod
     async def unregister(cls, request):
         """ Unregister a service
@@ -1054,19 +1160,7 @@ class Server:
             data = await request.json()
             category_name = data.get('category', None)
             microservice_uuid = data.get('service', None)
-            if microservice_uuid is not None:
-                try:
-                    assert uuid.UUID(microservice_uuid)
-                except:
-                    raise ValueError('Invalid microservice id {}'.format(microservice_uuid))
-
-            try:
-                registered_interest_id = cls._interest_registry.register(microservice_uuid, category_name)
-            except interest_registry_exceptions.ErrorInterestRegistrationAlreadyExists:
-                raise web.HTTPBadRequest(reason='An InterestRecord already exists by microservice_uuid {} for category_name {}'.format(microservice_uuid, category_name))
-
-            if not registered_interest_id:
-                raise web.HTTPBadRequest(reason='Interest by microservice_uuid {} for category_name {} could not be registered'.format(microservice_uuid, category_name))
+            registered_interest_id = cls._register_interest(category_name, microservice_uuid)
 
             _response = {
                 'id': registered_interest_id,
@@ -1078,6 +1172,24 @@ class Server:
 
         return web.json_response(_response)
 
+    @classmethod
+    def _register_interest(cls, category_name, microservice_uuid):
+        if microservice_uuid is not None:
+            try:
+                assert uuid.UUID(microservice_uuid)
+            except:
+                raise ValueError('Invalid microservice id {}'.format(microservice_uuid))
+
+        try:
+            registered_interest_id = cls._interest_registry.register(microservice_uuid, category_name)
+        except interest_registry_exceptions.ErrorInterestRegistrationAlreadyExists:
+            raise web.HTTPBadRequest(reason='An InterestRecord already exists by microservice_uuid {} for category_name {}'.format(microservice_uuid, category_name))
+
+        if not registered_interest_id:
+            raise web.HTTPBadRequest(reason='Interest by microservice_uuid {} for category_name {} could not be registered'.format(microservice_uuid, category_name))
+
+        return registered_interest_id
+
     @classmethod
     async def unregister_interest(cls, request):
         """ Unregister an interest
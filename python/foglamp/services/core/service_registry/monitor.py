@@ -8,7 +8,9 @@
 
 import asyncio
 import aiohttp
+import collections
 import json
+import time
 from foglamp.common import logger
 from foglamp.common.audit_logger import AuditLogger
 from foglamp.common.configuration_manager import ConfigurationManager
@@ -35,6 +37,12 @@ class Monitor(object):
     _DEFAULT_RESTART_FAILED = "auto"
     """Restart failed microservice - manual/auto"""
 
+    _MAX_CONCURRENT_PINGS = 10
+    """Maximum number of services pinged at the same time"""
+
+    _PING_HISTORY_SIZE = 20
+    """Number of round trip times kept per service"""
+
     _logger = None
 
     def __init__(self):
@@ -53,9 +61,36 @@ class Monitor(object):
 
         self.restarted_services = []
 
+        self.ping_rtts = {}  # type: dict
+        """Round trip times (in milliseconds) of the last successful pings, per service id"""
+        self.round_duration = None  # type: float
+        """Duration (in milliseconds) of the last round of health checks"""
+
     async def _sleep(self, sleep_time):
         await asyncio.sleep(sleep_time)
 
+    async def _ping_service(self, session, semaphore, service_record):
+        """Pings a service, returns None if the service is running or the exception raised otherwise"""
+        url = "{}://{}:{}/foglamp/service/ping".format(
+            service_record._protocol, service_record._address, service_record._management_port)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with session.get(url, timeout=self._ping_timeout) as resp:
+                    text = await resp.text()
+                    res = json.loads(text)
+                    if res["uptime"] is None:
+                        raise ValueError('res.uptime is None')
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                return ex
+            rtt = round((time.perf_counter() - start) * 1000, 3)
+        if service_record._id not in self.ping_rtts:
+            self.ping_rtts[service_record._id] = collections.deque(maxlen=self._PING_HISTORY_SIZE)
+        self.ping_rtts[service_record._id].append(rtt)
+        return None
+
     async def _monitor_loop(self):
         """async Monitor loop to monitor registered services"""
         # check health of all micro-services every N seconds
@@ -63,67 +98,80 @@ class Monitor(object):
         check_count = {}  # dict to hold current count of current status.
                           # In case of ok and running status, count will always be 1.
                           # In case of of non running statuses, count shows since when this status is set.
-        while True:
-            round_cnt += 1
-            self._logger.debug("Starting next round#{} of service monitoring, sleep/i:{} ping/t:{} max/a:{}".format(
-                round_cnt, self._sleep_interval, self._ping_timeout, self._max_attempts))
-            for service_record in ServiceRegistry.all():
-                if service_record._id not in check_count:
-                    check_count.update({service_record._id: 1})
-
-                # Try ping if service status is either running or doubtful (i.e. give service a chance to recover)
-                if service_record._status not in [ServiceRecord.Status.Running,
-                                                  ServiceRecord.Status.Unresponsive,
-                                                  ServiceRecord.Status.Failed]:
-                    continue
-
-                self._logger.debug("Service: {} Status: {}".format(service_record._name, service_record._status))
-
-                if service_record._status == ServiceRecord.Status.Failed:
-                    if self._restart_failed == "auto":
-                        if service_record._id not in self.restarted_services:
-                            self.restarted_services.append(service_record._id)
-                            asyncio.ensure_future(self.restart_service(service_record))
-                    continue
-
-                try:
-                    url = "{}://{}:{}/foglamp/service/ping".format(
-                        service_record._protocol, service_record._address, service_record._management_port)
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(url, timeout=self._ping_timeout) as resp:
-                            text = await resp.text()
-                            res = json.loads(text)
-                            if res["uptime"] is None:
-                                raise ValueError('res.uptime is None')
-                except (asyncio.TimeoutError, aiohttp.client_exceptions.ServerTimeoutError) as ex:
-                    service_record._status = ServiceRecord.Status.Unresponsive
-                    check_count[service_record._id] += 1
-                    self._logger.info("ServerTimeoutError: %s, %s", str(ex), service_record.__repr__())
-                except aiohttp.client_exceptions.ClientConnectorError as ex:
-                    service_record._status = ServiceRecord.Status.Unresponsive
-                    check_count[service_record._id] += 1
-                    self._logger.info("ClientConnectorError: %s, %s", str(ex), service_record.__repr__())
-                except ValueError as ex:
-                    service_record._status = ServiceRecord.Status.Unresponsive
-                    check_count[service_record._id] += 1
-                    self._logger.info("Invalid response: %s, %s", str(ex), service_record.__repr__())
-                except Exception as ex:
-                    service_record._status = ServiceRecord.Status.Unresponsive
-                    check_count[service_record._id] += 1
-                    self._logger.info("Exception occurred: %s, %s", str(ex), service_record.__repr__())
-                else:
-                    service_record._status = ServiceRecord.Status.Running
-                    check_count[service_record._id] = 1
-
-                if check_count[service_record._id] > self._max_attempts:
-                    ServiceRegistry.mark_as_failed(service_record._id)
-                    check_count[service_record._id] = 0
-                    try:
-                        audit = AuditLogger(connect.get_storage_async())
-                        await audit.failure('SRVFL', {'name':service_record._name})
-                    except Exception as ex:
-                        self._logger.info("Failed to audit service failure %s", str(ex))
-            await self._sleep(self._sleep_interval)
+        # The services of a round are pinged at the same time, over a shared session
+        semaphore = asyncio.Semaphore(self._MAX_CONCURRENT_PINGS)
+        session = aiohttp.ClientSession()
+        try:
+            while True:
+                round_cnt += 1
+                self._logger.debug("Starting next round#{} of service monitoring, sleep/i:{} ping/t:{} max/a:{}".format(
+                    round_cnt, self._sleep_interval, self._ping_timeout, self._max_attempts))
+                round_start = time.perf_counter()
+                service_records = ServiceRegistry.all()
+                ping_records = []
+                for service_record in service_records:
+                    if service_record._id not in check_count:
+                        check_count.update({service_record._id: 1})
+
+                    # Try ping if service status is either running or doubtful (i.e. give service a chance to recover)
+                    if service_record._status not in [ServiceRecord.Status.Running,
+                                                      ServiceRecord.Status.Unresponsive,
+                                                      ServiceRecord.Status.Failed]:
+                        continue
+
+                    self._logger.debug("Service: {} Status: {}".format(service_record._name, service_record._status))
+
+                    if service_record._status == ServiceRecord.Status.Failed:
+                        if self._restart_failed == "auto":
+                            if service_record._id not in self.restarted_services:
+                                self.restarted_services.append(service_record._id)
+                                asyncio.ensure_future(self.restart_service(service_record))
+                        continue
+
+                    ping_records.append(service_record)
+
+                results = await asyncio.gather(*[self._ping_service(session, semaphore, service_record)
+                                                 for service_record in ping_records])
+
+                for service_record, ex in zip(ping_records, results):
+                    # The status may have been changed during the round, e.g. to Shutdown when unregistered
+                    if service_record._status not in [ServiceRecord.Status.Running,
+                                                      ServiceRecord.Status.Unresponsive]:
+                        continue
+
+                    if ex is None:
+                        service_record._status = ServiceRecord.Status.Running
+                        check_count[service_record._id] = 1
+                    else:
+                        service_record._status = ServiceRecord.Status.Unresponsive
+                        check_count[service_record._id] += 1
+                        if isinstance(ex, (asyncio.TimeoutError, aiohttp.client_exceptions.ServerTimeoutError)):
+                            self._logger.info("ServerTimeoutError: %s, %s", str(ex), service_record.__repr__())
+                        elif isinstance(ex, aiohttp.client_exceptions.ClientConnectorError):
+                            self._logger.info("ClientConnectorError: %s, %s", str(ex), service_record.__repr__())
+                        elif isinstance(ex, ValueError):
+                            self._logger.info("Invalid response: %s, %s", str(ex), service_record.__repr__())
+                        else:
+                            self._logger.info("Exception occurred: %s, %s", str(ex), service_record.__repr__())
+
+                    if check_count[service_record._id] > self._max_attempts:
+                        ServiceRegistry.mark_as_failed(service_record._id)
+                        check_count[service_record._id] = 0
+                        try:
+                            audit = AuditLogger(connect.get_storage_async())
+                            await audit.failure('SRVFL', {'name':service_record._name})
+                        except Exception as ex:
+                            self._logger.info("Failed to audit service failure %s", str(ex))
+
+                registered = set(service_record._id for service_record in service_records)
+                for service_id in [service_id for service_id in self.ping_rtts if service_id not in registered]:
+                    del self.ping_rtts[service_id]
+                self.round_duration = round((time.perf_counter() - round_start) * 1000, 3)
+                self._logger.debug("Round#{} of service monitoring pinged {} services in {} ms".format(
+                    round_cnt, len(ping_records), self.round_duration))
+                await self._sleep(self._sleep_interval)
+        finally:
+            await session.close()
 
     async def _read_config(self):
         """Reads configuration"""
@@ -22,6 +22,8 @@ __version__ = "${VERSION}"
 class ServiceRegistry:
 
     _registry = list()
+    # futures waiting for the registration of a service, by name
+    _waiters = dict()
     # INFO - level 20
     _logger = logger.setup(__name__, level=20)
 
@@ -71,8 +73,26 @@ class ServiceRegistry:
         registered_service = ServiceRecord(service_id, name, s_type, protocol, address, port, management_port)
         cls._registry.append(registered_service)
         cls._logger.info("Registered {}".format(str(registered_service)))
+        for waiter in cls._waiters.pop(name, []):
+            if not waiter.done():
+                waiter.set_result(registered_service)
         return service_id
 
+    @classmethod
+    def wait_for(cls, name, loop=None):
+        """ returns a future resolved with the service record as soon as the named service is registered
+
+        :param name: name of the service
+        :param loop: the event loop of the future, defaults to the current one
+        :return: asyncio.Future, already done if the service is registered
+        """
+        waiter = (loop or asyncio.get_event_loop()).create_future()
+        try:
+            waiter.set_result(cls.get(name=name)[0])
+        except service_registry_exceptions.DoesNotExist:
+            cls._waiters.setdefault(name, []).append(waiter)
+        return waiter
+
     @classmethod
     def _expunge(cls, service_id, service_status):
         """ removes the service instance from action
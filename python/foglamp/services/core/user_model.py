@@ -10,7 +10,9 @@
 """
 import uuid
 import hashlib
+import time
 
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import jwt
 
@@ -30,6 +32,9 @@ JWT_ALGORITHM = 'HS256'
 JWT_EXP_DELTA_SECONDS = 30*60  # 30 minutes
 ERROR_MSG = 'Something went wrong'
 USED_PASSWORD_HISTORY_COUNT = 3
+AUTH_CACHE_SIZE = 1024
+AUTH_CACHE_TTL_SECONDS = 60
+TOKEN_EXPIRY_WRITE_INTERVAL_SECONDS = 60
 
 
 class User:
@@ -72,6 +77,45 @@ class User:
 
     class Objects:
 
+        # Validated tokens, users by id and role ids by role name, kept in least recently used order and bounded by
+        # AUTH_CACHE_SIZE, so that authenticated requests do not query the storage; each entry is read again
+        # from the storage after AUTH_CACHE_TTL_SECONDS
+        _tokens = OrderedDict()
+        _users = OrderedDict()
+        _roles = OrderedDict()
+
+        @classmethod
+        def _cache_get(cls, cache, key):
+            entry = cache.get(key)
+            if entry is None:
+                return None
+            if entry['cached_until'] <= time.monotonic():
+                del cache[key]
+                return None
+            cache.move_to_end(key)
+            return entry
+
+        @classmethod
+        def _cache_put(cls, cache, key, **values):
+            values['cached_until'] = time.monotonic() + AUTH_CACHE_TTL_SECONDS
+            cache[key] = values
+            cache.move_to_end(key)
+            while len(cache) > AUTH_CACHE_SIZE:
+                cache.popitem(last=False)
+            return values
+
+        @classmethod
+        def _forget_user(cls, user_id):
+            cls._users.pop(str(user_id), None)
+            for token in [t for t, entry in cls._tokens.items() if str(entry['uid']) == str(user_id)]:
+                del cls._tokens[token]
+
+        @classmethod
+        def clear_cache(cls):
+            cls._tokens.clear()
+            cls._users.clear()
+            cls._roles.clear()
+
         @classmethod
         async def get_roles(cls):
             storage_client = connect.get_storage_async()
@@ -80,9 +124,14 @@ class User:
 
         @classmethod
         async def get_role_id_by_name(cls, name):
+            entry = cls._cache_get(cls._roles, name)
+            if entry is not None:
+                return entry['rows']
+
             storage_client = connect.get_storage_async()
             payload = PayloadBuilder().SELECT("id").WHERE(['name', '=', name]).payload()
             result = await storage_client.query_tbl_with_payload('roles', payload)
+            cls._cache_put(cls._roles, name, rows=result["rows"])
             return result["rows"]
 
         @classmethod
@@ -225,6 +274,13 @@ class User:
 
         @classmethod
         async def get(cls, uid=None, username=None):
+            # only the lookups by id, as done for each authenticated request, are cached
+            by_uid = uid is not None and username is None
+            if by_uid:
+                entry = cls._cache_get(cls._users, str(uid))
+                if entry is not None:
+                    return entry['user']
+
             users = await cls.filter(uid=uid, username=username)
             if len(users) == 0:
                 msg = ''
@@ -236,12 +292,23 @@ class User:
                     msg = "User with id:<{}> and name:<{}> does not exist".format(uid, username)
 
                 raise User.DoesNotExist(msg)
+            if by_uid:
+                cls._cache_put(cls._users, str(uid), user=users[0])
             return users[0]
 
         @classmethod
         async def refresh_token_expiry(cls, token):
-            storage_client = connect.get_storage_async()
             exp = datetime.now() + timedelta(seconds=JWT_EXP_DELTA_SECONDS)
+            entry = cls._tokens.get(token)
+            if entry is not None:
+                entry['expiration'] = exp
+                # the refreshes of a cached token are written at most once per interval,
+                # the expiry in the storage lags behind by TOKEN_EXPIRY_WRITE_INTERVAL_SECONDS at most
+                if time.monotonic() - entry['written'] < TOKEN_EXPIRY_WRITE_INTERVAL_SECONDS:
+                    return
+                entry['written'] = time.monotonic()
+
+            storage_client = connect.get_storage_async()
             payload = PayloadBuilder().SET(token_expiration=str(exp)).WHERE(['token', '=', token]).payload()
             await storage_client.update_tbl("user_logins", payload)
 
@@ -253,6 +320,13 @@ class User:
             :param token:
             :return:
             """
+            entry = cls._cache_get(cls._tokens, token)
+            if entry is not None:
+                if entry['expiration'] < datetime.now():
+                    del cls._tokens[token]
+                    raise User.TokenExpired("The token has expired, login again")
+                return entry['uid']
+
             storage_client = connect.get_storage_async()
             payload = PayloadBuilder().SELECT("token_expiration") \
                 .ALIAS("return", ("token_expiration", 'token_expiration')) \
@@ -278,6 +352,8 @@ class User:
             # as we want to refresh token on each successful request
             # and extend it to keep session alive
             user_payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={'verify_exp': False})
+            cls._cache_put(cls._tokens, token, uid=user_payload["uid"], expiration=datetime.strptime(token_expiry, fmt),
+                           written=time.monotonic())
             return user_payload["uid"]
 
         @classmethod
@@ -349,6 +425,7 @@ class User:
 
         @classmethod
         async def delete_user_tokens(cls, user_id):
+            cls._forget_user(user_id)
             storage_client = connect.get_storage_async()
             payload = PayloadBuilder().WHERE(['user_id', '=', user_id]).payload()
             try:
@@ -362,6 +439,7 @@ class User:
 
         @classmethod
         async def delete_token(cls, token):
+            cls._tokens.pop(token, None)
             storage_client = connect.get_storage_async()
             payload = PayloadBuilder().WHERE(['token', '=', token]).payload()
             try:
@@ -375,6 +453,7 @@ class User:
 
         @classmethod
         async def delete_all_user_tokens(cls):
+            cls._tokens.clear()
             storage_client = connect.get_storage_async()
             await storage_client.delete_from_tbl("user_logins")
 
@@ -15,6 +15,7 @@ import json
 
 from foglamp.common import logger
 from foglamp.common import statistics
+from foglamp.common.asset_tracker_cache import AssetTrackerCache
 from foglamp.common.storage_client.exceptions import StorageServerError
 
 __author__ = "Terris Linenbach, Amarendra K Sinha"
@@ -52,6 +53,9 @@ class Ingest(object):
     _sensor_stats = {}  # type: dict
     """Number of sensor readings accepted before statistics were written to storage"""
 
+    _poll_overruns_stats = 0  # type: int
+    """Number of missed plugin poll intervals before statistics were written to storage"""
+
     _stop = False
     """True when the server needs to stop"""
 
@@ -105,19 +109,17 @@ class Ingest(object):
 
     # Configuration (end)
 
-    _payload_events = []
-    """The list of unique reading payload for asset tracker"""
+    _asset_tracker = None  # type: AssetTrackerCache
+    """Asset tracker events known to core, new events are registered in the background"""
 
     stats = None
     """Statistics class instance"""
 
     @classmethod
-    async def _read_config(cls):
-        """Creates default values for the South configuration category and then reads all
-        values for this category
+    def config_category(cls, service_name):
+        """Returns the payload creating the South Service Ingest configuration category of
+        service_name with its default values
         """
-        category = "{}Advanced".format(cls._parent_service._name)
-
         default_config = {
             "readings_buffer_size": {
                 "description": "Maximum number of readings to buffer in memory",
@@ -161,21 +163,19 @@ class Ingest(object):
             },
         }
 
-        # Create configuration category and any new keys within it
-        config_payload = json.dumps({
-            "key": category,
-            "description": '{} South Service Ingest configuration'.format(cls._parent_service._name),
+        return {
+            "key": "{}Advanced".format(service_name),
+            "description": '{} South Service Ingest configuration'.format(service_name),
             "value": default_config,
             "keep_original_items": True
-        })
-        cls._parent_service._core_microservice_management_client.create_configuration_category(config_payload)
-
-        # Read configuration
-        config = cls._parent_service._core_microservice_management_client.get_configuration_category(category_name=category)
+        }
 
-        # Create child category
-        cls._parent_service._core_microservice_management_client.create_child_category(parent=cls._parent_service._name, children=[category])
+    @classmethod
+    async def _read_config(cls, config):
+        """Reads the values of the South Service Ingest configuration category
 
+        :param config: the category as created and read by the parent service
+        """
         cls._readings_buffer_size = int(config['readings_buffer_size']['value'])
         cls._max_concurrent_readings_inserts = int(config['max_concurrent_readings_inserts']
                                                    ['value'])
@@ -189,11 +189,13 @@ class Ingest(object):
         cls._max_readings_insert_batch_reconnect_wait_seconds = int(
             config['max_readings_insert_batch_reconnect_wait_seconds']['value'])
 
-        cls._payload_events = []
-
     @classmethod
-    async def start(cls, parent):
-        """Starts the server"""
+    async def start(cls, parent, config, track):
+        """Starts the server
+
+        :param config: the South Service Ingest configuration category
+        :param track: the asset tracker events
+        """
         if cls._started:
             return
 
@@ -202,7 +204,7 @@ class Ingest(object):
         cls.readings_storage_async = cls._parent_service._readings_storage_async
         cls.storage_async = cls._parent_service._storage_async
 
-        await cls._read_config()
+        await cls._read_config(config)
 
         # cls._readings_insert_batch_size and cls._max_concurrent_readings_inserts are two most critical config items
         # and cannot be a any value other than non zero integers.
@@ -234,10 +236,14 @@ class Ingest(object):
             cls._readings_list_batch_size_reached.append(asyncio.Event())
             cls._readings_list_not_empty.append(asyncio.Event())
 
-        cls._insert_readings_task = asyncio.ensure_future(cls._insert_readings())
         cls._readings_lists_not_full = asyncio.Event()
+        cls._insert_readings_tasks = [asyncio.ensure_future(cls._insert_readings(list_index))
+                                      for list_index in range(cls._max_concurrent_readings_inserts)]
 
-        cls._payload_events = cls._parent_service._core_microservice_management_client.get_asset_tracker_events()['track']
+        cls._asset_tracker = AssetTrackerCache(cls._parent_service._core_management_host,
+                                               cls._parent_service._core_management_port)
+        cls._asset_tracker.load(track)
+        cls._asset_tracker.start()
 
         cls.stats = await statistics.create_statistics(cls.storage_async)
 
@@ -247,6 +253,9 @@ class Ingest(object):
                                               'discarded before being placed in the buffer. This may be due to some '
                                               'error in the readings themselves.')
 
+        # The statistics of every insert are added up and written periodically
+        cls.stats.start_deferred_writes()
+
         cls._stop = False
         cls._started = True
 
@@ -266,11 +275,20 @@ class Ingest(object):
                     task.cancel()
                 except asyncio.CancelledError:
                     pass
+        # Every inserter drains its own list before it returns
+        results = await asyncio.gather(*cls._insert_readings_tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                _LOGGER.error('An exception was raised by Ingest._insert_readings %s', str(result))
+
+        # Counts of readings discarded after the last insert
+        await cls._write_statistics()
         try:
-            await cls._insert_readings_task
-            cls._insert_readings_task = None
-        except Exception:
-            _LOGGER.exception('An exception was raised by Ingest._insert_readings')
+            await cls.stats.stop_deferred_writes()
+        except Exception as ex:
+            _LOGGER.exception('An error occurred while writing the pending statistics, Error: %s', str(ex))
+
+        await cls._asset_tracker.stop()
 
         cls._insert_readings_wait_tasks = None
         cls._insert_readings_tasks = None
@@ -287,32 +305,46 @@ class Ingest(object):
         cls._discarded_readings_stats += 1
 
     @classmethod
-    async def _insert_readings(cls):
-        """Inserts rows into the readings table
+    def increment_poll_overruns(cls, count=1):
+        """Increments the number of plugin poll intervals missed because a poll took too long"""
+        cls._poll_overruns_stats += count
 
-        Use ReadingsStorageClientAsync().append(json_payload_of_readings)
-        """
-        _LOGGER.info('Insert readings loop started')
+    @classmethod
+    def _poll_overruns_key(cls):
+        return '{}_POLL_OVERRUNS'.format(cls._parent_service._name.upper())
 
-        list_index = 0
+    @classmethod
+    async def _insert_readings(cls, list_index):
+        """Inserts rows of one readings list into the readings table
 
-        while list_index <= cls._max_concurrent_readings_inserts-1:
-            if cls._stop:
-                readings = 0
-                for i in range(cls._max_concurrent_readings_inserts):
-                    readings += len(cls._readings_lists[i])
-                if cls._discarded_readings_stats + readings == 0:
-                    break  # Terminate this method as there are no pending readings available
+        One instance runs per readings list, so up to _max_concurrent_readings_inserts batches are
+        in flight to storage at the same time. Readings of a list are sent in the order they were added.
 
-            list_index += 1
-            if list_index > cls._max_concurrent_readings_inserts-1:
-                list_index = 0
+        Use ReadingsStorageClientAsync().append(json_payload_of_readings)
+        """
+        _LOGGER.info('Insert readings loop started, list index: %s', list_index)
 
-            # _LOGGER.debug('Insert readings for list_index: %s', list_index)
+        readings_list = cls._readings_lists[list_index]
+        min_readings_reached = cls._readings_list_batch_size_reached[list_index]
+        list_not_empty = cls._readings_list_not_empty[list_index]
+        lists_not_full = cls._readings_lists_not_full
 
-            readings_list = cls._readings_lists[list_index]
-            min_readings_reached = cls._readings_list_batch_size_reached[list_index]
-            lists_not_full = cls._readings_lists_not_full
+        while True:
+            if cls._stop and not len(readings_list):
+                break  # Terminate this method as there are no pending readings available
+
+            # Sleep until the first reading arrives
+            if not len(readings_list):
+                list_not_empty.clear()
+                waiter = asyncio.ensure_future(list_not_empty.wait())
+                cls._insert_readings_wait_tasks[list_index] = waiter
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    pass
+                finally:
+                    cls._insert_readings_wait_tasks[list_index] = None
+                continue
 
             # Wait for enough items in the list to fill a batch
             # for some minimum amount of time
@@ -338,15 +370,6 @@ class Ingest(object):
                 finally:
                     cls._insert_readings_wait_tasks[list_index] = None
 
-            # If list is still empty, then proceed to next list
-            if not len(readings_list):
-                continue
-
-            # If batch size still not reached and if there is time then let this list wait and move to next list
-            if (not cls._stop) and (len(readings_list) < cls._readings_insert_batch_size) and ((
-                    time.time() - cls._last_insert_time) < cls._readings_insert_batch_timeout_seconds):
-                continue
-
             attempt = 0
             cls._last_insert_time = time.time()
 
@@ -372,7 +395,6 @@ class Ingest(object):
                         else:
                             # not retryable
                             _LOGGER.error("%s, %s", err_response["source"], err_response["message"])
-                            batch_size = len(readings_list)
                             cls._discarded_readings_stats += batch_size
                     # _LOGGER.debug('End insert: Queue index: %s Batch size: %s', list_index, batch_size)
                     break
@@ -382,23 +404,23 @@ class Ingest(object):
                     _LOGGER.exception('Insert failed on attempt #%s, list index: %s | %s', attempt, list_index, str(ex))
 
                     if cls._stop or attempt >= _MAX_ATTEMPTS:
-                        # Stopping. Discard the entire list upon failure.
-                        batch_size = len(readings_list)
+                        # Stopping. Discard the batch upon failure.
                         cls._discarded_readings_stats += batch_size
                         _LOGGER.warning('Insert failed: Queue index: %s Batch size: %s', list_index, batch_size)
                         break
 
-            await cls._write_statistics()
-
+            # Readings added while the batch was in flight stay in the list for the next batch
             del readings_list[:batch_size]
 
             if not lists_not_full.is_set():
                 lists_not_full.set()
 
+            await cls._write_statistics()
+
             # insert_end_time = time.time()
             # _LOGGER.debug('Inserted %s records + stat in time %s', batch_size, insert_end_time - insert_start_time)
 
-        _LOGGER.info('Insert readings loop stopped')
+        _LOGGER.info('Insert readings loop stopped, list index: %s', list_index)
 
     @classmethod
     async def _write_statistics(cls):
@@ -414,19 +436,32 @@ class Ingest(object):
         cls._discarded_readings_stats -= discarded_readings
         updates.update({'DISCARDED': discarded_readings})
 
-        """ Register the statistics keys as this may be the first time the key has come into existence """
+        # Take every count before the first await, as the inserters of all the lists call this concurrently
         sensor_readings = cls._sensor_stats.copy()
         for key in sensor_readings:
-            description = 'Readings received by FogLAMP since startup for sensor {}'.format(key)
-            await cls.stats.register(key, description)
             cls._sensor_stats[key] -= sensor_readings[key]
             updates.update({key: sensor_readings[key]})
 
+        poll_overruns = cls._poll_overruns_stats
+        cls._poll_overruns_stats -= poll_overruns
+
+        """ Register the statistics keys as this may be the first time the key has come into existence """
+        for key in sensor_readings:
+            description = 'Readings received by FogLAMP since startup for sensor {}'.format(key)
+            await cls.stats.register(key, description)
+
+        if poll_overruns:
+            key = cls._poll_overruns_key()
+            await cls.stats.register(key, 'Poll intervals missed by the plugin of south service {} because a '
+                                          'poll took too long'.format(cls._parent_service._name))
+            updates.update({key: poll_overruns})
+
         try:
             await cls.stats.update_bulk(updates)
         except Exception as ex:
             cls._readings_stats += readings
             cls._discarded_readings_stats += discarded_readings
+            cls._poll_overruns_stats += poll_overruns
             for key in sensor_readings:
                 cls._sensor_stats[key] += sensor_readings[key]
             _LOGGER.exception('An error occurred while writing sensor statistics, Error: %s', str(ex))
@@ -487,33 +522,7 @@ class Ingest(object):
             # cls._logger = logger.setup(__name__, destination=logger.CONSOLE, level=logging.DEBUG)
 
         try:
-            if asset is None:
-                raise ValueError('asset can not be None')
-
-            if not isinstance(asset, str):
-                raise TypeError('asset must be a string')
-
-            if timestamp is None:
-                raise ValueError('timestamp can not be None')
-
-            # if not isinstance(timestamp, datetime.datetime):
-            #     # validate
-            #     timestamp = dateutil.parser.parse(timestamp)
-
-            if key is not None and not isinstance(key, uuid.UUID):
-                # Validate
-                if not isinstance(key, str):
-                    raise TypeError('key must be a uuid.UUID or a string')
-                # If key is not a string, uuid.UUID throws an Exception that appears to
-                # be a TypeError but can not be caught as a TypeError
-                key = uuid.UUID(key)
-
-            if readings is None:
-                readings = dict()
-            elif not isinstance(readings, dict):
-                # Postgres allows values like 5 be converted to JSON
-                # Downstream processors can not handle this
-                raise TypeError('readings must be a dictionary')
+            key, readings = cls._validate_reading(asset, timestamp, key, readings)
         except Exception:
             cls.increment_discarded_readings()
             raise
@@ -526,6 +535,115 @@ class Ingest(object):
             cls.increment_discarded_readings()
             return
 
+        # Increment the count of received readings to be used for statistics update
+        asset_key = asset.upper()
+        cls._sensor_stats[asset_key] = cls._sensor_stats.get(asset_key, 0) + 1
+
+        # asset tracker checking, new events are registered with core in the background
+        cls._asset_tracker.add(asset, "Ingest", cls._parent_service._name,
+                               cls._parent_service._plugin_info['config']['plugin']['default'])
+
+        cls._append_reading(asset, timestamp, key, readings)
+
+    @classmethod
+    async def add_readings_bulk(cls, readings_list: List[dict]) -> None:
+        """Adds the asset readings records returned by a single plugin poll to FogLAMP
+
+        All records are validated, counted and buffered in one pass. An invalid record, or a record for
+        which no slot is available, is discarded and counted without affecting the other records.
+
+        Args:
+            readings_list:
+                A list of dictionaries with the asset, timestamp, key and readings entries,
+                as described for :meth:`add_readings`
+
+        Raises:
+            RuntimeError:
+                The server has not been started
+        """
+        if cls._stop:
+            _LOGGER.warning('The South Service is stopping')
+            return
+
+        if not cls._started:
+            raise RuntimeError('The South Service was not started')
+
+        service = cls._parent_service._name
+        plugin = cls._parent_service._plugin_info['config']['plugin']['default']
+        sensor_stats = cls._sensor_stats
+        asset_tracker = cls._asset_tracker
+
+        invalid = 0
+        error = None
+        for i, reading in enumerate(readings_list):
+            try:
+                asset = reading['asset']
+                timestamp = reading['timestamp']
+                key, readings = cls._validate_reading(asset, timestamp, reading.get('key'), reading.get('readings'))
+            except Exception as ex:
+                invalid += 1
+                error = ex
+                continue
+
+            # If an empty slot is not available, discard this and all the remaining readings
+            if not cls.is_available():
+                cls._discarded_readings_stats += len(readings_list) - i
+                break
+
+            asset_key = asset.upper()
+            sensor_stats[asset_key] = sensor_stats.get(asset_key, 0) + 1
+            asset_tracker.add(asset, "Ingest", service, plugin)
+
+            cls._append_reading(asset, timestamp, key, readings)
+
+        if invalid:
+            cls._discarded_readings_stats += invalid
+            _LOGGER.warning('%s invalid readings discarded, last error: %s', invalid, str(error))
+
+    @staticmethod
+    def _validate_reading(asset, timestamp, key, readings):
+        """Validates the inputs of :meth:`add_readings`
+
+        Returns:
+            The key and readings to buffer
+
+        Raises:
+            ValueError, TypeError:
+                An invalid value was provided
+        """
+        if asset is None:
+            raise ValueError('asset can not be None')
+
+        if not isinstance(asset, str):
+            raise TypeError('asset must be a string')
+
+        if timestamp is None:
+            raise ValueError('timestamp can not be None')
+
+        # if not isinstance(timestamp, datetime.datetime):
+        #     # validate
+        #     timestamp = dateutil.parser.parse(timestamp)
+
+        if key is not None and not isinstance(key, uuid.UUID):
+            # Validate
+            if not isinstance(key, str):
+                raise TypeError('key must be a uuid.UUID or a string')
+            # If key is not a string, uuid.UUID throws an Exception that appears to
+            # be a TypeError but can not be caught as a TypeError
+            key = uuid.UUID(key)
+
+        if readings is None:
+            readings = dict()
+        elif not isinstance(readings, dict):
+            # Postgres allows values like 5 be converted to JSON
+            # Downstream processors can not handle this
+            raise TypeError('readings must be a dictionary')
+
+        return key, readings
+
+    @classmethod
+    def _append_reading(cls, asset, timestamp, key, readings):
+        """Appends a validated reading to the current readings list, a slot must be available"""
         list_index = cls._current_readings_list_index
         readings_list = cls._readings_lists[list_index]
 
@@ -538,19 +656,6 @@ class Ingest(object):
 
         list_size = len(readings_list)
 
-        # Increment the count of received readings to be used for statistics update
-        if asset.upper() in cls._sensor_stats:
-            cls._sensor_stats[asset.upper()] += 1
-        else:
-            cls._sensor_stats[asset.upper()] = 1
-
-        # asset tracker checking
-        payload = {"asset": asset, "event": "Ingest", "service": cls._parent_service._name,
-                   "plugin": cls._parent_service._plugin_info['config']['plugin']['default']}
-        if payload not in cls._payload_events:
-            cls._parent_service._core_microservice_management_client.create_asset_tracker_event(payload)
-            cls._payload_events.append(payload)
-
         # _LOGGER.debug('Add readings list index: %s size: %s', cls._current_readings_list_index, list_size)
 
         if list_size == 1:
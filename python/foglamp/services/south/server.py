@@ -6,8 +6,9 @@
 
 """FogLAMP South Microservice"""
 
-import json
+import pickle
 import asyncio
+import concurrent.futures
 from foglamp.services.south import exceptions
 from foglamp.common import logger
 from foglamp.services.south.ingest import Ingest
@@ -45,6 +46,18 @@ class Server(FoglampMicroservice):
     }
     """ Messages used for Information, Warning and Error notice """
 
+    _POLL_EXECUTOR_CONFIG = {
+        "poll_executor": {
+            "description": "Run the plugin poll calls in a separate thread, or process for the plugins declaring "
+                           "process_safe",
+            "displayName": "Poll Executor",
+            "type": "enumeration",
+            "options": ["thread", "process"],
+            "default": "thread"
+        }
+    }
+    """ Configuration item of the executor running the poll plugins, in the South Service Ingest category """
+
     _plugin = None
     """The plugin's module'"""
 
@@ -58,6 +71,9 @@ class Server(FoglampMicroservice):
 
     _task_main = None
 
+    _poll_executor = None
+    """Executor running the plugin_poll calls, None when the plugin declares itself async safe"""
+
     config = None
 
     _event_loop = None
@@ -69,18 +85,19 @@ class Server(FoglampMicroservice):
         error = None
         self._event_loop = loop
         try:
-            # Configuration handling - initial configuration
+            # Configuration handling - initial configuration, and the parent category for all south service
             category = self._name
             self.config = self._DEFAULT_CONFIG
             config_descr = self._name
-            config_payload = json.dumps({
-                "key": category,
-                "description": config_descr,
-                "value": self.config,
-                "keep_original_items": True
+            result = await self._core_microservice_management_client_async.bootstrap({
+                "categories": [
+                    {"key": category, "description": config_descr, "value": self.config,
+                     "keep_original_items": True},
+                    {"key": "South", "description": "South microservices", "value": {},
+                     "children": [self._name], "keep_original_items": True}
+                ]
             })
-            self._core_microservice_management_client.create_configuration_category(config_payload)
-            self.config = self._core_microservice_management_client.get_configuration_category(category_name=category)
+            self.config = result['categories'][category]
 
             try:
                 plugin_module_name = self.config['plugin']['value']
@@ -98,15 +115,6 @@ class Server(FoglampMicroservice):
                 message = self._MESSAGES_LIST['e000003'].format(plugin_module_name, self._name, str(ex))
                 _LOGGER.error(message)
                 raise
-            # Create the parent category for all south service
-            try:
-                parent_payload = json.dumps({"key": "South", "description": "South microservices", "value": {},
-                                             "children": [self._name], "keep_original_items": True})
-                self._core_microservice_management_client.create_configuration_category(parent_payload)
-            except KeyError:
-                message = self._MESSAGES_LIST['e000004'].format(self._name)
-                _LOGGER.error(message)
-                raise
 
             # Plugin initialization
             self._plugin_info = self._plugin.plugin_info()
@@ -114,22 +122,28 @@ class Server(FoglampMicroservice):
             default_plugin_descr = self._name if (default_config['plugin']['description']).strip() == "" else \
                 default_config['plugin']['description']
 
-            # Configuration handling - updates the configuration using information specific to the plugin
-            config_payload = json.dumps({
-                "key": category,
-                "description": default_plugin_descr,
-                "value": default_config,
-                "keep_original_items": True
+            # Configuration handling - updates the configuration using information specific to the plugin, creates
+            # the ingest configuration, registers the interest with category and microservice_id and reads the
+            # asset tracker events in a single request
+            ingest_category = Ingest.config_category(self._name)
+            if self._plugin_info['mode'] == 'poll' and not self._plugin_info.get('async_safe', False):
+                ingest_category['value'].update(self._POLL_EXECUTOR_CONFIG)
+            result = await self._core_microservice_management_client_async.bootstrap({
+                "categories": [
+                    {"key": category, "description": default_plugin_descr, "value": default_config,
+                     "keep_original_items": True},
+                    ingest_category
+                ],
+                "children": [{"parent": category, "children": [ingest_category['key']]}],
+                "service_id": self._microservice_id,
+                "interests": [category],
+                "track": True
             })
-            self._core_microservice_management_client.create_configuration_category(config_payload)
-            self.config = self._core_microservice_management_client.get_configuration_category(category_name=category)
-
-            # Register interest with category and microservice_id
-            result = self._core_microservice_management_client.register_interest(category, self._microservice_id)
+            self.config = result['categories'][category]
+            ingest_config = result['categories'][ingest_category['key']]
 
-            # KeyError when result (id and message) keys are not found
-            registration_id = result['id']
-            message = result['message']
+            # KeyError when the interest registration id is not found
+            registration_id = result['interests'][category]
 
             # Ensures the plugin type is the correct one - 'south'
             if self._plugin_info['type'] != 'south':
@@ -138,12 +152,13 @@ class Server(FoglampMicroservice):
                 raise exceptions.InvalidPluginTypeError()
 
             self._plugin_handle = self._plugin.plugin_init(self.config)
-            await Ingest.start(self)
+            await Ingest.start(self, config=ingest_config, track=result['track'])
 
             # Executes the requested plugin type
             if self._plugin_info['mode'] == 'async':
                 self._task_main = asyncio.ensure_future(self._exec_plugin_async())
             elif self._plugin_info['mode'] == 'poll':
+                self._create_poll_executor(ingest_config)
                 self._task_main = asyncio.ensure_future(self._exec_plugin_poll())
         except asyncio.CancelledError:
             pass
@@ -161,8 +176,59 @@ class Server(FoglampMicroservice):
         _LOGGER.info('Started South Plugin: {}'.format(self._name))
         self._plugin.plugin_start(self._plugin_handle)
 
+    def _create_poll_executor(self, config) -> None:
+        """Creates the executor running the blocking plugin_poll calls
+
+        A process executor isolates the event loop from plugins holding the GIL. The handle is pickled
+        on every poll and plugin_init does not run in the worker process, so it is only used by the
+        plugins declaring process_safe in plugin_info, whose plugin_poll depends on the handle alone
+        and does not change it. The other plugins, and the handles that cannot be pickled, are polled
+        in a thread.
+
+        :param config: the category holding poll_executor
+        """
+        if self._plugin_info.get('async_safe', False):
+            self._poll_executor = None
+            return
+
+        # A single worker, as polls never overlap
+        if config['poll_executor']['value'] == 'process':
+            if self._plugin_info.get('process_safe', False) and self._is_picklable(self._plugin_handle):
+                self._poll_executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+                return
+            _LOGGER.warning('Plugin {} cannot be polled in a process, polling in a thread'.format(self._name))
+        self._poll_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    @staticmethod
+    def _is_picklable(handle) -> bool:
+        try:
+            pickle.dumps(handle)
+        except Exception:
+            return False
+        return True
+
+    async def _poll(self):
+        """Calls plugin_poll in the poll executor, or inline for async safe plugins"""
+        if self._poll_executor is None:
+            return self._plugin.plugin_poll(self._plugin_handle)
+        return await self._event_loop.run_in_executor(self._poll_executor, self._plugin.plugin_poll,
+                                                      self._plugin_handle)
+
+    async def _call_after_poll(self, plugin_method, *args):
+        """Calls a plugin method on the handle once the poll in flight, if any, has returned
+
+        With a thread executor the call is queued on its single worker, behind the polls, so that it never
+        runs while plugin_poll uses the same handle, even when the poll task has been cancelled.
+        """
+        if isinstance(self._poll_executor, concurrent.futures.ThreadPoolExecutor):
+            return await self._event_loop.run_in_executor(self._poll_executor, plugin_method, *args)
+        return plugin_method(*args)
+
     async def _exec_plugin_poll(self) -> None:
         """Executes poll type plugin
+
+        Polls are scheduled every pollInterval on the monotonic loop clock. When a poll takes longer
+        than its interval, the missed intervals are skipped and counted as poll overruns.
         """
         _LOGGER.info('Started South Plugin: {}'.format(self._name))
         try_count = 1
@@ -175,39 +241,42 @@ class Server(FoglampMicroservice):
         sleep_seconds = int(self._plugin_handle['pollInterval']['value']) / 1000.0
         _TIME_TO_WAIT_BEFORE_RETRY = sleep_seconds
 
+        next_poll = self._event_loop.time()
         while self._plugin and try_count <= _MAX_RETRY_POLL:
             try:
-                t1 = self._event_loop.time()
-                data = self._plugin.plugin_poll(self._plugin_handle)
-                if len(data) > 0:
+                data = await self._poll()
+                if data is not None and len(data) > 0:
                     if isinstance(data, list):
-                        for reading in data:
-                            asyncio.ensure_future(Ingest.add_readings(asset=reading['asset'],
-                                                                        timestamp=reading['timestamp'],
-                                                                        key=reading['key'],
-                                                                        readings=reading['readings']))
+                        await Ingest.add_readings_bulk(data)
                     elif isinstance(data, dict):
                         asyncio.ensure_future(Ingest.add_readings(asset=data['asset'],
                                                                   timestamp=data['timestamp'],
                                                                   key=data['key'],
                                                                   readings=data['readings']))
-                delta = self._event_loop.time() - t1
-                # If delta somehow becomes > sleep_seconds, then ignore delta
-                sleep_for = sleep_seconds - delta if delta < sleep_seconds else sleep_seconds
-                await asyncio.sleep(sleep_for)
+                next_poll += sleep_seconds
+                now = self._event_loop.time()
+                if now > next_poll:
+                    missed = int((now - next_poll) / sleep_seconds) + 1
+                    next_poll += missed * sleep_seconds
+                    Ingest.increment_poll_overruns(missed)
+                    _LOGGER.debug('Plugin {} poll overran, {} poll intervals skipped'.format(self._name, missed))
+                await asyncio.sleep(next_poll - now)
             except asyncio.CancelledError:
-                pass
+                break
             except KeyError as ex:
                 try_count = 2
                 _LOGGER.exception('Key error plugin {} : {}'.format(self._name, str(ex)))
+                next_poll = self._event_loop.time()
             except exceptions.QuietError:
                 try_count = 2
                 await asyncio.sleep(_TIME_TO_WAIT_BEFORE_RETRY)
+                next_poll = self._event_loop.time()
             except (Exception, RuntimeError, exceptions.DataRetrievalError) as ex:
                 try_count = 2
                 _LOGGER.error('Failed to poll for plugin {}'.format(self._name))
                 _LOGGER.debug('Exception poll plugin {}'.format(str(ex)))
                 await asyncio.sleep(_TIME_TO_WAIT_BEFORE_RETRY)
+                next_poll = self._event_loop.time()
 
         _LOGGER.warning('Stopped all polling tasks for plugin: {}'.format(self._name))
 
@@ -222,7 +291,12 @@ class Server(FoglampMicroservice):
     async def _stop(self, loop):
         if self._plugin is not None:
             try:
-                self._plugin.plugin_shutdown(self._plugin_handle)
+                # Shielded, the plugin is still shut down once a poll stuck on the device returns
+                await asyncio.wait_for(asyncio.shield(
+                    self._call_after_poll(self._plugin.plugin_shutdown, self._plugin_handle)),
+                    _CLEAR_PENDING_TASKS_TIMEOUT)
+            except asyncio.TimeoutError:
+                _LOGGER.warning("Plugin '%s' poll still running, the plugin is shut down once it returns", self._name)
             except Exception as ex:
                 _LOGGER.exception("Unable to stop plugin '%s' | reason: %s", self._name, str(ex))
                 #  must not prevent FogLAMP shutting down cleanly via the API call.
@@ -231,6 +305,11 @@ class Server(FoglampMicroservice):
                 self._plugin = None
                 self._plugin_handle = None
 
+        if self._poll_executor is not None:
+            # Do not wait for a poll stuck on the device
+            self._poll_executor.shutdown(wait=False)
+            self._poll_executor = None
+
         try:
             await Ingest.stop()
             _LOGGER.info('Stopped the Ingest server.')
@@ -240,6 +319,11 @@ class Server(FoglampMicroservice):
             _LOGGER.exception('Unable to stop the Ingest server. %s', str(ex))
             raise ex
 
+        try:
+            await self.close_storage_connections()
+        except Exception as ex:
+            _LOGGER.exception('Unable to close the storage connections. %s', str(ex))
+
         try:
             self._task_main.cancel()
             # Cancel all pending asyncio tasks after a timeout occurs
@@ -291,10 +375,11 @@ class Server(FoglampMicroservice):
 
         try:
             # retrieve new configuration
-            new_config = self._core_microservice_management_client.get_configuration_category(category_name=self._name)
+            new_config = await self._core_microservice_management_client_async.get_configuration_category(
+                category_name=self._name)
 
             # plugin_reconfigure and assign new handle
-            new_handle = self._plugin.plugin_reconfigure(self._plugin_handle, new_config)
+            new_handle = await self._call_after_poll(self._plugin.plugin_reconfigure, self._plugin_handle, new_config)
             self._plugin_handle = new_handle
 
             _LOGGER.info('Reconfiguration done for South plugin {}'.format(self._name))
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+"""Warm worker for the Python tasks started by the scheduler
+
+The worker imports the task modules once, then listens on a unix socket. Each connection carries one task
+invocation, a JSON line {"script": ..., "args": [...]}. The worker forks a child process running the task module
+as __main__ with the given args, replies with a line {"pid": ...} and, when the child exits, with a line
+{"exit_code": ...}. Exit codes follow asyncio.subprocess: minus the signal number when the child was killed.
+
+Usage: python3 -m foglamp.tasks.common.warm_worker --socket <path>
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import runpy
+import selectors
+import signal
+import socket
+import sys
+import traceback
+
+from foglamp.common import logger
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+TASK_MODULES = {
+    'tasks/purge': 'foglamp.tasks.purge',
+    'tasks/statistics': 'foglamp.tasks.statistics',
+    'tasks/north': 'foglamp.tasks.north.sending_process',
+}
+""" scheduled_processes script name to the module the script runs with python3 -m """
+
+_PRELOAD_MODULES = [
+    'foglamp.tasks.purge.purge',
+    'foglamp.tasks.statistics.statistics_history',
+    'foglamp.tasks.north.sending_process',
+]
+""" Modules imported by the worker, so that forked tasks find them and their dependencies already loaded """
+
+_REQUEST_TIMEOUT = 5
+""" Seconds allowed to a client to send its invocation """
+
+
+class WarmWorker(object):
+    """ Forks a task process per invocation received on a unix socket """
+
+    def __init__(self, socket_path):
+        self._socket_path = socket_path
+        self._listener = None
+        self._selector = None
+        self._wakeup_read_fd = None
+        self._wakeup_write_fd = None
+        self._children = dict()
+        """ Dictionary of child pid to the connection waiting for its exit code """
+
+    def preload(self):
+        for module in _PRELOAD_MODULES:
+            try:
+                importlib.import_module(module)
+            except Exception:
+                # The task falls back to its own import when it runs
+                traceback.print_exc()
+
+    def serve_forever(self):
+        # SIGCHLD wakes up select() through the pipe, so that children are reaped without threads
+        self._wakeup_read_fd, self._wakeup_write_fd = os.pipe()
+        os.set_blocking(self._wakeup_read_fd, False)
+        os.set_blocking(self._wakeup_write_fd, False)
+        signal.set_wakeup_fd(self._wakeup_write_fd)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self._socket_path)
+        self._listener.listen(64)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_read_fd, selectors.EVENT_READ)
+
+        while True:
+            for key, _ in self._selector.select():
+                if key.fileobj is self._listener:
+                    self._accept()
+                else:
+                    try:
+                        os.read(self._wakeup_read_fd, 512)
+                    except BlockingIOError:
+                        pass
+                    self._reap()
+
+    def _accept(self):
+        conn, _ = self._listener.accept()
+        try:
+            conn.settimeout(_REQUEST_TIMEOUT)
+            with conn.makefile('rb') as reader:
+                request = json.loads(reader.readline().decode())
+            module = TASK_MODULES[request['script']]
+            args = [str(arg) for arg in request['args']]
+        except Exception as ex:
+            self._send(conn, {"error": str(ex)})
+            conn.close()
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            conn.close()
+            self._run_task(module, args)
+        self._children[pid] = conn
+        self._send(conn, {"pid": pid})
+
+    def _reap(self):
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            exit_code = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            conn = self._children.pop(pid, None)
+            if conn is not None:
+                self._send(conn, {"exit_code": exit_code})
+                conn.close()
+
+    @staticmethod
+    def _send(conn, message):
+        try:
+            conn.sendall((json.dumps(message) + '\n').encode())
+        except OSError:
+            # The scheduler went away, the task keeps running as it would if started by a shell script
+            pass
+
+    def _run_task(self, module, args):
+        """ Runs in the forked child, never returns """
+        exit_code = 0
+        try:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self._selector.close()
+            self._listener.close()
+            os.close(self._wakeup_read_fd)
+            os.close(self._wakeup_write_fd)
+            for conn in self._children.values():
+                conn.close()
+
+            sys.argv = [module] + args
+            # Avoids the runpy warning about a module imported before it is run as __main__
+            sys.modules.pop(module, None)
+            runpy.run_module(module, run_name='__main__', alter_sys=True)
+        except SystemExit as ex:
+            if ex.code is None:
+                exit_code = 0
+            elif isinstance(ex.code, int):
+                exit_code = ex.code
+            else:
+                print(ex.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            # os._exit skips the atexit hooks, the queued log entries of the task are sent first
+            logger.shutdown()
+            logging.shutdown()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='FogLAMP warm worker for scheduled tasks')
+    parser.add_argument('--socket', required=True, help='path of the unix socket to listen on')
+    worker = WarmWorker(parser.parse_args().socket)
+    worker.preload()
+    worker.serve_forever()
@@ -17,6 +17,7 @@
 
 import importlib
 import aiohttp
+import collections
 import resource
 import asyncio
 import sys
@@ -34,6 +35,7 @@ from foglamp.common.storage_client import payload_builder
 from foglamp.common import statistics
 from foglamp.common.jqfilter import JQFilter
 from foglamp.common.audit_logger import AuditLogger
+from foglamp.common.asset_tracker_cache import AssetTrackerCache
 from foglamp.common.process import FoglampProcess
 from foglamp.common import logger
 
@@ -242,6 +244,12 @@ class SendingProcess(FoglampProcess):
             "type": "integer",
             "default": "10",
             "order": "12"
+        },
+        "maxConcurrentSends": {
+            "description": "Max number of elements of blockSize size sent at the same time to the destination",
+            "type": "integer",
+            "default": "1",
+            "order": "13"
         }
     }
 
@@ -256,6 +264,7 @@ class SendingProcess(FoglampProcess):
             'blockSize': int(self._CONFIG_DEFAULT['blockSize']['default']),
             'sleepInterval': float(self._CONFIG_DEFAULT['sleepInterval']['default']),
             'memory_buffer_size': int(self._CONFIG_DEFAULT['memory_buffer_size']['default']),
+            'maxConcurrentSends': int(self._CONFIG_DEFAULT['maxConcurrentSends']['default']),
         }
         self._config_from_manager = ""
         self._module_template = self._NORTH_PATH + "empty." + "empty"
@@ -291,6 +300,8 @@ class SendingProcess(FoglampProcess):
         self._memory_buffer_fetch_idx = 0
         self._memory_buffer_send_idx = 0
         """" Used to to managed the in memory buffer for the fetch/send operations """
+        self._jqfilter = None
+        """" Applies the filterRule to the blocks of data, it keeps the filter compiled between the blocks """
         self._event_loop = asyncio.get_event_loop() if loop is None else loop
 
     @staticmethod
@@ -337,88 +348,154 @@ class SendingProcess(FoglampProcess):
         await self._update_statistics(tot_num_sent)
         await self._audit.information(self._AUDIT_CODE, {"sentRows": tot_num_sent})
 
+    async def _send_block(self, block):
+        """ Sends a block of data to the destination using the loaded plugin, the operation is retried until the
+        block is sent or the sending task is stopped.
+        When the plugin returns the block as not sent along with the rows sent up to a position, only the rows
+        past that position are sent again.
+        Returns:
+            new_last_object_id, num_sent - of the block sent, None if the task was stopped before sending all of it
+        """
+        sleep_time = self.TASK_SEND_SLEEP
+        sleep_num_increments = 1
+        rows_to_send = block
+        num_sent_before = 0
+
+        while True:
+            try:
+                data_sent, new_last_object_id, num_sent = \
+                    await self._plugin.plugin_send(self._plugin_handle, rows_to_send, self._stream_id)
+            except Exception as ex:
+                _message = _MESSAGES_LIST["e000021"].format(ex)
+                SendingProcess._logger.error(_message)
+                await self._audit.failure(self._AUDIT_CODE, {"error - on _task_send_data": _message})
+                data_sent = False
+                num_sent = 0
+
+            if data_sent:
+                # asset tracker checking, new events are registered with core in the background
+                for _reads in block:
+                    self._asset_tracker.add(_reads['asset_code'], "Egress", self._name, self._config['plugin'])
+                self.performance_track("task _task_send_data")
+                return new_last_object_id, num_sent_before + num_sent
+
+            if num_sent:
+                # Part of the block was accepted by the destination
+                num_sent_before += num_sent
+                rows_to_send = [row for row in rows_to_send if row['id'] > new_last_object_id]
+
+            if not self._task_send_data_run:
+                return None
+
+            await asyncio.sleep(sleep_time)
+
+            # Handles the sleep time, it is doubled every time up to a limit
+            sleep_num_increments += 1
+            sleep_time *= 2
+            if sleep_num_increments > self.TASK_SLEEP_MAX_INCREMENTS:
+                sleep_time = self.TASK_SEND_SLEEP
+                sleep_num_increments = 1
+
+    def _release_blocks_sent(self, blocks_in_flight):
+        """ Releases the blocks at the head of blocks_in_flight already sent, stopping at the first one not sent,
+        and frees their space in the in memory buffer.
+        Returns:
+            new_last_object_id, num_sent - position reached and rows sent, None and 0 if no block was released
+        """
+        new_last_object_id = None
+        tot_num_sent = 0
+
+        while blocks_in_flight and blocks_in_flight[0][1].done():
+            # Raises the exception of the sending task, if any
+            result = blocks_in_flight[0][1].result()
+            if result is None:
+                break
+            new_last_object_id, num_sent = result
+            tot_num_sent += num_sent
+
+            memory_buffer_idx, _ = blocks_in_flight.popleft()
+            self._memory_buffer[memory_buffer_idx] = None
+            self._task_send_data_sem.release()
+
+        return new_last_object_id, tot_num_sent
+
     async def _task_send_data(self):
-        """ Sends the data from the in memory structure to the destination using the loaded plugin"""
-        data_sent = False
+        """ Sends the data from the in memory structure to the destination using the loaded plugin
+
+        Up to maxConcurrentSends blocks are sent at the same time, the position reached is advanced following the
+        order of the blocks and only past the ones sent, a block not sent holds the ones following it.
+        """
         db_update = False
         update_last_object_id = 0
         tot_num_sent = 0
         update_position_idx = 0
+        # (in memory buffer index, sending task) of the blocks not yet released, in the order of the blocks
+        blocks_in_flight = collections.deque()
+        fetch_wait = None
 
         try:
             self._memory_buffer_send_idx = 0
-            sleep_time = self.TASK_SEND_SLEEP
-            sleep_num_increments = 1
+            buffer_size = self._config['memory_buffer_size']
+            max_concurrent_sends = min(self._config['maxConcurrentSends'], buffer_size)
 
             while self._task_send_data_run:
-                slept = False
-                if self._memory_buffer_send_idx < self._config['memory_buffer_size']:
-                    new_last_object_id = None
-                    num_sent = 0
-                    if self._memory_buffer[self._memory_buffer_send_idx] is not None:  # if there are data to send
-                        try:
-                            data_sent, new_last_object_id, num_sent = \
-                                await self._plugin.plugin_send(self._plugin_handle,
-                                                               self._memory_buffer[self._memory_buffer_send_idx], self._stream_id)
-                        except Exception as ex:
-                            _message = _MESSAGES_LIST["e000021"].format(ex)
-                            SendingProcess._logger.error(_message)
-                            await self._audit.failure(self._AUDIT_CODE, {"error - on _task_send_data": _message})
-                            data_sent = False
-                            slept = True
-                            await asyncio.sleep(sleep_time)
-
-                        if data_sent:
-                            # asset tracker checking
-                            for _reads in self._memory_buffer[self._memory_buffer_send_idx]:
-                                payload = {"asset": _reads['asset_code'], "event": "Egress", "service": self._name,
-                                           "plugin": self._config['plugin']}
-                                if payload not in self._tracked_assets:
-                                    self._core_microservice_management_client.create_asset_tracker_event(
-                                        payload)
-                                    self._tracked_assets.append(payload)
-
-                            db_update = True
-                            update_last_object_id = new_last_object_id
-                            tot_num_sent = tot_num_sent + num_sent
-                            self._memory_buffer[self._memory_buffer_send_idx] = None
-                            self._memory_buffer_send_idx += 1
-                            self._task_send_data_sem.release()
-                            self.performance_track("task _task_send_data")
-                    else:
-                        # Updates the position before going to wait for the semaphore
-                        if db_update:
-                            await self._update_position_reached(update_last_object_id, tot_num_sent)
-                            update_position_idx = 0
-                            tot_num_sent = 0
-                            db_update = False
-                        await self._task_fetch_data_sem.acquire()
+                new_last_object_id, num_sent = self._release_blocks_sent(blocks_in_flight)
+                if new_last_object_id is not None:
+                    db_update = True
+                    update_last_object_id = new_last_object_id
+                    tot_num_sent = tot_num_sent + num_sent
 
                     # Updates the Storage layer every 'self.UPDATE_POSITION_MAX' interactions
-                    if db_update:
-                        if update_position_idx >= self.TASK_SEND_UPDATE_POSITION_MAX:
-                            await self._update_position_reached(update_last_object_id, tot_num_sent)
-                            update_position_idx = 0
-                            tot_num_sent = 0
-                            db_update = False
-                        else:
-                            update_position_idx += 1
+                    if update_position_idx >= self.TASK_SEND_UPDATE_POSITION_MAX:
+                        await self._update_position_reached(update_last_object_id, tot_num_sent)
+                        update_position_idx = 0
+                        tot_num_sent = 0
+                        db_update = False
+                    else:
+                        update_position_idx += 1
+
+                # Starts the sending of the blocks available in the in memory buffer
+                sending = [task for _, task in blocks_in_flight if not task.done()]
+                while len(sending) < max_concurrent_sends and len(blocks_in_flight) < buffer_size \
+                        and self._memory_buffer[self._memory_buffer_send_idx] is not None:
+                    task = asyncio.ensure_future(self._send_block(self._memory_buffer[self._memory_buffer_send_idx]))
+                    blocks_in_flight.append((self._memory_buffer_send_idx, task))
+                    sending.append(task)
+                    self._memory_buffer_send_idx = (self._memory_buffer_send_idx + 1) % buffer_size
+
+                if sending:
+                    # Waits for either the end of a sending or a new block of data
+                    fetch_wait = asyncio.ensure_future(self._task_fetch_data_sem.acquire())
+                    await asyncio.wait(sending + [fetch_wait], return_when=asyncio.FIRST_COMPLETED)
+                    if not fetch_wait.done():
+                        fetch_wait.cancel()
+                    fetch_wait = None
                 else:
-                    self._memory_buffer_send_idx = 0
-
-                # Handles the sleep time, it is doubled every time up to a limit
-                if slept:
-                    sleep_num_increments += 1
-                    sleep_time *= 2
-                    if sleep_num_increments > self.TASK_SLEEP_MAX_INCREMENTS:
-                        sleep_time = self.TASK_SEND_SLEEP
-                        sleep_num_increments = 1
-
-            # Checks if the information on the Storage layer needs to be updates
+                    # Updates the position before going to wait for the semaphore
+                    if db_update:
+                        await self._update_position_reached(update_last_object_id, tot_num_sent)
+                        update_position_idx = 0
+                        tot_num_sent = 0
+                        db_update = False
+                    await self._task_fetch_data_sem.acquire()
+
+            # Completes the blocks being sent and checks if the information on the Storage layer needs to be updates
+            if blocks_in_flight:
+                await asyncio.wait([task for _, task in blocks_in_flight])
+                new_last_object_id, num_sent = self._release_blocks_sent(blocks_in_flight)
+                if new_last_object_id is not None:
+                    db_update = True
+                    update_last_object_id = new_last_object_id
+                    tot_num_sent = tot_num_sent + num_sent
             if db_update:
                 await self._update_position_reached(update_last_object_id, tot_num_sent)
         except Exception as ex:
-            SendingProcess._logger.error(_MESSAGES_LIST["e000021"].format(ex))
+            _message = _MESSAGES_LIST["e000021"].format(ex)
+            SendingProcess._logger.error(_message)
+            if fetch_wait is not None:
+                fetch_wait.cancel()
+            for _, task in blocks_in_flight:
+                task.cancel()
             if db_update:
                 await self._update_position_reached(update_last_object_id, tot_num_sent)
             await self._audit.failure(self._AUDIT_CODE, {"error - on _task_send_data": _message})
@@ -558,6 +635,25 @@ class SendingProcess(FoglampProcess):
             raise
         return last_object_id
 
+    def _apply_filter(self, data_to_send):
+        """ Applies the filterRule to a block of data, the filter is compiled again only when filterRule changes
+        Returns:
+            The block of data in the format expected by the plugin, the first result of the filter
+        """
+        if self._jqfilter is None:
+            self._jqfilter = JQFilter()
+
+        start = time.perf_counter()
+        filtered_data = self._jqfilter.transform(data_to_send, self._config_from_manager['filterRule']["value"])[0]
+
+        if _log_performance:
+            SendingProcess._logger.info("PERFORMANCE - {0} - milliseconds |{1:>8,}| - rows |{2:>8,}|".format(
+                "_apply_filter",
+                int((time.perf_counter() - start) * 1000),
+                len(data_to_send)))
+
+        return filtered_data
+
     async def _task_fetch_data(self):
         """ Read data from the Storage Layer into a memory structure"""
         try:
@@ -582,17 +678,7 @@ class SendingProcess(FoglampProcess):
                         if data_to_send:
                             # Handles the JQFilter functionality
                             if self._config_from_manager['applyFilter']["value"].upper() == "TRUE":
-                                jqfilter = JQFilter()
-                                # Steps needed to proper format the data generated by the JQFilter
-                                # to the one expected by the SP
-                                data_to_send_2 = jqfilter.transform(data_to_send,
-                                                                    self._config_from_manager['filterRule']["value"])
-                                data_to_send_3 = json.dumps(data_to_send_2)
-                                del data_to_send_2
-                                data_to_send_4 = eval(data_to_send_3)
-                                del data_to_send_3
-                                data_to_send = data_to_send_4[0]
-                                del data_to_send_4
+                                data_to_send = self._apply_filter(data_to_send)
                             # Loads the block of data into the in memory buffer
                             self._memory_buffer[self._memory_buffer_fetch_idx] = data_to_send
                             last_position = len(data_to_send) - 1
@@ -625,6 +711,12 @@ class SendingProcess(FoglampProcess):
     async def send_data(self):
         """ Handles the sending of the data to the destination using the configured plugin for a defined amount of time"""
 
+        # The asset tracker events known to core, new ones are registered in the background
+        self._asset_tracker = AssetTrackerCache(self._core_management_host, self._core_management_port)
+        events = await self._core_microservice_management_client_async.get_asset_tracker_events()
+        self._asset_tracker.load(events['track'])
+        self._asset_tracker.start()
+
         # Prepares the in memory buffer for the fetch/send operations
         self._memory_buffer = [None for _ in range(self._config['memory_buffer_size'])]
         self._task_fetch_data_sem = asyncio.Semaphore(0)
@@ -661,6 +753,7 @@ class SendingProcess(FoglampProcess):
             self._task_send_data_sem.release()
             await self._task_fetch_data_task_id
             await self._task_send_data_task_id
+            await self._asset_tracker.stop()
         except Exception as ex:
             SendingProcess._logger.error(_MESSAGES_LIST["e000029"].format(ex))
 
@@ -848,6 +941,9 @@ class SendingProcess(FoglampProcess):
                 self._config['plugin'] = _config_from_manager['plugin']['value']
 
             self._config['memory_buffer_size'] = int(_config_from_manager['memory_buffer_size']['value'])
+
+            if 'maxConcurrentSends' in _config_from_manager:
+                self._config['maxConcurrentSends'] = int(_config_from_manager['maxConcurrentSends']['value'])
             _config_from_manager['_CONFIG_CATEGORY_NAME'] = cat_name
 
             if 'stream_id' in _config_from_manager:
@@ -940,9 +1036,6 @@ class SendingProcess(FoglampProcess):
             await self._audit.failure(self._AUDIT_CODE, {"error - on start": _message})
             raise
 
-        # The list of unique reading payload for asset tracker
-        self._tracked_assets = []
-
         return exec_sending_process
 
     async def run(self):
@@ -967,8 +1060,10 @@ class SendingProcess(FoglampProcess):
         else:
             SendingProcess._logger.removeHandler(SendingProcess._logger.handle)
             logger_name = _MODULE_NAME + "_" + self._name
+            # The plugins log every send, the logging of the process is then queued
             SendingProcess._logger = logger.setup(logger_name, level=logging.INFO if self._debug_level in [None, 0,
-                                                                                                           1] else logging.DEBUG)
+                                                                                                           1] else logging.DEBUG,
+                                                  queued=True)
             _LOGGER = SendingProcess._logger
 
             try:
@@ -976,12 +1071,23 @@ class SendingProcess(FoglampProcess):
                 if is_started:
                     await self.send_data()
                 self.stop()
+                await self.close_storage_connections()
                 SendingProcess._logger.info("Execution completed.")
                 sys.exit(0)
             except (ValueError, Exception) as ex:
                 SendingProcess._logger.exception(_MESSAGES_LIST["e000002"].format(str(ex)))
                 sys.exit(1)
 
+    async def close_storage_connections(self):
+        """ Closes the connections the plugin keeps open with the destination, then the storage ones """
+        plugin_close_session = getattr(self._plugin, 'plugin_close_session', None)
+        if plugin_close_session is not None:
+            try:
+                await plugin_close_session(self._plugin_handle)
+            except Exception as ex:
+                SendingProcess._logger.warning("Unable to close the connections of the plugin: %s", str(ex))
+        await super().close_storage_connections()
+
     def stop(self):
         """ Terminates the sending process and the related plugin"""
         try:
@@ -11,6 +11,10 @@ Fetch information from the statistics table, compute delta and
 stores the delta value (statistics.value - statistics.previous_value) in the statistics_history table
 """
 
+import asyncio
+import json
+import time
+
 from foglamp.common.storage_client.payload_builder import PayloadBuilder
 from foglamp.common import logger
 from foglamp.common.process import FoglampProcess
@@ -45,17 +49,19 @@ class StatisticsHistory(FoglampProcess):
         payload = PayloadBuilder().INSERT(key=key, value=value, history_ts=history_ts).payload()
         await self._storage_async.insert_into_tbl("statistics_history", payload)
 
-    async def _update_previous_value(self, key='', value=0):
-        """ UPDATE previous_value of column to have the same value as snapshot
-    
-        Query: 
-            UPDATE statistics_history SET previous_value = value WHERE key = key
+    async def _bulk_update_previous_value(self, snapshot):
+        """ UPDATE previous_value of columns to have the same value as snapshot, in a single bulk update
+
+        Query:
+            UPDATE statistics SET previous_value = value WHERE key = key, for each key
         Args:
-            key: Key which previous_value gets update 
-            value: value at snapshot
+            snapshot: dict of keys which previous_value gets update and their value at snapshot
         """
-        payload = PayloadBuilder().SET(previous_value=value).WHERE(["key", "=", key]).payload()
-        await self._storage_async.update_tbl("statistics", payload)
+        payload = {"updates": []}
+        for key, value in snapshot.items():
+            payload_item = PayloadBuilder().SET(previous_value=value).WHERE(["key", "=", key]).payload()
+            payload['updates'].append(json.loads(payload_item))
+        await self._storage_async.update_tbl("statistics", json.dumps(payload, sort_keys=False))
 
     async def run(self):
         """ SELECT against the statistics table, to get a snapshot of the data at that moment.
@@ -63,13 +69,36 @@ class StatisticsHistory(FoglampProcess):
         Based on the snapshot:
             1. INSERT the delta between `value` and `previous_value` into  statistics_history
             2. UPDATE the previous_value in statistics table to be equal to statistics.value at snapshot 
+
+        The storage layer inserts a single row per request, the rows are then inserted concurrently while
+        the previous values are updated with one bulk update, for the keys whose row has been inserted.
         """
+        start_time = time.time()
         current_time = utils.local_timestamp()
         results = await self._storage_async.query_tbl("statistics")
+        snapshot = {}
+        inserts = []
         for r in results['rows']:
             key = r['key']
             value = int(r["value"])
             previous_value = int(r["previous_value"])
             delta = value - previous_value
-            await self._insert_into_stats_history(key=key, value=delta, history_ts=current_time)
-            await self._update_previous_value(key=key, value=value)
+            snapshot[key] = value
+            inserts.append(self._insert_into_stats_history(key=key, value=delta, history_ts=current_time))
+        if snapshot:
+            results = await asyncio.gather(*inserts, return_exceptions=True)
+            # Only the keys having their delta stored move on, the others are stored with the next run
+            stored = {}
+            errors = []
+            for (key, value), result in zip(snapshot.items(), results):
+                if isinstance(result, Exception):
+                    self._logger.error("Unable to store the statistics history of %s: %s", key, str(result))
+                    errors.append(result)
+                else:
+                    stored[key] = value
+            if stored:
+                await self._bulk_update_previous_value(stored)
+            if errors:
+                raise errors[0]
+        self._logger.info("Statistics history of %d keys stored in %.3f seconds", len(snapshot),
+                          time.time() - start_time)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+""" Benchmark foglamp/common/storage_client/storage_client.py
+
+Compares the number of storage calls per second obtained opening a new aiohttp.ClientSession per call (the behaviour
+before the pooled session was introduced) with the pooled keep-alive session used by StorageClientAsync, against a
+local stand-in storage server.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from unittest.mock import MagicMock
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import unused_port
+
+from foglamp.common.service_record import ServiceRecord
+from foglamp.common.storage_client.storage_client import ReadingsStorageClientAsync
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+HOST = '127.0.0.1'
+PORT = unused_port()
+
+
+async def readings_append(request):
+    payload = await request.json()
+    return web.json_response({"response": "appended", "readings_added": len(payload["readings"])})
+
+
+async def start_server(loop):
+    app = web.Application(loop=loop)
+    app.router.add_post('/storage/reading', readings_append)
+    handler = app.make_handler()
+    server = await loop.create_server(handler, HOST, PORT)
+    return app, handler, server
+
+
+async def stop_server(app, handler, server):
+    server.close()
+    await server.wait_closed()
+    await app.shutdown()
+    await handler.shutdown()
+    await app.cleanup()
+
+
+async def append_new_session(readings):
+    """ storage call as done before the pooled session: one session, hence one TCP connection, per call """
+    url = 'http://{}:{}/storage/reading'.format(HOST, PORT)
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, data=readings) as resp:
+            return await resp.json()
+
+
+async def run_calls(call, readings, calls, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await call(readings)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(calls)])
+    return calls / (time.perf_counter() - start)
+
+
+async def main(loop, calls, concurrency, batch):
+    app, handler, server = await start_server(loop)
+    svc = MagicMock(ServiceRecord)
+    svc._address, svc._type, svc._port, svc._management_port = HOST, "Storage", PORT, 0
+    client = ReadingsStorageClientAsync(HOST, 0, svc=svc)
+    readings = json.dumps({"readings": [{"asset_code": "bench", "read_key": "5b3be500-ff95-41ae-b5a4-cc99d08bef40",
+                                         "reading": {"rate": 18.4}, "user_ts": "2018-09-21 15:00:09.025655"}] * batch})
+    try:
+        before = await run_calls(append_new_session, readings, calls, concurrency)
+        after = await run_calls(client.append, readings, calls, concurrency)
+    finally:
+        await ReadingsStorageClientAsync.close_session()
+        await stop_server(app, handler, server)
+
+    print("{:<28}{:>14}".format("mode", "calls/sec"))
+    print("{:<28}{:>14,.0f}".format("session per call (before)", before))
+    print("{:<28}{:>14,.0f}".format("pooled keep-alive (after)", after))
+    print("speed-up x{:.2f}".format(after / before))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=2000, help='number of append calls per mode')
+    parser.add_argument('--concurrency', type=int, default=10, help='calls in flight at the same time')
+    parser.add_argument('--batch', type=int, default=10, help='readings per append call')
+    args = parser.parse_args()
+    _loop = asyncio.get_event_loop()
+    _loop.run_until_complete(main(_loop, args.calls, args.concurrency, args.batch))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+""" Benchmark foglamp/plugins/north/common/common.py - convert_to_type
+
+Converts blocks of synthetic readings generated from the fogbench templates, as done by
+SendingProcess._transform_in_memory_data_readings, using the evaluation of every value done before the fast path
+and the cache of the strings were introduced and using convert_to_type. The values are generated both as numbers,
+as they are returned by the storage layer, and as strings.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+import foglamp.plugins.north.common.common as plugin_common
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+_FOGLAMP_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), *[os.pardir] * 7))
+_TEMPLATE = os.path.join(_FOGLAMP_ROOT, "data", "extras", "fogbench", "fogbench_sensor_coap.template.json")
+
+
+def convert_to_type_evaluated(value):
+    """ convert_to_type as done before the fast path: every value is evaluated """
+    return plugin_common._convert_to_type(value)
+
+
+def generate_block(templates, rows, as_strings):
+    """ Generates a block of readings using the fogbench templates, the values are rounded as fogbench does """
+    block = []
+    for _ in range(rows):
+        template = random.choice(templates)
+        reading = {}
+        for sensor_value in template["sensor_values"]:
+            value = round(random.uniform(sensor_value["min"], sensor_value["max"]), sensor_value.get("precision", 0))
+            if sensor_value["type"] == "number" and sensor_value.get("precision", 0) == 0:
+                value = int(value)
+            reading[sensor_value["name"]] = str(value) if as_strings else value
+        block.append({"asset_code": template["name"], "reading": reading})
+    return block
+
+
+def convert_block(convert, block):
+    """ The conversion loop of SendingProcess._transform_in_memory_data_readings """
+    for row in block:
+        payload = row['reading']
+        for key in list(payload.keys()):
+            payload[key] = convert(payload[key])
+
+
+def run(convert, templates, rows, blocks, as_strings):
+    random.seed(0)
+    test_blocks = [generate_block(templates, rows, as_strings) for _ in range(blocks)]
+    start = time.perf_counter()
+    for block in test_blocks:
+        convert_block(convert, block)
+    return rows * blocks / (time.perf_counter() - start)
+
+
+def main(rows, blocks):
+    with open(_TEMPLATE) as f:
+        templates = [template for template in json.load(f)
+                     if all(v["type"] == "number" for v in template["sensor_values"])]
+
+    print("{:<10}{:>22}{:>28}{:>10}".format("values", "evaluated rows/sec", "convert_to_type rows/sec", "speed-up"))
+    for as_strings in (False, True):
+        plugin_common._convert_string_to_type.cache_clear()
+        before = run(convert_to_type_evaluated, templates, rows, blocks, as_strings)
+        after = run(plugin_common.convert_to_type, templates, rows, blocks, as_strings)
+        print("{:<10}{:>22,.0f}{:>28,.0f}{:>9.2f}x".format("strings" if as_strings else "numbers",
+                                                           before, after, after / before))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000, help='readings per block')
+    parser.add_argument('--blocks', type=int, default=10, help='blocks converted per mode')
+    args = parser.parse_args()
+    main(args.rows, args.blocks)
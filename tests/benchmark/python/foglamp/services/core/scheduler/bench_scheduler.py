@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+""" Benchmark foglamp/services/core/scheduler/scheduler.py
+
+Drives Scheduler._check_schedules with a fake clock (Scheduler.current_time) over thousands of interval schedules.
+Every simulated second the clock advances and the scheduler is also woken up by a number of task completions, as
+_wait_for_task_completion does. The timer heap is compared with the linear scan of all the schedule executions
+used before it was introduced. Tasks are not started, _start_task is replaced by a stub.
+"""
+
+import argparse
+import asyncio
+import datetime
+import logging
+import random
+import time
+import uuid
+
+from foglamp.services.core.scheduler.entities import Schedule
+from foglamp.services.core.scheduler.scheduler import Scheduler
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+async def check_schedules_linear(scheduler):
+    """ Scheduler._check_schedules as done before the timer heap: every schedule execution is looked at """
+    earliest_start_time = None
+    for schedule_id in list(scheduler._schedule_executions.keys()):
+        if scheduler._paused or len(scheduler._task_processes) >= scheduler._max_running_tasks:
+            return None
+        schedule_execution = scheduler._schedule_executions[schedule_id]
+        try:
+            schedule = scheduler._schedules[schedule_id]
+        except KeyError:
+            if not schedule_execution.task_processes:
+                del scheduler._schedule_executions[schedule_id]
+            continue
+        if schedule.enabled is False:
+            continue
+        if schedule.exclusive and schedule_execution.task_processes:
+            continue
+        next_start_time = schedule_execution.next_start_time
+        if not next_start_time and not schedule_execution.start_now:
+            if not schedule_execution.task_processes:
+                del scheduler._schedule_executions[schedule_id]
+            continue
+        if next_start_time and not schedule_execution.start_now:
+            now = scheduler.current_time if scheduler.current_time else time.time()
+            right_time = now >= next_start_time
+        else:
+            right_time = False
+        if right_time or schedule_execution.start_now:
+            if not right_time:
+                pass
+            elif schedule.exclusive:
+                next_start_time = None
+            else:
+                scheduler._schedule_next_task(schedule)
+                next_start_time = schedule_execution.next_start_time
+            await scheduler._start_task(schedule)
+            schedule_execution.start_now = False
+        if next_start_time and (earliest_start_time is None or earliest_start_time > next_start_time):
+            earliest_start_time = next_start_time
+    return earliest_start_time
+
+
+def create_scheduler(schedules_count, seed):
+    scheduler = Scheduler()
+    scheduler._logger.setLevel(logging.WARNING)
+    scheduler._max_running_tasks = schedules_count
+    scheduler._start_time = time.time()
+    scheduler.current_time = scheduler._start_time
+    scheduler.started = 0
+
+    async def start_task(schedule):
+        scheduler.started += 1
+
+    scheduler._start_task = start_task
+
+    rand = random.Random(seed)
+    for i in range(schedules_count):
+        repeat_seconds = rand.choice([5, 15, 30, 60, 300, 3600])
+        schedule = scheduler._ScheduleRow(id=uuid.uuid4(), name='schedule {}'.format(i), type=Schedule.Type.INTERVAL,
+                                          time=None, day=None, repeat=datetime.timedelta(seconds=repeat_seconds),
+                                          repeat_seconds=repeat_seconds, exclusive=False, enabled=True,
+                                          process_name='bench')
+        scheduler._schedules[schedule.id] = schedule
+        scheduler._schedule_first_task(schedule, scheduler._start_time)
+    return scheduler
+
+
+async def run(check, schedules_count, seconds, wakeups, seed):
+    scheduler = create_scheduler(schedules_count, seed)
+    checks = 0
+    start = time.perf_counter()
+    for _ in range(seconds):
+        scheduler.current_time += 1
+        for _ in range(1 + wakeups):
+            await check(scheduler)
+            checks += 1
+    elapsed = time.perf_counter() - start
+    return checks / elapsed, scheduler.started
+
+
+async def main(schedules_count, seconds, wakeups, seed):
+    before, before_started = await run(check_schedules_linear, schedules_count, seconds, wakeups, seed)
+    after, after_started = await run(Scheduler._check_schedules, schedules_count, seconds, wakeups, seed)
+
+    print("{:<24}{:>14}{:>16}".format("mode", "checks/sec", "tasks started"))
+    print("{:<24}{:>14,.0f}{:>16,}".format("linear scan (before)", before, before_started))
+    print("{:<24}{:>14,.0f}{:>16,}".format("timer heap (after)", after, after_started))
+    print("speed-up x{:.2f}".format(after / before))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--schedules', type=int, default=5000, help='number of interval schedules')
+    parser.add_argument('--seconds', type=int, default=600, help='simulated seconds')
+    parser.add_argument('--wakeups', type=int, default=5, help='task completion wake-ups per simulated second')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the random schedule intervals')
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(main(args.schedules, args.seconds, args.wakeups, args.seed))
@@ -4,10 +4,15 @@ from unittest.mock import MagicMock
 from unittest.mock import patch
 from http.client import HTTPConnection, HTTPResponse
 import json
+import socket
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import unused_port
 import pytest
 
 from foglamp.common.microservice_management_client import exceptions as client_exceptions
-from foglamp.common.microservice_management_client.microservice_management_client import MicroserviceManagementClient, _logger
+from foglamp.common.microservice_management_client import microservice_management_client
+from foglamp.common.microservice_management_client.microservice_management_client import MicroserviceManagementClient, MicroserviceManagementClientAsync, _logger
 
 __author__ = "Ashwin Gopalakrishnan"
 __copyright__ = "Copyright (c) 2017 OSIsoft, LLC"
@@ -86,6 +91,50 @@ class TestMicroserviceManagementClient:
             response_patch.assert_called_once_with()
         request_patch.assert_called_once_with(body='{}', method='POST', url='/foglamp/service')
 
+    def test_bootstrap(self):
+        microservice_management_host = 'host1'
+        microservice_management_port = 1
+        ms_mgt_client = MicroserviceManagementClient(
+            microservice_management_host, microservice_management_port)
+        response_mock = MagicMock(type=HTTPResponse)
+        undecoded_data_mock = MagicMock()
+        response_mock.read.return_value = undecoded_data_mock
+        test_dict = {'categories': {'Security': {'local_services': {'value': 'false'}}}}
+        undecoded_data_mock.decode.return_value = json.dumps(test_dict)
+        response_mock.status = 200
+        payload = {'categories': [{'key': 'Security', 'description': 'Microservices Security', 'value': {}}],
+                   'children': [{'parent': 'General', 'children': ['Security']}]}
+        with patch.object(HTTPConnection, 'request') as request_patch:
+            with patch.object(HTTPConnection, 'getresponse', return_value=response_mock) as response_patch:
+                ret_value = ms_mgt_client.bootstrap(payload)
+            response_patch.assert_called_once_with()
+        request_patch.assert_called_once_with(body=json.dumps(payload), method='POST',
+                                              url='/foglamp/service/bootstrap')
+        assert test_dict == ret_value
+
+    @pytest.mark.parametrize("status_code, host", [(450, 'Client'), (550, 'Server')])
+    def test_bootstrap_exception(self, status_code, host):
+        microservice_management_host = 'host1'
+        microservice_management_port = 1
+        ms_mgt_client = MicroserviceManagementClient(
+            microservice_management_host, microservice_management_port)
+        response_mock = MagicMock(type=HTTPResponse)
+        undecoded_data_mock = MagicMock()
+        response_mock.read.return_value = undecoded_data_mock
+        response_mock.status = status_code
+        response_mock.reason = 'this is the reason'
+        with patch.object(HTTPConnection, 'request') as request_patch:
+            with patch.object(HTTPConnection, 'getresponse', return_value=response_mock) as response_patch:
+                with patch.object(_logger, "error") as log_error:
+                    with pytest.raises(Exception) as excinfo:
+                        ms_mgt_client.bootstrap({})
+                    assert excinfo.type is client_exceptions.MicroserviceManagementClientError
+                assert 1 == log_error.call_count
+                msg = '{} error code: %d, Reason: %s'.format(host)
+                log_error.assert_called_once_with(msg, status_code, 'this is the reason')
+            response_patch.assert_called_once_with()
+        request_patch.assert_called_once_with(body='{}', method='POST', url='/foglamp/service/bootstrap')
+
     def test_unregister_service_good_id(self):
         microservice_management_host = 'host1'
         microservice_management_port = 1
@@ -783,3 +832,107 @@ class TestMicroserviceManagementClient:
         assert 'POST' == kwargs['method']
         assert '/foglamp/track' == kwargs['url']
         assert test_dict == json.loads(kwargs['body'])
+
+    def test_retry_on_connection_error(self):
+        ms_mgt_client = MicroserviceManagementClient('host1', 1)
+        response_mock = MagicMock(type=HTTPResponse)
+        undecoded_data_mock = MagicMock()
+        response_mock.read.return_value = undecoded_data_mock
+        undecoded_data_mock.decode.return_value = json.dumps({'track': []})
+        response_mock.status = 200
+        with patch.object(microservice_management_client, '_RETRY_WAIT', 0):
+            with patch.object(HTTPConnection, 'request', side_effect=[ConnectionResetError, None]) as request_patch:
+                with patch.object(HTTPConnection, 'getresponse', return_value=response_mock) as response_patch:
+                    with patch.object(_logger, "warning") as log_warning:
+                        ret_value = ms_mgt_client.get_asset_tracker_events()
+                    assert 1 == log_warning.call_count
+                response_patch.assert_called_once_with()
+        assert 2 == request_patch.call_count
+        assert {'track': []} == ret_value
+
+    @pytest.mark.parametrize("method, side_effect, attempts", [
+        ('get_asset_tracker_events', ConnectionRefusedError, 3),
+        ('get_asset_tracker_events', socket.timeout, 3),
+        ('create_asset_tracker_event', socket.timeout, 1)
+    ])
+    def test_retry_bounded(self, method, side_effect, attempts):
+        ms_mgt_client = MicroserviceManagementClient('host1', 1)
+        with patch.object(microservice_management_client, '_RETRY_WAIT', 0):
+            with patch.object(HTTPConnection, 'request', side_effect=side_effect) as request_patch:
+                with pytest.raises(side_effect):
+                    if method == 'get_asset_tracker_events':
+                        ms_mgt_client.get_asset_tracker_events()
+                    else:
+                        ms_mgt_client.create_asset_tracker_event({'asset': 'AirIntake'})
+        assert attempts == request_patch.call_count
+
+
+@pytest.allure.feature("unit")
+@pytest.allure.story("common", "microservice-management-client")
+class TestMicroserviceManagementClientAsync:
+
+    @pytest.fixture
+    def core(self, loop, test_server):
+        requests = []
+
+        async def handler(request):
+            requests.append((request.method, request.path_qs, await request.text()))
+            if request.match_info['tail'] == 'service/category/BAD':
+                raise web.HTTPBadRequest(reason='this is the reason')
+            if request.match_info['tail'] == 'service':
+                return web.json_response({'notid': 'bla'})
+            return web.json_response({'id': 'bla'})
+
+        app = web.Application()
+        app.router.add_route('*', '/foglamp/{tail:.*}', handler)
+        server = loop.run_until_complete(test_server(app))
+        yield server, requests
+        loop.run_until_complete(MicroserviceManagementClientAsync.close_session())
+
+    async def test_requests(self, core):
+        server, requests = core
+        ms_mgt_client = MicroserviceManagementClientAsync(server.host, server.port)
+        assert {'id': 'bla'} == await ms_mgt_client.get_configuration_category("SMNTR")
+        assert {'id': 'bla'} == await ms_mgt_client.create_configuration_category(
+            json.dumps({"key": "SMNTR", "value": {}, "keep_original_items": True}))
+        assert {'id': 'bla'} == await ms_mgt_client.register_interest("SMNTR", "c6bbf3c8")
+        assert [('GET', '/foglamp/service/category/SMNTR', ''),
+                ('POST', '/foglamp/service/category?keep_original_items=true', '{"key": "SMNTR", "value": {}}'),
+                ('POST', '/foglamp/interest', '{"category": "SMNTR", "service": "c6bbf3c8"}')] == requests
+
+    async def test_session_reused(self, core):
+        server, requests = core
+        ms_mgt_client = MicroserviceManagementClientAsync(server.host, server.port)
+        await ms_mgt_client.get_asset_tracker_events()
+        session = MicroserviceManagementClientAsync._get_session()
+        await MicroserviceManagementClientAsync(server.host, server.port).get_asset_tracker_events()
+        assert session is MicroserviceManagementClientAsync._get_session()
+        assert 2 == len(requests)
+
+    async def test_error_status(self, core):
+        server, requests = core
+        ms_mgt_client = MicroserviceManagementClientAsync(server.host, server.port)
+        with patch.object(_logger, "error") as log_error:
+            with pytest.raises(client_exceptions.MicroserviceManagementClientError) as excinfo:
+                await ms_mgt_client.get_configuration_category("BAD")
+            assert 400 == excinfo.value.status
+            assert 'this is the reason' == excinfo.value.reason
+        log_error.assert_called_once_with('Client error code: %d, Reason: %s', 400, 'this is the reason')
+
+    async def test_register_service_no_id(self, core):
+        server, requests = core
+        ms_mgt_client = MicroserviceManagementClientAsync(server.host, server.port)
+        with patch.object(_logger, "exception") as log_exc:
+            with pytest.raises(KeyError):
+                await ms_mgt_client.register_service({})
+        log_exc.assert_called_once_with('Could not register the microservice, From request %s, Reason: %s', '{}',
+                                        "'id'")
+
+    async def test_retry_bounded(self):
+        ms_mgt_client = MicroserviceManagementClientAsync('127.0.0.1', unused_port())
+        with patch.object(microservice_management_client, '_RETRY_WAIT', 0):
+            with patch.object(_logger, "warning") as log_warning:
+                with pytest.raises(aiohttp.ClientConnectionError):
+                    await ms_mgt_client.get_asset_tracker_events()
+        assert 2 == log_warning.call_count
+        await MicroserviceManagementClientAsync.close_session()
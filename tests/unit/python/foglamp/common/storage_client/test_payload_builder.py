@@ -225,6 +225,13 @@ class TestPayloadBuilderRead:
                                                            ('values', 'avg', 'Average')).payload()
         assert expected == json.loads(res)
 
+    def test_aggregate_payload_with_alias_json_properties(self):
+        res = PayloadBuilder().AGGREGATE(["min", ["values", "rate"]], ["min", ["values", "temp"]]).ALIAS(
+            'aggregate', (['values', 'rate'], 'min', 'min_rate'), (['values', 'temp'], 'min', 'min_temp')).payload()
+        assert {"aggregate": [{"operation": "min", "json": {"column": "values", "properties": "rate"}, "alias": "min_rate"},
+                              {"operation": "min", "json": {"column": "values", "properties": "temp"}, "alias": "min_temp"}]
+                } == json.loads(res)
+
     @pytest.mark.parametrize("test_input, expected", [
         (("user_ts",), _payload("data/payload_timebucket4.json")),
         (("user_ts", "5"), _payload("data/payload_timebucket1.json")),
@@ -55,6 +55,8 @@ class FakeFoglampStorageSrvr:
         self.server = await self.loop.create_server(self.handler, HOST, PORT, ssl=None)
 
     async def stop(self):
+        # release the pooled keep-alive connections held by the clients on this loop
+        await StorageClientAsync.close_session()
         self.server.close()
         await self.server.wait_closed()
         await self.app.shutdown()
@@ -210,6 +212,66 @@ class TestStorageClientAsync:
         log.assert_called_once_with("Storage should be a valid *Storage* micro-service instance")
         assert excinfo.type is InvalidServiceInstance
 
+    @pytest.mark.asyncio
+    async def test_pooled_session(self, event_loop):
+        fake_storage_srvr = FakeFoglampStorageSrvr(loop=event_loop)
+        await fake_storage_srvr.start()
+
+        mockServiceRecord = MagicMock(ServiceRecord)
+        mockServiceRecord._address = HOST
+        mockServiceRecord._type = "Storage"
+        mockServiceRecord._port = PORT
+        mockServiceRecord._management_port = 2000
+
+        sc = StorageClientAsync(1, 2, mockServiceRecord)
+        rsc = ReadingsStorageClientAsync(1, 2, mockServiceRecord)
+
+        await sc.query_tbl("aTable")
+        session = StorageClientAsync._sessions[event_loop]
+        assert session.closed is False
+
+        # Same session, and the same keep-alive connection, is reused by every client on the loop
+        await sc.query_tbl("aTable")
+        await rsc.fetch(1, 2)
+        assert session is StorageClientAsync._sessions[event_loop]
+        assert 1 == len(session.connector._conns)
+
+        await sc.close_session()
+        assert session.closed is True
+        assert event_loop not in StorageClientAsync._sessions
+
+        # A new session is created on the next call after close
+        await sc.query_tbl("aTable")
+        assert session is not StorageClientAsync._sessions[event_loop]
+        await StorageClientAsync.close_session()
+
+        await fake_storage_srvr.stop()
+
+    @pytest.mark.asyncio
+    async def test_set_connection_pool(self, event_loop):
+        default_config = dict(StorageClientAsync._pool_config)
+        try:
+            StorageClientAsync.set_connection_pool(limit=5, limit_per_host=2, keepalive_timeout=10)
+            assert {'limit': 5, 'limit_per_host': 2, 'keepalive_timeout': 10.0} == StorageClientAsync._pool_config
+
+            session = StorageClientAsync._get_session()
+            assert 5 == session.connector.limit
+            assert 2 == session.connector.limit_per_host
+            await StorageClientAsync.close_session()
+        finally:
+            StorageClientAsync._pool_config.update(default_config)
+
+    def test_configure_connection_pool(self):
+        default_config = dict(StorageClientAsync._pool_config)
+        config = {k: dict(v, value=v['default']) for k, v in StorageClientAsync.POOL_CATEGORY_CONFIG.items()}
+        config['limit']['value'] = '20'
+        config['keepaliveTimeout']['value'] = '7.5'
+        try:
+            StorageClientAsync.configure_connection_pool(config)
+            assert {'limit': 20, 'limit_per_host': 0, 'keepalive_timeout': 7.5} == StorageClientAsync._pool_config
+        finally:
+            StorageClientAsync._pool_config.update(default_config)
+
     @pytest.mark.asyncio
     async def test_insert_into_tbl(self, event_loop):
         # 'POST', '/storage/table/{tbl_name}', data
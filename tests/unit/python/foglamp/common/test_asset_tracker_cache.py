@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+""" Test foglamp/common/asset_tracker_cache.py """
+
+import pytest
+from unittest.mock import patch, call
+
+from foglamp.common.asset_tracker_cache import AssetTrackerCache
+from foglamp.common.microservice_management_client.microservice_management_client import \
+    MicroserviceManagementClientAsync
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+async def mock_coro(*args):
+    return {}
+
+
+@pytest.allure.feature("unit")
+@pytest.allure.story("common", "asset-tracker-cache")
+class TestAssetTrackerCache:
+
+    @pytest.mark.asyncio
+    async def test_load(self):
+        cache = AssetTrackerCache('localhost', 0)
+        cache.load([{"asset": "sinusoid", "event": "Ingest", "service": "sine", "plugin": "sinusoid",
+                     "foglamp": "FogLAMP", "timestamp": "2018-08-13 15:39:48.796"}])
+        with patch.object(MicroserviceManagementClientAsync, 'create_asset_tracker_event', side_effect=mock_coro) as patch_create:
+            cache.start()
+            cache.add("sinusoid", "Ingest", "sine", "sinusoid")
+            await cache.stop()
+        assert {("sinusoid", "Ingest", "sine", "sinusoid")} == cache._events
+        patch_create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_add(self):
+        cache = AssetTrackerCache('localhost', 0)
+        with patch.object(MicroserviceManagementClientAsync, 'create_asset_tracker_event', side_effect=mock_coro) as patch_create:
+            cache.start()
+            cache.add("sinusoid", "Ingest", "sine", "sinusoid")
+            cache.add("sinusoid", "Ingest", "sine", "sinusoid")
+            cache.add("sinusoid", "Egress", "North Readings to PI", "pi_server")
+            await cache.stop()
+        assert 2 == patch_create.call_count
+        patch_create.assert_has_calls([
+            call({"asset": "sinusoid", "event": "Ingest", "service": "sine", "plugin": "sinusoid"}),
+            call({"asset": "sinusoid", "event": "Egress", "service": "North Readings to PI", "plugin": "pi_server"})])
+        assert 0 == cache._queue.qsize()
+        assert cache._flush_task is None
+
+    @pytest.mark.asyncio
+    async def test_add_failed_registration_is_retried(self):
+        cache = AssetTrackerCache('localhost', 0)
+        cache.start()
+        with patch.object(MicroserviceManagementClientAsync, 'create_asset_tracker_event',
+                          side_effect=Exception("core unavailable")) as patch_create:
+            cache.add("sinusoid", "Ingest", "sine", "sinusoid")
+            await cache._queue.join()
+        assert 1 == patch_create.call_count
+        assert set() == cache._events
+
+        with patch.object(MicroserviceManagementClientAsync, 'create_asset_tracker_event', side_effect=mock_coro) as patch_create:
+            cache.add("sinusoid", "Ingest", "sine", "sinusoid")
+            await cache.stop()
+        patch_create.assert_called_once_with({"asset": "sinusoid", "event": "Ingest", "service": "sine",
+                                              "plugin": "sinusoid"})
+        assert {("sinusoid", "Ingest", "sine", "sinusoid")} == cache._events
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
+from unittest.mock import patch
 import pytest
+from foglamp.common import configuration_manager
 from foglamp.common.configuration_manager import ConfigurationCache
 
 __author__ = "Ashish Jabble"
@@ -82,3 +84,66 @@ class TestConfigurationCache:
         assert 'cat1' in cached_manager.cache
         assert 'cat3' in cached_manager.cache
         assert 'cat4' in cached_manager.cache
+
+    def test_remove_least_recently_used(self):
+        cached_manager = ConfigurationCache(max_cache_size=3)
+        cached_manager.update("cat1", {'value': {}})
+        cached_manager.update("cat2", {'value': {}})
+        cached_manager.update("cat3", {'value': {}})
+        assert "cat1" in cached_manager
+        cached_manager.update("cat4", {'value': {}})
+        assert ['cat3', 'cat1', 'cat4'] == list(cached_manager.cache)
+        assert 3 == cached_manager.size
+
+    def test_resize(self):
+        cached_manager = ConfigurationCache()
+        for i in range(5):
+            cached_manager.update("cat{}".format(i), {'value': {}})
+        cached_manager.resize(2)
+        assert 2 == cached_manager.max_cache_size
+        assert ['cat3', 'cat4'] == list(cached_manager.cache)
+
+    def test_tree(self):
+        cached_manager = ConfigurationCache()
+        children = [{'key': 'HTTP SOUTH', 'description': 'HTTP South Plugin', 'displayName': 'HTTP SOUTH'}]
+        assert cached_manager.get_tree(('child', 'south')) is None
+        cached_manager.update_tree(('child', 'south'), children)
+        cached = cached_manager.get_tree(('child', 'south'))
+        assert children == cached
+        cached[0]['children'] = []
+        assert children == cached_manager.get_tree(('child', 'south'))
+        assert 2 == cached_manager.tree_hit
+        assert 1 == cached_manager.tree_miss
+
+    def test_tree_expired(self):
+        cached_manager = ConfigurationCache()
+        with patch.object(configuration_manager.time, 'monotonic', return_value=100):
+            cached_manager.update_tree(('child', 'south'), [])
+            assert [] == cached_manager.get_tree(('child', 'south'))
+        with patch.object(configuration_manager.time, 'monotonic', return_value=100 + ConfigurationCache.TREE_TTL_SECONDS):
+            assert cached_manager.get_tree(('child', 'south')) is None
+        assert {} == cached_manager.tree
+        assert 1 == cached_manager.tree_hit
+        assert 1 == cached_manager.tree_miss
+
+    def test_invalidate_tree(self):
+        cached_manager = ConfigurationCache()
+        cached_manager.update_tree(('groups', True, False), [])
+        cached_manager.update_tree(('child', 'south'), [{'key': 'HTTP SOUTH', 'description': '', 'displayName': ''}])
+        cached_manager.update_tree(('child', 'north'), [{'key': 'SEND_PR_1', 'description': '', 'displayName': ''}])
+        cached_manager.update_tree(('child', 'General'), [])
+        cached_manager.invalidate_tree()
+        assert [('child', 'south'), ('child', 'north'), ('child', 'General')] == list(cached_manager.tree)
+        cached_manager.invalidate_tree(parent='General')
+        assert [('child', 'south'), ('child', 'north')] == list(cached_manager.tree)
+        cached_manager.invalidate_tree(category_name='HTTP SOUTH')
+        assert [('child', 'north')] == list(cached_manager.tree)
+
+    def test_stats(self):
+        cached_manager = ConfigurationCache()
+        cached_manager.update("cat1", {'value': {}})
+        assert "cat1" in cached_manager
+        assert "cat2" not in cached_manager
+        assert cached_manager.get_tree(('child', 'cat1')) is None
+        assert {'size': 1, 'maxSize': 10, 'hit': 1, 'miss': 1,
+                'treeSize': 0, 'treeHit': 0, 'treeMiss': 1} == cached_manager.stats
@@ -7,7 +7,8 @@ from unittest.mock import MagicMock, patch, call
 import pytest
 
 
-from foglamp.common.configuration_manager import ConfigurationManager, ConfigurationManagerSingleton, _valid_type_strings, _logger
+from foglamp.common import configuration_manager
+from foglamp.common.configuration_manager import ConfigurationManager, ConfigurationManagerSingleton, ConfigurationCache, _valid_type_strings, _logger
 from foglamp.common.storage_client.payload_builder import PayloadBuilder
 from foglamp.common.storage_client.storage_client import StorageClientAsync
 from foglamp.common.storage_client.exceptions import StorageServerError
@@ -1460,6 +1461,26 @@ class TestConfigurationManager:
             assert expected_result == ret_val
         assert 2 == query_tbl_patch.call_count
 
+    async def test__read_all_groups_cached(self, reset_singleton):
+        @asyncio.coroutine
+        def q_result(*args):
+            table = args[0]
+            if table == "configuration":
+                return {"rows": [{"key": "General", "description": "General", "display_name": "GEN"}, {"key": "service", "description": "FogLAMP service", "display_name": "SERV"}], "count": 2}
+            if table == "category_children":
+                return {"rows": [{"child": "service"}], "count": 1}
+
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        c_mgr = ConfigurationManager(storage_client_mock)
+        with patch.object(storage_client_mock, 'query_tbl_with_payload', side_effect=q_result) as query_tbl_patch:
+            ret_val = await c_mgr._read_all_groups(root=True, children=False)
+            assert ret_val == await c_mgr._read_all_groups(root=True, children=False)
+            assert 2 == query_tbl_patch.call_count
+            # A new category may be a new group
+            c_mgr._cacheManager.invalidate_tree()
+            assert ret_val == await c_mgr._read_all_groups(root=True, children=False)
+            assert 4 == query_tbl_patch.call_count
+
     @pytest.mark.asyncio
     async def test__read_category_val_1_row(self, reset_singleton):
         @asyncio.coroutine
@@ -1721,7 +1742,7 @@ class TestConfigurationManager:
             pbsetpatch.assert_called_once_with(description=category_description, value=category_val, display_name=category_name)
         storage_client_mock.update_tbl.assert_called_once_with('configuration', None)
 
-    async def test_get_category_child(self):
+    async def test_get_category_child(self, reset_singleton):
         async def async_mock(return_value):
             return return_value
 
@@ -1740,7 +1761,51 @@ class TestConfigurationManager:
             patch_read_all_child.assert_called_once_with(category_name)
         patch_read_cat_val.assert_called_once_with(category_name)
 
-    async def test_get_category_child_no_exist(self):
+    async def test_get_category_child_cached(self, reset_singleton):
+        async def async_mock(return_value):
+            return return_value
+
+        category_name = 'south'
+        child_info_ret_val = [{'key': 'HTTP SOUTH', 'description': 'HTTP South Plugin', 'display_name': 'HTTP SOUTH'}]
+        expected = [{'displayName': 'HTTP SOUTH', 'description': 'HTTP South Plugin', 'key': 'HTTP SOUTH'}]
+
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        c_mgr = ConfigurationManager(storage_client_mock)
+        with patch.object(ConfigurationManager, '_read_category_val', side_effect=lambda *args: async_mock('bla')):
+            with patch.object(ConfigurationManager, '_read_all_child_category_names', side_effect=lambda *args: async_mock([])):
+                with patch.object(ConfigurationManager, '_read_child_info', side_effect=lambda *args: async_mock(child_info_ret_val)) as patch_read_child_info:
+                    assert expected == await c_mgr.get_category_child(category_name)
+                    assert expected == await c_mgr.get_category_child(category_name)
+                    assert 1 == patch_read_child_info.call_count
+                    # Removing a child of the category invalidates the cached children
+                    c_mgr._cacheManager.invalidate_tree(parent=category_name)
+                    assert expected == await c_mgr.get_category_child(category_name)
+                    assert 2 == patch_read_child_info.call_count
+
+    async def test_get_category_child_created_out_of_process(self, reset_singleton):
+        async def async_mock(return_value):
+            return return_value
+
+        category_name = 'Utilities'
+        purge = {'key': 'PURGE_READ', 'description': 'Purge the readings', 'display_name': 'PURGE_READ'}
+        backup = {'key': 'BACK_REST', 'description': 'Backup and Restore', 'display_name': 'BACK_REST'}
+        child_info = [[purge], [purge, backup]]
+
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        c_mgr = ConfigurationManager(storage_client_mock)
+        with patch.object(ConfigurationManager, '_read_category_val', side_effect=lambda *args: async_mock('bla')):
+            with patch.object(ConfigurationManager, '_read_all_child_category_names', side_effect=lambda *args: async_mock([])):
+                with patch.object(ConfigurationManager, '_read_child_info', side_effect=lambda *args: async_mock(child_info.pop(0))):
+                    with patch.object(configuration_manager.time, 'monotonic', return_value=100):
+                        assert ['PURGE_READ'] == [c['key'] for c in await c_mgr.get_category_child(category_name)]
+                    # The backup creates its child straight in the storage layer, seen once the cached children expire
+                    with patch.object(configuration_manager.time, 'monotonic', return_value=101):
+                        assert ['PURGE_READ'] == [c['key'] for c in await c_mgr.get_category_child(category_name)]
+                    with patch.object(configuration_manager.time, 'monotonic',
+                                      return_value=100 + ConfigurationCache.TREE_TTL_SECONDS):
+                        assert ['PURGE_READ', 'BACK_REST'] == [c['key'] for c in await c_mgr.get_category_child(category_name)]
+
+    async def test_get_category_child_no_exist(self, reset_singleton):
         async def async_mock(return_value):
             return return_value
 
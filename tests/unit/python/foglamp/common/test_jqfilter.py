@@ -33,10 +33,28 @@ class TestJQFilter:
     ])
     def test_transform(self, input_filter_string, input_reading_block, expected_return):
         jqfilter_instance = JQFilter()
-        with patch.object(pyjq, "all", return_value=expected_return) as mock_pyjq:
+        with patch.object(pyjq, "compile") as mock_pyjq:
+            mock_pyjq.return_value.all.return_value = expected_return
             ret = jqfilter_instance.transform(input_filter_string, input_reading_block)
             assert ret == expected_return
-        mock_pyjq.assert_called_once_with(input_reading_block, input_filter_string)
+        mock_pyjq.assert_called_once_with(input_reading_block)
+        mock_pyjq.return_value.all.assert_called_once_with(input_filter_string)
+
+    def test_transform_compiled_once(self):
+        jqfilter_instance = JQFilter()
+        with patch.object(pyjq, "compile") as mock_pyjq:
+            jqfilter_instance.transform([{"a": 1}], ".")
+            jqfilter_instance.transform([{"a": 2}], ".")
+            assert mock_pyjq.call_count == 1
+            jqfilter_instance.transform([{"a": 3}], ".[]")
+            assert mock_pyjq.call_count == 2
+        assert mock_pyjq.return_value.all.call_count == 3
+
+    def test_transform_result(self):
+        jqfilter_instance = JQFilter()
+        reading_block = [{"id": 1, "reading": {"humidity": 11}}]
+        ret = jqfilter_instance.transform(reading_block, "(.[]|.reading|.addedField)=512")
+        assert ret == [[{"id": 1, "reading": {"humidity": 11, "addedField": 512}}]]
 
     @pytest.mark.parametrize("input_filter_string, input_reading_block, expected_error, expected_log", [
         (".", '{"a" 1}', TypeError, 'Invalid JSON passed, exception %s'),
@@ -44,9 +62,11 @@ class TestJQFilter:
     ])
     def test_transform_exceptions(self, input_filter_string, input_reading_block, expected_error, expected_log):
         jqfilter_instance = JQFilter()
-        with patch.object(pyjq, "all", side_effect=expected_error) as mock_pyjq:
+        with patch.object(pyjq, "compile") as mock_pyjq:
+            mock_pyjq.return_value.all.side_effect = expected_error
             with patch.object(jqfilter_instance._logger, "error") as log:
                 with pytest.raises(expected_error):
                     jqfilter_instance.transform(input_filter_string, input_reading_block)
-        mock_pyjq.assert_called_once_with(input_reading_block, input_filter_string)
+        mock_pyjq.assert_called_once_with(input_reading_block)
+        mock_pyjq.return_value.all.assert_called_once_with(input_filter_string)
         log.assert_called_once_with(expected_log, '')
@@ -4,8 +4,12 @@
 # See: http://foglamp.readthedocs.io/
 # FOGLAMP_END
 
-import pytest
+import atexit
+import io
 import logging
+import sys
+from unittest.mock import patch
+import pytest
 
 from foglamp.common import logger
 
@@ -95,3 +99,42 @@ class TestLogger:
                     log.setLevel(level) 
                     log.propagate = propagate
                     assert log is logger.setup(name, propagate=propagate, level=level)
+
+    def test_queued(self):
+        """ Test that once queued, the log entries of the loggers already configured and of the new ones
+            are sent by a background thread and that the entries which do not fit in the queue are dropped
+
+        :assert:
+            Assert that the loggers have the queue handler of their destination only
+            Assert the entries sent to the destination
+            Assert the number of dropped entries, logged at shutdown
+        """
+        stream = io.StringIO()
+        with patch.object(logger, '_queued', False), patch.object(logger, '_queue_handlers', {}), \
+                patch.object(logger, '_listeners', []), patch.object(logger, '_loggers', {}), \
+                patch.object(logger, 'QUEUE_SIZE', 2), patch.object(sys, 'stdout', stream), \
+                patch.object(atexit, 'register'):
+            before = logger.setup('queued_before', destination=logger.CONSOLE)
+            after = logger.setup('queued_after', destination=logger.CONSOLE, queued=True)
+            handler = logger._queue_handlers[logger.CONSOLE]
+            assert [handler] == before.handlers
+            assert [handler] == after.handlers
+
+            # entries are queued while the background thread is stopped
+            listener = logger._listeners[0]
+            listener.stop()
+            before.warning('first')
+            after.warning('second')
+            after.warning('dropped')
+            listener.start()
+            logger.shutdown()
+
+            assert 1 == logger.dropped_records()
+            lines = stream.getvalue().splitlines()
+            assert 3 == len(lines)
+            assert lines[0].endswith('WARNING: test_logger: queued_before: first')
+            assert lines[1].endswith('WARNING: test_logger: queued_after: second')
+            assert lines[2].endswith('WARNING: logger: foglamp.common.logger: '
+                                     '1 log entries were dropped, the logging queue was full')
+        for name in ('queued_before', 'queued_after'):
+            logging.getLogger(name).handlers.clear()
@@ -58,6 +58,7 @@ class TestFoglampProcess:
         assert fp._core_management_port is 0
         assert fp._name is 'sname'
         assert hasattr(fp, '_core_microservice_management_client')
+        assert 'http://corehost:0' == fp._core_microservice_management_client_async._base_url
         assert hasattr(fp, '_readings_storage_async')
         assert hasattr(fp, '_storage_async')
         assert hasattr(fp, '_start_time')
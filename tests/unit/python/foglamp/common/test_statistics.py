@@ -4,13 +4,16 @@
 # See: http://foglamp.readthedocs.io/
 # FOGLAMP_END
 
+import asyncio
 import json
 
 from unittest.mock import MagicMock, patch
+import aiohttp
 import pytest
 
 from foglamp.common import statistics
 from foglamp.common.storage_client.storage_client import StorageClientAsync
+from foglamp.common.storage_client.exceptions import StorageServerError
 
 
 __author__ = "Ashish Jabble, Mark Riddoch, Vaibhav Singhal"
@@ -58,7 +61,7 @@ class TestStatistics:
         """ Test that register results in a database insert """
         storageMock = MagicMock(spec=StorageClientAsync)
         stats = statistics.Statistics(storageMock)
-        stats._registered_keys = []
+        stats._registered_keys = set()
 
         async def mock_coro():
             return {"response": "updated", "rows_affected": 1}
@@ -79,7 +82,7 @@ class TestStatistics:
         """ Test that register results in a database insert only once for same key"""
         storageMock = MagicMock(spec=StorageClientAsync)
         stats = statistics.Statistics(storageMock)
-        stats._registered_keys = []
+        stats._registered_keys = set()
 
         async def mock_coro():
             return {"response": "updated", "rows_affected": 1}
@@ -107,7 +110,7 @@ class TestStatistics:
         """Test the load key"""
         storage_client_mock = MagicMock(spec=StorageClientAsync)
         s = statistics.Statistics(storage_client_mock)
-        s._registered_keys = []
+        s._registered_keys = set()
 
         async def mock_coro():
             return {'rows': [{"previous_value": 0, "value": 1,
@@ -121,7 +124,7 @@ class TestStatistics:
         """Test the load key exception"""
         storage_client_mock = MagicMock(spec=StorageClientAsync)
         s = statistics.Statistics(storage_client_mock)
-        s._registered_keys = []
+        s._registered_keys = set()
 
         async def mock_coro():
             return Exception
@@ -215,3 +218,124 @@ class TestStatistics:
                 with patch.object(statistics._logger, 'exception') as logger_exception:
                     await s.add_update(stat_dict)
                 logger_exception.assert_called_once_with(*msg)
+
+    async def test_deferred_writes(self):
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        s = statistics.Statistics(storage_client_mock)
+
+        async def mock_coro():
+            return {"response": "updated", "rows_affected": 2}
+
+        s._registered_keys = {'READINGS', 'DISCARDED'}
+        with patch.object(s._storage, 'update_tbl', return_value=mock_coro()) as stat_update:
+            s.start_deferred_writes()
+            await s.update('READINGS', 5)
+            await s.update_bulk({'READINGS': 2, 'DISCARDED': 1})
+            await s.add_update({'DISCARDED': 3})
+            stat_update.assert_not_called()
+            await s.stop_deferred_writes()
+        payload = {"updates": [
+            {"where": {"column": "key", "condition": "=", "value": "READINGS"},
+             "expressions": [{"column": "value", "operator": "+", "value": 7}]},
+            {"where": {"column": "key", "condition": "=", "value": "DISCARDED"},
+             "expressions": [{"column": "value", "operator": "+", "value": 4}]}]}
+        args, kwargs = stat_update.call_args
+        assert 1 == stat_update.call_count
+        assert 'statistics' == args[0]
+        assert payload == json.loads(args[1])
+
+    async def test_deferred_writes_unregistered_key(self):
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        s = statistics.Statistics(storage_client_mock)
+        s._registered_keys = {'READINGS'}
+        s.start_deferred_writes()
+
+        async def mock_coro():
+            return {'count': 1, 'rows': [{'key': 'READINGS'}]}
+
+        with patch.object(s._storage, 'query_tbl_with_payload', return_value=mock_coro()) as query_patch:
+            with patch.object(statistics._logger, 'error') as logger_error:
+                with pytest.raises(KeyError):
+                    await s.add_update({'READINGS': 1, 'FOGBENCH/TEMPERATURE': 1})
+            logger_error.assert_called_once_with('Statistics key %s has not been registered', 'FOGBENCH/TEMPERATURE')
+        # the keys are reloaded before the key is reported as not registered
+        assert 1 == query_patch.call_count
+        assert {} == s._pending
+        s._flush_task.cancel()
+        s._flush_task = None
+
+    @pytest.mark.parametrize("error", [
+        aiohttp.ClientConnectorError(MagicMock(), ConnectionRefusedError(111, 'Connection refused')),
+        StorageServerError(400, 'Bad Request', {'message': 'error'})
+    ])
+    async def test_deferred_writes_flush_not_applied(self, error):
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        s = statistics.Statistics(storage_client_mock)
+        s._registered_keys = {'READINGS'}
+        s.start_deferred_writes()
+        await s.update('READINGS', 5)
+
+        async def mock_keys():
+            return {'count': 1, 'rows': [{'key': 'READINGS'}]}
+
+        with patch.object(s._storage, 'update_tbl', side_effect=error):
+            with patch.object(s._storage, 'query_tbl_with_payload', side_effect=lambda *args: mock_keys()):
+                with patch.object(statistics._logger, 'exception'):
+                    with pytest.raises(type(error)):
+                        await s.flush()
+        # the update has not been applied, the increments are kept for the next flush
+        await s.update('READINGS', 1)
+        assert {'READINGS': 6} == s._pending
+
+        async def mock_coro():
+            return {"response": "updated", "rows_affected": 1}
+
+        with patch.object(s._storage, 'update_tbl', return_value=mock_coro()) as stat_update:
+            await s.stop_deferred_writes()
+        args, kwargs = stat_update.call_args
+        assert 6 == json.loads(args[1])["updates"][0]["expressions"][0]["value"]
+        assert s._pending is None
+
+    async def test_deferred_writes_flush_key_removed(self):
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        s = statistics.Statistics(storage_client_mock)
+        s._registered_keys = {'READINGS', 'DISCARDED'}
+        s.start_deferred_writes()
+        await s.update_bulk({'READINGS': 5, 'DISCARDED': 1})
+
+        async def mock_keys():
+            return {'count': 1, 'rows': [{'key': 'READINGS'}]}
+
+        error = StorageServerError(400, 'Bad Request', {'message': 'No rows where updated'})
+        with patch.object(s._storage, 'update_tbl', side_effect=error):
+            with patch.object(s._storage, 'query_tbl_with_payload', side_effect=lambda *args: mock_keys()):
+                with patch.object(statistics._logger, 'exception'):
+                    with patch.object(statistics._logger, 'error') as logger_error:
+                        with pytest.raises(StorageServerError):
+                            await s.flush()
+                    logger_error.assert_called_once_with(
+                        'Dropped the increments of the statistics key %s, not registered anymore', 'DISCARDED')
+        # the increments of the key removed from the storage are not written again
+        assert {'READINGS': 5} == s._pending
+        s._flush_task.cancel()
+        s._flush_task = None
+
+    @pytest.mark.parametrize("error", [aiohttp.ServerDisconnectedError(), asyncio.TimeoutError()])
+    async def test_deferred_writes_flush_exception(self, error):
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        s = statistics.Statistics(storage_client_mock)
+        s._registered_keys = {'READINGS'}
+        s.start_deferred_writes()
+        await s.update('READINGS', 5)
+        with patch.object(s._storage, 'update_tbl', side_effect=error):
+            with patch.object(statistics._logger, 'exception'):
+                with patch.object(statistics._logger, 'error') as logger_error:
+                    with pytest.raises(type(error)):
+                        await s.flush()
+                logger_error.assert_called_once_with('Dropped the statistics increments %s', {'READINGS': 5})
+        # the update may have been applied, the increments are not written again
+        assert {} == s._pending
+        with patch.object(s._storage, 'update_tbl') as stat_update:
+            await s.stop_deferred_writes()
+        stat_update.assert_not_called()
+        assert s._pending is None
@@ -59,6 +59,24 @@ class TestPluginsNorthCommon(object):
 
         assert plugin_common.convert_to_type(value) != expected
 
+    @pytest.mark.parametrize("value, expected, expected_type", [
+        (180.0, 180.0, float),
+        (10, 10, int),
+        ("180.0", 180.0, float),
+        ("10", 10, int),
+        ("xxx", "xxx", str),
+        (True, 1.0, float),
+        ([1, 2], [1, 2], list),
+    ])
+    def test_convert_to_type_type(self, value, expected, expected_type):
+        """ tests the type returned by convert_to_type, also when the conversion of a string is cached """
+
+        for _ in range(2):
+            value_converted = plugin_common.convert_to_type(value)
+
+            assert value_converted == expected
+            assert type(value_converted) is expected_type
+
     @pytest.mark.parametrize("value, expected", [
         # Cases - standard
         ("String 1", "string"),
@@ -28,6 +28,19 @@ async def mock_async_call(p1=ANY):
     return p1
 
 
+def mock_transform_in_memory_data(ret_transform_in_memory_data):
+    """ mocks transform_in_memory_data, adding an OMF message to data_to_send when data is available """
+
+    def transform_in_memory_data(data_to_send, raw_data, messages_positions=None):
+        if ret_transform_in_memory_data[0]:
+            data_to_send.append([{"containerid": "0001measurement_test_asset_code", "values": []}])
+            if messages_positions is not None:
+                messages_positions.append((ret_transform_in_memory_data[1], ret_transform_in_memory_data[2]))
+        return ret_transform_in_memory_data
+
+    return transform_in_memory_data
+
+
 @pytest.fixture
 def fixture_ocs(event_loop):
     """"  Configures the OMF instance for the tests """
@@ -89,6 +102,8 @@ class TestOCS:
                 "OMFMaxRetry": {"value": "100"},
                 "OMFRetrySleepTime": {"value": "100"},
                 "OMFHttpTimeout": {"value": "100"},
+                "OMFMaxReadingsPerMessage": {"value": "100"},
+                "OMFMaxConnections": {"value": "4"},
                 "StaticData": {
                     "value": json.dumps(
                         {
@@ -127,6 +142,8 @@ class TestOCS:
         assert config['OMFMaxRetry'] == 100
         assert config['OMFRetrySleepTime'] == 100
         assert config['OMFHttpTimeout'] == 100
+        assert config['OMFMaxReadingsPerMessage'] == 100
+        assert config['OMFMaxConnections'] == 4
 
         # Check conversion from String to Dict
         assert isinstance(config['StaticData'], dict)
@@ -143,6 +160,8 @@ class TestOCS:
                 "OMFMaxRetry": {"value": "100"},
                 "OMFRetrySleepTime": {"value": "100"},
                 "OMFHttpTimeout": {"value": "100"},
+                "OMFMaxReadingsPerMessage": {"value": "100"},
+                "OMFMaxConnections": {"value": "4"},
                 "StaticData": {
                     "value":
                         {
@@ -167,6 +186,8 @@ class TestOCS:
                 "OMFMaxRetry": {"value": "xxx"},
                 "OMFRetrySleepTime": {"value": "100"},
                 "OMFHttpTimeout": {"value": "100"},
+                "OMFMaxReadingsPerMessage": {"value": "100"},
+                "OMFMaxConnections": {"value": "4"},
                 "StaticData": {
                     "value": json.dumps(
                         {
@@ -192,6 +213,8 @@ class TestOCS:
                 "OMFMaxRetry": {"value": "100"},
                 "OMFRetrySleepTime": {"value": "100"},
                 "OMFHttpTimeout": {"value": "100"},
+                "OMFMaxReadingsPerMessage": {"value": "100"},
+                "OMFMaxConnections": {"value": "4"},
                 "StaticData": {
                     "value": json.dumps(
                         {
@@ -217,6 +240,8 @@ class TestOCS:
                 "OMFMaxRetry": {"value": "100"},
                 "OMFRetrySleepTime": {"value": "100"},
                 "OMFHttpTimeout": {"value": "100"},
+                "OMFMaxReadingsPerMessage": {"value": "100"},
+                "OMFMaxConnections": {"value": "4"},
                 "StaticData": {
                     "value": json.dumps(
                         {
@@ -273,7 +298,8 @@ class TestOCS:
 
         with patch.object(fixture_ocs.OCSNorthPlugin,
                           'transform_in_memory_data',
-                          return_value=ret_transform_in_memory_data) as patched_transform_in_memory_data:
+                          side_effect=mock_transform_in_memory_data(ret_transform_in_memory_data)
+                          ) as patched_transform_in_memory_data:
             with patch.object(fixture_ocs.OCSNorthPlugin,
                               'create_omf_objects',
                               return_value=mock_async_call()) as patched_create_omf_objects:
@@ -324,7 +350,7 @@ class TestOCS:
 
         with patch.object(fixture_ocs.OCSNorthPlugin,
                           'transform_in_memory_data',
-                          return_value=ret_transform_in_memory_data
+                          side_effect=mock_transform_in_memory_data(ret_transform_in_memory_data)
                           ) as patched_transform_in_memory_data:
 
             with patch.object(fixture_ocs.OCSNorthPlugin,
@@ -356,6 +382,16 @@ class TestOCS:
         data = []
         ocs.plugin_shutdown([data])
 
+    @pytest.mark.asyncio
+    async def test_plugin_close_session(self):
+
+        async def mock_close_session():
+            return None
+
+        with patch.object(ocs.OCSNorthPlugin, 'close_session', side_effect=mock_close_session) as patched_close:
+            await ocs.plugin_close_session([])
+        patched_close.assert_called_once_with()
+
     def test_plugin_reconfigure(self):
 
         ocs._logger = MagicMock()
@@ -16,6 +16,7 @@ import pytest
 import json
 import time
 import ast
+import gzip
 
 import aiohttp
 
@@ -58,6 +59,8 @@ def fixture_omf_north(event_loop):
     omf_north = pi_server.PIServerNorthPlugin(sending_process_instance, config, config_omf_types, _logger)
 
     omf_north._sending_process_instance._storage_async = MagicMock(spec=StorageClientAsync)
+    pi_server.PIServerNorthPlugin._omf_types_created = {}
+    pi_server.PIServerNorthPlugin._omf_types_locks = {}
 
     return omf_north
 
@@ -67,6 +70,19 @@ async def mock_async_call(p1=ANY):
     return p1
 
 
+def mock_transform_in_memory_data(ret_transform_in_memory_data):
+    """ mocks transform_in_memory_data, adding an OMF message to data_to_send when data is available """
+
+    def transform_in_memory_data(data_to_send, raw_data, messages_positions=None):
+        if ret_transform_in_memory_data[0]:
+            data_to_send.append([{"containerid": "0001measurement_test_asset_code", "values": []}])
+            if messages_positions is not None:
+                messages_positions.append((ret_transform_in_memory_data[1], ret_transform_in_memory_data[2]))
+        return ret_transform_in_memory_data
+
+    return transform_in_memory_data
+
+
 class MockAiohttpClientSession(MagicMock):
     """" mock the aiohttp.ClientSession context manager """
 
@@ -151,6 +167,8 @@ class TestPiServer:
                 "OMFMaxRetry": {"value": "100"},
                 "OMFRetrySleepTime": {"value": "100"},
                 "OMFHttpTimeout": {"value": "100"},
+                "OMFMaxReadingsPerMessage": {"value": "100"},
+                "OMFMaxConnections": {"value": "4"},
                 "StaticData": {
                     "value": json.dumps(
                         {
@@ -185,6 +203,8 @@ class TestPiServer:
         assert config['OMFMaxRetry'] == 100
         assert config['OMFRetrySleepTime'] == 100
         assert config['OMFHttpTimeout'] == 100
+        assert config['OMFMaxReadingsPerMessage'] == 100
+        assert config['OMFMaxConnections'] == 4
 
         # Check conversion from String to Dict
         assert isinstance(config['StaticData'], dict)
@@ -295,7 +315,7 @@ class TestPiServer:
 
             with patch.object(fixture_omf.PIServerNorthPlugin,
                               'transform_in_memory_data',
-                              return_value=ret_transform_in_memory_data):
+                              side_effect=mock_transform_in_memory_data(ret_transform_in_memory_data)):
 
                 with patch.object(fixture_omf.PIServerNorthPlugin,
                                   'create_omf_objects',
@@ -319,7 +339,7 @@ class TestPiServer:
 
             with patch.object(fixture_omf.PIServerNorthPlugin,
                               'transform_in_memory_data',
-                              return_value=ret_transform_in_memory_data):
+                              side_effect=mock_transform_in_memory_data(ret_transform_in_memory_data)):
 
                 data_sent, new_position, num_sent = await fixture_omf.plugin_send(data, p_raw_data, _STREAM_ID)
 
@@ -364,7 +384,7 @@ class TestPiServer:
 
         with patch.object(fixture_omf.PIServerNorthPlugin,
                           'transform_in_memory_data',
-                          return_value=ret_transform_in_memory_data
+                          side_effect=mock_transform_in_memory_data(ret_transform_in_memory_data)
                           ) as patched_transform_in_memory_data:
 
             with patch.object(fixture_omf.PIServerNorthPlugin,
@@ -394,12 +414,55 @@ class TestPiServer:
             assert patched_send_in_memory_data_to_picromf.called
             assert patched_deleted_omf_types_already_created.called
 
+    @pytest.mark.asyncio
+    async def test_plugin_send_partial(self, event_loop, fixture_omf):
+        """ Unit test for - plugin_send - a block split in several OMF Data messages fails after the first one,
+            the position and the rows of the message accepted are returned so that it is not sent again """
+
+        def transform_in_memory_data(data_to_send, raw_data, messages_positions=None):
+            data_to_send.extend([[{"containerid": "0001measurement_a", "values": []}],
+                                 [{"containerid": "0001measurement_a", "values": []}]])
+            messages_positions.extend([(15, 5), (20, 10)])
+            return True, 20, 10
+
+        async def mock_send(message_type, omf_data):
+            if len(sent) == 1:
+                raise KeyError('mocked object generated an exception')
+            sent.append(omf_data)
+
+        sent = []
+        fixture_omf._recreate_omf_objects = True
+        with patch.object(fixture_omf.PIServerNorthPlugin, 'transform_in_memory_data',
+                          side_effect=transform_in_memory_data):
+            with patch.object(fixture_omf.PIServerNorthPlugin, 'create_omf_objects', return_value=mock_async_call()):
+                with patch.object(fixture_omf.PIServerNorthPlugin, 'send_in_memory_data_to_picromf',
+                                  side_effect=mock_send):
+                    with patch.object(fixture_omf.PIServerNorthPlugin, 'deleted_omf_types_already_created',
+                                      return_value=mock_async_call()) as patched_deleted_omf_types_already_created:
+                        data_sent, new_position, num_sent = await fixture_omf.plugin_send(MagicMock(), [], _STREAM_ID)
+
+        assert 1 == len(sent)
+        assert data_sent is False
+        assert 15 == new_position
+        assert 5 == num_sent
+        assert patched_deleted_omf_types_already_created.called
+
     def test_plugin_shutdown(self):
 
         pi_server._logger = MagicMock()
         data = []
         pi_server.plugin_shutdown([data])
 
+    @pytest.mark.asyncio
+    async def test_plugin_close_session(self):
+
+        loop = asyncio.get_event_loop()
+        session = aiohttp.ClientSession(loop=loop)
+        pi_server.PIServerNorthPlugin._sessions[loop] = session
+        await pi_server.plugin_close_session([])
+        assert session.closed
+        assert loop not in pi_server.PIServerNorthPlugin._sessions
+
     def test_plugin_reconfigure(self):
 
         pi_server._logger = MagicMock()
@@ -444,10 +507,10 @@ class TestPIServerNorthPlugin:
                     },
 
                     # expected_data
-                    [
+                    {
                         "asset_code_1",
                         "asset_code_2"
-                    ]
+                    }
             )
         ]
     )
@@ -479,6 +542,38 @@ class TestPIServerNorthPlugin:
 
         assert retrieved_rows == expected_data
 
+    @pytest.mark.asyncio
+    async def test_retrieve_omf_types_already_created_cached(self, fixture_omf_north):
+        """ Unit test for - _retrieve_omf_types_already_created - the Storage layer is queried once """
+
+        storage = fixture_omf_north._sending_process_instance._storage_async
+        rows = {"rows": [{"asset_code": "asset_code_1"}]}
+        with patch.object(storage, 'query_tbl_with_payload',
+                          side_effect=lambda *args: mock_async_call(rows)) as patch_query:
+            assert {"asset_code_1"} == await fixture_omf_north._retrieve_omf_types_already_created("SEND_PR_1", "0001")
+
+            # A new instance of the plugin is created at every send
+            omf_north = pi_server.PIServerNorthPlugin(fixture_omf_north._sending_process_instance,
+                                                      fixture_omf_north._config,
+                                                      fixture_omf_north._config_omf_types,
+                                                      fixture_omf_north._logger)
+            assert {"asset_code_1"} == await omf_north._retrieve_omf_types_already_created("SEND_PR_1", "0001")
+        assert 1 == patch_query.call_count
+
+        with patch.object(storage, 'insert_into_tbl', return_value=mock_async_call()):
+            await fixture_omf_north._flag_created_omf_type("SEND_PR_1", "0001", "asset_code_2")
+        with patch.object(storage, 'query_tbl_with_payload') as patch_query:
+            assert {"asset_code_1", "asset_code_2"} == \
+                   await fixture_omf_north._retrieve_omf_types_already_created("SEND_PR_1", "0001")
+        patch_query.assert_not_called()
+
+        with patch.object(storage, 'delete_from_tbl', return_value=mock_async_call()):
+            await fixture_omf_north.deleted_omf_types_already_created("SEND_PR_1", "0001")
+        with patch.object(storage, 'query_tbl_with_payload', return_value=mock_async_call({"rows": []})) \
+                as patch_query:
+            assert set() == await fixture_omf_north._retrieve_omf_types_already_created("SEND_PR_1", "0001")
+        assert 1 == patch_query.call_count
+
     @pytest.mark.parametrize(
         "p_asset_code, "
         "expected_asset_code, ",
@@ -968,6 +1063,30 @@ class TestPIServerNorthPlugin:
         patched_send_to_picromf.assert_any_call("Data", expected_static_data)
         patched_send_to_picromf.assert_any_call("Data", expected_link_data)
 
+    @pytest.mark.asyncio
+    async def test_create_omf_objects_concurrent(self, fixture_omf_north):
+        """ Unit test for - create_omf_objects
+            Tests that the blocks sent concurrently create a new OMF type once
+        """
+
+        fixture_omf_north._config_omf_types = {"type-id": {"value": "0001"}}
+        raw_data = [{"id": 1, "asset_code": "test_asset_code", "reading": {"humidity": 10}, "user_ts": ANY}]
+        storage = fixture_omf_north._sending_process_instance._storage_async
+        storage.query_tbl_with_payload.side_effect = lambda *args: mock_async_call({"rows": []})
+        storage.insert_into_tbl.side_effect = lambda *args: mock_async_call()
+
+        async def create_omf_objects_automatic(asset_info):
+            await asyncio.sleep(.01)
+
+        with patch.object(fixture_omf_north, '_create_omf_objects_automatic',
+                          side_effect=create_omf_objects_automatic) as patched_create_omf_objects_automatic:
+            await asyncio.gather(fixture_omf_north.create_omf_objects(raw_data, "SEND_PR", "0001"),
+                                 fixture_omf_north.create_omf_objects(raw_data, "SEND_PR", "0001"))
+
+        assert 1 == patched_create_omf_objects_automatic.call_count
+        assert 1 == storage.query_tbl_with_payload.call_count
+        assert 1 == storage.insert_into_tbl.call_count
+
     @pytest.mark.parametrize(
         "p_creation_type, "
         "p_data_origin, "
@@ -1183,6 +1302,7 @@ class TestPIServerNorthPlugin:
         fixture_omf_north._config["OMFRetrySleepTime"] = 1
         fixture_omf_north._config["OMFHttpTimeout"] = 1
         fixture_omf_north._config["OMFMaxRetry"] = 1
+        fixture_omf_north._config["OMFMaxConnections"] = 1
         fixture_omf_north._config["compression"] = "false"
 
 
@@ -1196,6 +1316,42 @@ class TestPIServerNorthPlugin:
         assert patched_aiohttp.called
         assert patched_aiohttp.call_count == 1
 
+    @pytest.mark.asyncio
+    async def test_send_in_memory_data_to_picromf_session_reused(self, fixture_omf_north):
+        """ Unit test for - send_in_memory_data_to_picromf
+            Tests that the session is shared between the sends and closed by close_session
+        """
+
+        fixture_omf_north._config = dict(producerToken="dummy_producerToken")
+        fixture_omf_north._config["URL"] = "dummy_URL"
+        fixture_omf_north._config["OMFRetrySleepTime"] = 1
+        fixture_omf_north._config["OMFHttpTimeout"] = 1
+        fixture_omf_north._config["OMFMaxRetry"] = 1
+        fixture_omf_north._config["OMFMaxConnections"] = 1
+        fixture_omf_north._config["compression"] = "true"
+
+        with patch.object(aiohttp.ClientSession,
+                          'post',
+                          side_effect=[MockAiohttpClientSessionSuccess(), MockAiohttpClientSessionSuccess()]
+                          ) as patched_aiohttp:
+
+            await fixture_omf_north.send_in_memory_data_to_picromf("Data", {'dummy': 'dummy'})
+            session = fixture_omf_north._get_session()
+            await fixture_omf_north.send_in_memory_data_to_picromf("Data", {'dummy': 'dummy'})
+
+        assert patched_aiohttp.call_count == 2
+        assert fixture_omf_north._get_session() is session
+
+        # The compressed body is sent
+        args, kwargs = patched_aiohttp.call_args
+        assert kwargs['headers']['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(kwargs['data']).decode('utf-8')) == {'dummy': 'dummy'}
+
+        await pi_server.PIServerNorthPlugin.close_session()
+        assert session.closed
+        assert fixture_omf_north._get_session() is not session
+        await pi_server.PIServerNorthPlugin.close_session()
+
     @pytest.mark.parametrize(
         "p_is_error, "
         "p_code, "
@@ -1247,6 +1403,7 @@ class TestPIServerNorthPlugin:
         fixture_omf_north._config["OMFRetrySleepTime"] = 1
         fixture_omf_north._config["OMFHttpTimeout"] = 1
         fixture_omf_north._config["OMFMaxRetry"] = 1
+        fixture_omf_north._config["OMFMaxConnections"] = 1
         fixture_omf_north._config["compression"] = "false"
         fixture_omf_north._config["notBlockingErrors"] = ast.literal_eval(pi_server._CONFIG_DEFAULT_OMF["notBlockingErrors"]["default"])
 
@@ -1328,6 +1485,7 @@ class TestPIServerNorthPlugin:
         fixture_omf_north._config["OMFRetrySleepTime"] = 1
         fixture_omf_north._config["OMFHttpTimeout"] = test_omf_http_timeout
         fixture_omf_north._config["OMFMaxRetry"] = 1
+        fixture_omf_north._config["OMFMaxConnections"] = 1
         fixture_omf_north._config["compression"] = "false"
 
         # To avoid the wait time
@@ -1380,6 +1538,7 @@ class TestPIServerNorthPlugin:
         fixture_omf_north._config["OMFRetrySleepTime"] = 1
         fixture_omf_north._config["OMFHttpTimeout"] = 1
         fixture_omf_north._config["OMFMaxRetry"] = max_retry
+        fixture_omf_north._config["OMFMaxConnections"] = 1
         fixture_omf_north._config["compression"] = "false"
         fixture_omf_north._config["notBlockingErrors"] = [{'id': 400, 'message': 'none'}]
 
@@ -1418,7 +1577,7 @@ class TestPIServerNorthPlugin:
                     ],
                     "0001",
                     # Transformed
-                    [
+                    [[
                         {
                             "containerid": "0001measurement_test_asset_code",
                             "values": [
@@ -1429,7 +1588,7 @@ class TestPIServerNorthPlugin:
                                 }
                             ]
                         }
-                    ],
+                    ]],
                     True, 10, 1
             ),
             # Case 2
@@ -1446,7 +1605,7 @@ class TestPIServerNorthPlugin:
                     ],
                     "0001",
                     # Transformed
-                    [
+                    [[
                         {
                             "containerid": "0001measurement_test_asset_code",
                             "values": [
@@ -1456,7 +1615,7 @@ class TestPIServerNorthPlugin:
                                 }
                             ]
                         }
-                    ],
+                    ]],
                     True, 11, 1
             ),
 
@@ -1481,19 +1640,14 @@ class TestPIServerNorthPlugin:
                     ],
                     "0001",
                     # Transformed
-                    [
+                    [[
                         {
                             "containerid": "0001measurement_test_asset_code",
                             "values": [
                                 {
                                     "Time": "2018-04-20T09:38:50.163Z",
                                     "pressure": 957.2
-                                }
-                            ]
-                        },
-                        {
-                            "containerid": "0001measurement_test_asset_code",
-                            "values": [
+                                },
                                 {
                                     "Time": "2018-04-20T09:38:50.163Z",
                                     "y": 34,
@@ -1502,7 +1656,7 @@ class TestPIServerNorthPlugin:
                                 }
                             ]
                         },
-                    ],
+                    ]],
                     True, 20, 2
             )
     ])
@@ -1516,8 +1670,9 @@ class TestPIServerNorthPlugin:
                                              fixture_omf_north):
         """Tests the plugin in memory transformations """
 
-        generated_data_to_send = [None for x in range( len(expected_data_to_send) )]
+        generated_data_to_send = []
 
+        fixture_omf_north._config = {"OMFMaxReadingsPerMessage": 1000}
         fixture_omf_north._config_omf_types = {"type-id": {"value": type_id}}
 
         is_data_available, new_position, num_sent = fixture_omf_north.transform_in_memory_data(generated_data_to_send,
@@ -1529,3 +1684,37 @@ class TestPIServerNorthPlugin:
         assert new_position == expected_new_position
         assert num_sent == expected_num_sent
 
+    def test_plugin_transform_in_memory_data_max_readings(self, fixture_omf_north):
+        """Tests the grouping by container and the split of the messages at OMFMaxReadingsPerMessage readings """
+
+        p_data_origin = [
+            {"id": row_id, "asset_code": asset_code, "reading": {"x": row_id},
+             "user_ts": '2018-04-20 09:38:50.{:06d}+00'.format(row_id * 1000)}
+            for row_id, asset_code in enumerate(["a", "b", "a", "a", "b"], start=1)
+        ]
+
+        fixture_omf_north._config = {"OMFMaxReadingsPerMessage": 3}
+        fixture_omf_north._config_omf_types = {"type-id": {"value": "0001"}}
+
+        generated_data_to_send = []
+        messages_positions = []
+        is_data_available, new_position, num_sent = fixture_omf_north.transform_in_memory_data(generated_data_to_send,
+                                                                                               p_data_origin,
+                                                                                               messages_positions)
+
+        assert [
+            [
+                {"containerid": "0001measurement_a", "values": [{"Time": "2018-04-20T09:38:50.001Z", "x": 1},
+                                                                 {"Time": "2018-04-20T09:38:50.003Z", "x": 3}]},
+                {"containerid": "0001measurement_b", "values": [{"Time": "2018-04-20T09:38:50.002Z", "x": 2}]},
+            ],
+            [
+                {"containerid": "0001measurement_a", "values": [{"Time": "2018-04-20T09:38:50.004Z", "x": 4}]},
+                {"containerid": "0001measurement_b", "values": [{"Time": "2018-04-20T09:38:50.005Z", "x": 5}]},
+            ]
+        ] == generated_data_to_send
+        assert is_data_available is True
+        assert 5 == new_position
+        assert 5 == num_sent
+        assert [(3, 3), (5, 5)] == messages_positions
+
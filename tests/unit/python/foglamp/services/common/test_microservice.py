@@ -36,6 +36,12 @@ _DEFAULT_CONFIG = {
     }
 }
 
+_POOL_CONFIG = {
+    'limit': {'type': 'integer', 'default': '100', 'value': '20'},
+    'limitPerHost': {'type': 'integer', 'default': '0', 'value': '0'},
+    'keepaliveTimeout': {'type': 'float', 'default': '30', 'value': '30'}
+}
+
 
 @pytest.allure.feature("unit")
 @pytest.allure.story("common", "foglamp-microservice")
@@ -93,19 +99,20 @@ class TestFoglampMicroservice:
         with patch.object(asyncio, 'get_event_loop', return_value=loop):
             with patch.object(SilentArgParse, 'silent_arg_parse', side_effect=['corehost', 0, 'sname']):
                 with patch.object(MicroserviceManagementClient, '__init__', return_value=None) as mmc_patch:
-                    with patch.object(MicroserviceManagementClient, 'create_configuration_category', return_value=None):
-                        with patch.object(MicroserviceManagementClient, 'create_child_category',
-                                          return_value=None):
-                            with patch.object(MicroserviceManagementClient, 'get_configuration_category', return_value=_DEFAULT_CONFIG):
-                                with patch.object(ReadingsStorageClientAsync, '__init__',
-                                                  return_value=None) as rsc_async_patch:
-                                    with patch.object(StorageClientAsync, '__init__',
-                                                      return_value=None) as sc_async_patch:
-                                        with patch.object(FoglampMicroservice, '_make_microservice_management_app', return_value=None) as make_patch:
-                                             with patch.object(FoglampMicroservice, '_run_microservice_management_app', side_effect=None) as run_patch:
-                                                 with patch.object(FoglampProcess, 'register_service_with_core', return_value={'id':'bla'}) as reg_patch:
-                                                     with patch.object(FoglampMicroservice, '_get_service_registration_payload', return_value=None) as payload_patch:
-                                                        fm = FoglampMicroserviceImp()
+                    with patch.object(MicroserviceManagementClient, 'bootstrap', return_value={'categories': {'Security': _DEFAULT_CONFIG, 'STORAGE_POOL': _POOL_CONFIG}}) as bootstrap_patch:
+                        with patch.object(ReadingsStorageClientAsync, '__init__',
+                                          return_value=None) as rsc_async_patch:
+                            with patch.object(StorageClientAsync, '__init__',
+                                              return_value=None) as sc_async_patch:
+                                with patch.object(FoglampMicroservice, '_make_microservice_management_app', return_value=None) as make_patch:
+                                     with patch.object(FoglampMicroservice, '_run_microservice_management_app', side_effect=None) as run_patch:
+                                         with patch.object(FoglampProcess, 'register_service_with_core', return_value={'id':'bla'}) as reg_patch:
+                                             with patch.object(FoglampMicroservice, '_get_service_registration_payload', return_value=None) as payload_patch:
+                                                with patch.object(StorageClientAsync, 'set_connection_pool') as pool_patch:
+                                                    fm = FoglampMicroserviceImp()
+        # The storage connection pool is sized from its configuration category
+        assert 'STORAGE_POOL' == bootstrap_patch.call_args[0][0]['categories'][1]['key']
+        pool_patch.assert_called_once_with(limit='20', limit_per_host='0', keepalive_timeout='30')
         # from FoglampProcess
         assert fm._core_management_host is 'corehost'
         assert fm._core_management_port is 0
@@ -147,18 +154,15 @@ class TestFoglampMicroservice:
         with patch.object(asyncio, 'get_event_loop', return_value=loop):
             with patch.object(SilentArgParse, 'silent_arg_parse', side_effect=['corehost', 0, 'sname']):
                 with patch.object(MicroserviceManagementClient, '__init__', return_value=None) as mmc_patch:
-                    with patch.object(MicroserviceManagementClient, 'create_configuration_category', return_value=None):
-                        with patch.object(MicroserviceManagementClient, 'create_child_category',
-                                          return_value=None):
-                            with patch.object(MicroserviceManagementClient, 'get_configuration_category', return_value=_DEFAULT_CONFIG):
-                                with patch.object(ReadingsStorageClientAsync, '__init__',
-                                                  return_value=None) as rsc_async_patch:
-                                    with patch.object(StorageClientAsync, '__init__',
-                                                      return_value=None) as sc_async_patch:
-                                        with patch.object(FoglampMicroservice, '_make_microservice_management_app', side_effect=Exception()) as make_patch:
-                                            with patch.object(_logger, 'exception') as logger_patch:
-                                                with pytest.raises(Exception) as excinfo:
-                                                    fm = FoglampMicroserviceImp()
+                    with patch.object(MicroserviceManagementClient, 'bootstrap', return_value={'categories': {'Security': _DEFAULT_CONFIG, 'STORAGE_POOL': _POOL_CONFIG}}) as bootstrap_patch:
+                        with patch.object(ReadingsStorageClientAsync, '__init__',
+                                          return_value=None) as rsc_async_patch:
+                            with patch.object(StorageClientAsync, '__init__',
+                                              return_value=None) as sc_async_patch:
+                                with patch.object(FoglampMicroservice, '_make_microservice_management_app', side_effect=Exception()) as make_patch:
+                                    with patch.object(_logger, 'exception') as logger_patch:
+                                        with pytest.raises(Exception) as excinfo:
+                                            fm = FoglampMicroserviceImp()
         logger_patch.assert_called_once_with('Unable to intialize FoglampMicroservice due to exception %s', '')
 
     @pytest.mark.asyncio
@@ -185,21 +189,18 @@ class TestFoglampMicroservice:
         with patch.object(asyncio, 'get_event_loop', return_value=loop):
             with patch.object(SilentArgParse, 'silent_arg_parse', side_effect=['corehost', 0, 'sname']):
                 with patch.object(MicroserviceManagementClient, '__init__', return_value=None) as mmc_patch:
-                    with patch.object(MicroserviceManagementClient, 'create_configuration_category', return_value=None):
-                        with patch.object(MicroserviceManagementClient, 'create_child_category',
-                                          return_value=None):
-                            with patch.object(MicroserviceManagementClient, 'get_configuration_category', return_value=_DEFAULT_CONFIG):
-                                with patch.object(ReadingsStorageClientAsync, '__init__',
-                                                  return_value=None) as rsc_async_patch:
-                                    with patch.object(StorageClientAsync, '__init__',
-                                                      return_value=None) as sc_async_patch:
-                                        with patch.object(FoglampMicroservice, '_make_microservice_management_app', return_value=None) as make_patch:
-                                             with patch.object(FoglampMicroservice, '_run_microservice_management_app', side_effect=None) as run_patch:
-                                                 with patch.object(FoglampProcess, 'register_service_with_core', return_value={'id':'bla'}) as reg_patch:
-                                                     with patch.object(FoglampMicroservice, '_get_service_registration_payload', return_value=None) as payload_patch:
-                                                         with patch.object(web, 'json_response', return_value=None) as response_patch:
-                                                             # called once on FoglampProcess init for _start_time, once for ping
-                                                             with patch.object(time, 'time', return_value=1) as time_patch:
-                                                                 fm = FoglampMicroserviceImp()
-                                                                 await fm.ping(None)
+                    with patch.object(MicroserviceManagementClient, 'bootstrap', return_value={'categories': {'Security': _DEFAULT_CONFIG, 'STORAGE_POOL': _POOL_CONFIG}}) as bootstrap_patch:
+                        with patch.object(ReadingsStorageClientAsync, '__init__',
+                                          return_value=None) as rsc_async_patch:
+                            with patch.object(StorageClientAsync, '__init__',
+                                              return_value=None) as sc_async_patch:
+                                with patch.object(FoglampMicroservice, '_make_microservice_management_app', return_value=None) as make_patch:
+                                     with patch.object(FoglampMicroservice, '_run_microservice_management_app', side_effect=None) as run_patch:
+                                         with patch.object(FoglampProcess, 'register_service_with_core', return_value={'id':'bla'}) as reg_patch:
+                                             with patch.object(FoglampMicroservice, '_get_service_registration_payload', return_value=None) as payload_patch:
+                                                 with patch.object(web, 'json_response', return_value=None) as response_patch:
+                                                     # called once on FoglampProcess init for _start_time, once for ping
+                                                     with patch.object(time, 'time', return_value=1) as time_patch:
+                                                         fm = FoglampMicroserviceImp()
+                                                         await fm.ping(None)
         response_patch.assert_called_once_with({'uptime': 0})
@@ -24,6 +24,10 @@ __license__ = "Apache 2.0"
 __version__ = "${VERSION}"
 
 
+RETURN = ['id', 'code', 'level', 'log', {'column': 'ts', 'format': 'YYYY-MM-DD HH24:MI:SS.MS', 'alias': 'timestamp'}, {'column': 'ts', 'format': 'YYYY-MM-DD HH24:MI:SS.US', 'alias': 'cursor'}]
+SORT = [{'column': 'ts', 'direction': 'desc'}, {'column': 'id', 'direction': 'desc'}]
+
+
 @pytest.allure.feature("unit")
 @pytest.allure.story("api", "audit")
 class TestAudit:
@@ -97,44 +101,86 @@ class TestAudit:
                 assert Counter(expected_code_list) == Counter(codes)
             log_code_patch.assert_called_once_with('log_codes')
 
-    @pytest.mark.parametrize("request_params, payload", [
-        ('', {"return": ["code", "level", "log", {"column": "ts", "format": "YYYY-MM-DD HH24:MI:SS.MS", "alias": "timestamp"}], "where": {"column": "1", "condition": "=", "value": 1}, "sort": {"column": "ts", "direction": "desc"}, "limit": 20}),
-        ('?source=PURGE', {'return': ['code', 'level', 'log', {'format': 'YYYY-MM-DD HH24:MI:SS.MS', 'column': 'ts', 'alias': 'timestamp'}], 'where': {'value': 1, 'and': {'value': 'PURGE', 'column': 'code', 'condition': '='}, 'column': '1', 'condition': '='}, 'sort': {'direction': 'desc', 'column': 'ts'}, 'limit': 20}),
-        ('?skip=1', {'where': {'value': 1, 'column': '1', 'condition': '='}, 'limit': 20, 'return': ['code', 'level', 'log', {'column': 'ts', 'format': 'YYYY-MM-DD HH24:MI:SS.MS', 'alias': 'timestamp'}], 'skip': 1, 'sort': {'direction': 'desc', 'column': 'ts'}}),
-        ('?severity=failure', {'where': {'and': {'value': 1, 'column': 'level', 'condition': '='}, 'value': 1, 'column': '1', 'condition': '='}, 'limit': 20, 'return': ['code', 'level', 'log', {'column': 'ts', 'format': 'YYYY-MM-DD HH24:MI:SS.MS', 'alias': 'timestamp'}], 'sort': {'direction': 'desc', 'column': 'ts'}}),
-        ('?severity=FAILURE&limit=1', {'limit': 1, 'sort': {'direction': 'desc', 'column': 'ts'}, 'return': ['code', 'level', 'log', {'column': 'ts', 'format': 'YYYY-MM-DD HH24:MI:SS.MS', 'alias': 'timestamp'}], 'where': {'value': 1, 'condition': '=', 'and': {'value': 1, 'condition': '=', 'column': 'level'}, 'column': '1'}}),
-        ('?severity=INFORMATION&limit=1&skip=1', {'limit': 1, 'sort': {'direction': 'desc', 'column': 'ts'}, 'return': ['code', 'level', 'log', {'column': 'ts', 'format': 'YYYY-MM-DD HH24:MI:SS.MS', 'alias': 'timestamp'}], 'skip': 1, 'where': {'value': 1, 'condition': '=', 'and': {'value': 4, 'condition': '=', 'column': 'level'}, 'column': '1'}}),
-        ('?source=&severity=&limit=&skip=', {'limit': 20, 'sort': {'direction': 'desc', 'column': 'ts'}, 'return': ['code', 'level', 'log', {'column': 'ts', 'format': 'YYYY-MM-DD HH24:MI:SS.MS', 'alias': 'timestamp'}], 'where': {'value': 1, 'condition': '=', 'column': '1'}})
+    @pytest.fixture()
+    def reset_cache(self):
+        audit._log_codes.clear()
+        audit._totals.update({'counts': {}, 'last_id': 0, 'synced': 0})
+        yield
+        audit._log_codes.clear()
+        audit._totals.update({'counts': {}, 'last_id': 0, 'synced': 0})
+
+    @pytest.mark.parametrize("request_params, payload, total_count", [
+        ('', {'return': RETURN, 'where': {'column': '1', 'condition': '=', 'value': 1}, 'sort': SORT, 'limit': 20}, 3),
+        ('?source=PURGE', {'return': RETURN, 'where': {'value': 1, 'and': {'value': 'PURGE', 'column': 'code', 'condition': '='}, 'column': '1', 'condition': '='}, 'sort': SORT, 'limit': 20}, 2),
+        ('?skip=1', {'where': {'value': 1, 'column': '1', 'condition': '='}, 'limit': 20, 'return': RETURN, 'skip': 1, 'sort': SORT}, 3),
+        ('?severity=failure', {'where': {'and': {'value': 1, 'column': 'level', 'condition': '='}, 'value': 1, 'column': '1', 'condition': '='}, 'limit': 20, 'return': RETURN, 'sort': SORT}, 0),
+        ('?severity=FAILURE&limit=1', {'limit': 1, 'sort': SORT, 'return': RETURN, 'where': {'value': 1, 'condition': '=', 'and': {'value': 1, 'condition': '=', 'column': 'level'}, 'column': '1'}}, 0),
+        ('?severity=INFORMATION&limit=1&skip=1', {'limit': 1, 'sort': SORT, 'return': RETURN, 'skip': 1, 'where': {'value': 1, 'condition': '=', 'and': {'value': 4, 'condition': '=', 'column': 'level'}, 'column': '1'}}, 3),
+        ('?source=&severity=&limit=&skip=&cursor=', {'limit': 20, 'sort': SORT, 'return': RETURN, 'where': {'value': 1, 'condition': '=', 'column': '1'}}, 3),
+        ('?source=PURGE&limit=1&cursor=2018-01-30%2018:39:48.796263|2', {'limit': 1, 'sort': SORT, 'return': RETURN, 'where': {'column': '1', 'condition': '=', 'value': 1, 'and': {'column': 'code', 'condition': '=', 'value': 'PURGE', 'and': {'column': 'ts', 'condition': '<', 'value': '2018-01-30 18:39:48.796263', 'or': {'column': 'ts', 'condition': '=', 'value': '2018-01-30 18:39:48.796263', 'and': {'column': 'id', 'condition': '<', 'value': 2, 'and': {'column': '1', 'condition': '=', 'value': 1, 'and': {'column': 'code', 'condition': '=', 'value': 'PURGE'}}}}}}}}, 2)
     ])
-    async def test_get_audit_with_params(self, client, request_params, payload, get_log_codes, loop):
+    async def test_get_audit_with_params(self, client, request_params, payload, total_count, get_log_codes, reset_cache):
         storage_client_mock = MagicMock(StorageClientAsync)
         response = {"rows": [{"log": {"end_time": "2018-01-30 18:39:48.1517317788", "rowsRemaining": 0,
                                       "start_time": "2018-01-30 18:39:48.1517317788", "rowsRemoved": 0,
                                       "unsentRowsRemoved": 0, "rowsRetained": 0},
                               "code": "PURGE", "level": "4", "id": 2,
-                              "timestamp": "2018-01-30 18:39:48.796263", 'count': 1}]}
+                              "timestamp": "2018-01-30 18:39:48.796", "cursor": "2018-01-30 18:39:48.796263"}]}
+        totals = {"rows": [{"code": "PURGE", "level": 4, "count": 2, "max_id": 2},
+                           {"code": "LOGGN", "level": 4, "count": 1, "max_id": 1}]}
+
         @asyncio.coroutine
-        def async_mock():
-            return response
+        def q_result(*args):
+            return totals if 'aggregate' in json.loads(args[1]) else response
 
         @asyncio.coroutine
         def async_mock_log():
             return get_log_codes
 
         with patch.object(connect, 'get_storage_async', return_value=storage_client_mock):
-            with patch.object(storage_client_mock, 'query_tbl', return_value=asyncio.ensure_future(async_mock_log(), loop=loop)):
-                with patch.object(storage_client_mock, 'query_tbl_with_payload', return_value=asyncio.ensure_future(async_mock(), loop=loop)) as log_code_patch:
+            with patch.object(storage_client_mock, 'query_tbl', side_effect=lambda *args: async_mock_log()):
+                with patch.object(storage_client_mock, 'query_tbl_with_payload', side_effect=q_result) as log_patch:
                     resp = await client.get('/foglamp/audit{}'.format(request_params))
                     assert 200 == resp.status
                     result = await resp.text()
                     json_response = json.loads(result)
-                    assert 1 == json_response['totalCount']
+                    assert total_count == json_response['totalCount']
                     assert 1 == len(json_response['audit'])
-                args, kwargs = log_code_patch.call_args
+                    assert "2018-01-30 18:39:48.796" == json_response['audit'][0]['timestamp']
+                    if 'limit=1' in request_params:
+                        assert "2018-01-30 18:39:48.796263|2" == json_response['nextCursor']
+                    else:
+                        assert 'nextCursor' not in json_response
+                assert 2 == log_patch.call_count
+                args, kwargs = log_patch.call_args_list[0]
                 assert 'log' == args[0]
                 p = json.loads(args[1])
                 assert payload == p
 
+    async def test_get_audit_total_count_incremental(self, client, reset_cache):
+        storage_client_mock = MagicMock(StorageClientAsync)
+        totals = [{"rows": [{"code": "PURGE", "level": 4, "count": 2, "max_id": 2}]},
+                  {"rows": [{"code": "PURGE", "level": 4, "count": 1, "max_id": 5},
+                            {"code": "LOGGN", "level": 2, "count": 1, "max_id": 4}]}]
+        last_ids = []
+
+        @asyncio.coroutine
+        def q_result(*args):
+            p = json.loads(args[1])
+            if 'aggregate' in p:
+                last_ids.append(p['where']['value'])
+                return totals[len(last_ids) - 1]
+            return {"rows": []}
+
+        with patch.object(connect, 'get_storage_async', return_value=storage_client_mock):
+            with patch.object(storage_client_mock, 'query_tbl_with_payload', side_effect=q_result):
+                resp = await client.get('/foglamp/audit')
+                assert 2 == json.loads(await resp.text())['totalCount']
+                resp = await client.get('/foglamp/audit?severity=INFORMATION')
+                assert 3 == json.loads(await resp.text())['totalCount']
+        # Only the entries added since the previous request are counted
+        assert [0, 2] == last_ids
+
     @pytest.mark.parametrize("request_params, response_code, response_message", [
         ('?source=BLA', 400, "BLA is not a valid source"),
         ('?source=1234', 400, "1234 is not a valid source"),
@@ -142,9 +188,15 @@ class TestAudit:
         ('?limit=-1', 400, "Limit must be a positive integer"),
         ('?skip=invalid', 400, "Skip/Offset must be a positive integer"),
         ('?skip=-1', 400, "Skip/Offset must be a positive integer"),
-        ('?severity=BLA', 400, "'BLA' is not a valid severity")
+        ('?severity=BLA', 400, "'BLA' is not a valid severity"),
+        ('?cursor=BLA', 400, "BLA is not a valid cursor"),
+        ('?cursor=2018-01-30%2018:39:48.796263', 400, "2018-01-30 18:39:48.796263 is not a valid cursor"),
+        ('?cursor=2018-01-30%2018:39:48.796263|BLA', 400, "2018-01-30 18:39:48.796263|BLA is not a valid cursor"),
+        ('?cursor=2018-01-30%2018:39:48garbage|5', 400, "2018-01-30 18:39:48garbage|5 is not a valid cursor"),
+        ('?cursor=2018-01-30%2018:39:48.796263garbage|5', 400,
+         "2018-01-30 18:39:48.796263garbage|5 is not a valid cursor")
     ])
-    async def test_source_param_with_bad_data(self, client, request_params, response_code, response_message, get_log_codes, loop):
+    async def test_source_param_with_bad_data(self, client, request_params, response_code, response_message, get_log_codes, loop, reset_cache):
         @asyncio.coroutine
         def async_mock_log():
             return get_log_codes
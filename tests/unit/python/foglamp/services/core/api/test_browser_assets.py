@@ -220,36 +220,41 @@ class TestBrowserAssets:
                 resp = await client.get('foglamp/asset/fogbench_humidity/summary')
                 assert 404 == resp.status
                 assert 'fogbench_humidity asset_code not found' == resp.reason
-            query_patch.assert_called_once_with('{"return": ["reading"], "where": {"column": "asset_code", "condition": "=", "value": "fogbench_humidity"}}')
+            query_patch.assert_called_once_with('{"return": ["reading"], "where": {"column": "asset_code", "condition": "=", "value": "fogbench_humidity"}, "limit": 10, "sort": {"column": "user_ts", "direction": "desc"}}')
 
     async def test_asset_all_readings_summary(self, client):
-        @asyncio.coroutine
-        def q_result(*args):
-            if payload1 == args[0]:
-                return {'rows': [{'reading': {'humidity': 20}}], 'count': 1}
-            if payload2 == args[0]:
-                return {'count': 1, 'rows': [{'min': 13.0, 'max': 83.0, 'average': 33.5}]}
-
+        browser._summary_cache.clear()
+        result1 = {'rows': [{'reading': {'humidity': 20}}, {'reading': {'humidity': 21, 'temperature': 5}}], 'count': 2}
+        result2 = {'count': 1, 'rows': [{'min_0': 13.0, 'max_0': 83.0, 'avg_0': 33.5,
+                                         'min_1': 2.0, 'max_1': 8.0, 'avg_1': 5.0}]}
         payload1 = {"return": ["reading"],
-                    "where": {"column": "asset_code", "condition": "=", "value": "fogbench_humidity"}}
+                    "where": {"column": "asset_code", "condition": "=", "value": "fogbench_humidity"},
+                    "limit": 10, "sort": {"column": "user_ts", "direction": "desc"}}
         payload2 = {
-            "aggregate": [{"operation": "min", "json": {"properties": "humidity", "column": "reading"}, "alias": "min"},
-                          {"operation": "max", "json": {"properties": "humidity", "column": "reading"}, "alias": "max"},
-                          {"operation": "avg", "json": {"properties": "humidity", "column": "reading"},
-                           "alias": "average"}],
+            "aggregate": [{"operation": "min", "json": {"properties": "humidity", "column": "reading"}, "alias": "min_0"},
+                          {"operation": "max", "json": {"properties": "humidity", "column": "reading"}, "alias": "max_0"},
+                          {"operation": "avg", "json": {"properties": "humidity", "column": "reading"}, "alias": "avg_0"},
+                          {"operation": "min", "json": {"properties": "temperature", "column": "reading"}, "alias": "min_1"},
+                          {"operation": "max", "json": {"properties": "temperature", "column": "reading"}, "alias": "max_1"},
+                          {"operation": "avg", "json": {"properties": "temperature", "column": "reading"}, "alias": "avg_1"}],
             "where": {"column": "asset_code", "condition": "=", "value": "fogbench_humidity"}, "limit": 20}
 
         readings_storage_client_mock = MagicMock(ReadingsStorageClientAsync)
         with patch.object(connect, 'get_readings_async', return_value=readings_storage_client_mock):
-            with patch.object(readings_storage_client_mock, 'query', side_effect=[q_result(payload1), q_result(payload2)]) as patch_query:
+            with patch.object(readings_storage_client_mock, 'query', side_effect=[mock_coro(result1), mock_coro(result2)]) as patch_query:
                 resp = await client.get('foglamp/asset/fogbench_humidity/summary')
                 assert 200 == resp.status
                 r = await resp.text()
                 json_response = json.loads(r)
-                assert [{'humidity': {'average': 33.5, 'max': 83.0, 'min': 13.0}}] == json_response
+                assert [{'humidity': {'average': 33.5, 'max': 83.0, 'min': 13.0}},
+                        {'temperature': {'average': 5.0, 'max': 8.0, 'min': 2.0}}] == json_response
+                # served from the cache within the TTL
+                resp = await client.get('foglamp/asset/fogbench_humidity/summary')
+                assert 200 == resp.status
+                assert json_response == json.loads(await resp.text())
             assert 2 == patch_query.call_count
             args0, kwargs0 = patch_query.call_args_list[0]
             args1, kwargs1 = patch_query.call_args_list[1]
-            assert '{"return": ["reading"], "where": {"column": "asset_code", "condition": "=", "value": "fogbench_humidity"}}' in args0
-            # FIXME: ordering issue and add tests for datetimeunits request param
-            # assert '{"aggregate": [{"operation": "min", "json": {"column": "reading", "properties": "humidity"}, "alias": "min"}, {"operation": "max", "json": {"column": "reading", "properties": "humidity"}, "alias": "max"}, {"operation": "avg", "json": {"column": "reading", "properties": "humidity"}, "alias": "average"}], "where": {"column": "asset_code", "condition": "=", "value": "fogbench_humidity"}, "limit": 20}' in args1
+            assert payload1 == json.loads(args0[0])
+            assert payload2 == json.loads(args1[0])
+        browser._summary_cache.clear()
@@ -688,3 +688,41 @@ class TestConfiguration:
                     assert result == json_response
                 patch_get_all_items.assert_called_once_with(category_name)
             patch_update_bulk.assert_called_once_with(category_name, payload)
+
+    async def test_get_configuration_cache(self, client, reset_singleton):
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        c_mgr = ConfigurationManager(storage_client_mock)
+        c_mgr._cacheManager.update('rest_api', {})
+        assert 'rest_api' in c_mgr._cacheManager
+        assert 'service' not in c_mgr._cacheManager
+        with patch.object(connect, 'get_storage_async', return_value=storage_client_mock):
+            resp = await client.get('/foglamp/configuration/cache')
+            assert 200 == resp.status
+            r = await resp.text()
+            json_response = json.loads(r)
+            assert {'size': 1, 'maxSize': 10, 'hit': 1, 'miss': 1, 'hitRate': 0.5,
+                    'treeSize': 0, 'treeHit': 0, 'treeMiss': 0, 'treeHitRate': 0} == json_response
+
+    @pytest.mark.parametrize("payload", [
+        {}, {"maxSize": 0}, {"maxSize": "20"}, {"maxSize": True}
+    ])
+    async def test_set_configuration_cache_bad_request(self, client, reset_singleton, payload):
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        with patch.object(connect, 'get_storage_async', return_value=storage_client_mock):
+            resp = await client.put('/foglamp/configuration/cache', data=json.dumps(payload))
+            assert 400 == resp.status
+            assert 'maxSize must be a positive integer' == resp.reason
+
+    async def test_set_configuration_cache(self, client, reset_singleton):
+        storage_client_mock = MagicMock(spec=StorageClientAsync)
+        c_mgr = ConfigurationManager(storage_client_mock)
+        for i in range(5):
+            c_mgr._cacheManager.update('cat{}'.format(i), {})
+        with patch.object(connect, 'get_storage_async', return_value=storage_client_mock):
+            resp = await client.put('/foglamp/configuration/cache', data=json.dumps({"maxSize": 3}))
+            assert 200 == resp.status
+            r = await resp.text()
+            json_response = json.loads(r)
+            assert 3 == json_response['size']
+            assert 3 == json_response['maxSize']
+        assert ['cat2', 'cat3', 'cat4'] == list(c_mgr._cacheManager.cache)
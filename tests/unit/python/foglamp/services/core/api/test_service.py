@@ -118,6 +118,18 @@ class TestService:
             }
         assert 6 == log_patch_info.call_count
 
+    async def test_get_health_with_monitor(self, client):
+        with patch.object(ServiceRegistry._logger, 'info'):
+            s_id = ServiceRegistry.register('name1', 'Storage', 'address1', 1, 1, 'protocol1')
+        monitor = MagicMock(round_duration=12.5, ping_rtts={s_id: [2.1, 3.4]})
+        with patch.object(server.Server, 'service_monitor', monitor):
+            resp = await client.get('/foglamp/service')
+            assert 200 == resp.status
+            result = await resp.text()
+            json_response = json.loads(result)
+        assert {'round_duration': 12.5, 'ping_rtt': {'name1': [2.1, 3.4]}} == json_response['monitor']
+        assert 1 == len(json_response['services'])
+
     @pytest.mark.parametrize("payload, code, message", [
         ('"blah"', 400, "Data payload must be a valid JSON"''),
         ('{}', 400, "Missing name property in payload."),
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+import json
+from unittest.mock import MagicMock, patch
+from aiohttp import web
+import pytest
+
+from foglamp.services.core import routes
+from foglamp.services.core import connect
+from foglamp.services.core.api import south
+from foglamp.services.core.service_registry.service_registry import ServiceRegistry
+from foglamp.common.storage_client.storage_client import StorageClientAsync, ReadingsStorageClientAsync
+from foglamp.common.configuration_manager import ConfigurationManager
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+
+async def mock_coro(value):
+    return value
+
+
+@pytest.allure.feature("unit")
+@pytest.allure.story("api", "south")
+class TestSouth:
+    def setup_method(self):
+        ServiceRegistry._registry = list()
+        south._asset_counts['expiry'] = 0
+
+    def teardown_method(self):
+        ServiceRegistry._registry = list()
+
+    @pytest.fixture
+    def client(self, loop, test_client):
+        app = web.Application(loop=loop)
+        # fill the routes table
+        routes.setup(app)
+        return loop.run_until_complete(test_client(app))
+
+    async def test_get_south_services_no_category(self, client):
+        storage_client_mock = MagicMock(StorageClientAsync)
+        with patch.object(connect, 'get_storage_async', return_value=storage_client_mock):
+            with patch.object(ConfigurationManager, 'get_category_child', side_effect=ValueError):
+                resp = await client.get('/foglamp/south')
+                assert 200 == resp.status
+                assert {'services': []} == json.loads(await resp.text())
+
+    async def test_get_south_services(self, client):
+        def q_result(table, payload):
+            if table == 'schedules':
+                return mock_coro({'count': 2, 'rows': [{'schedule_name': 'Sine', 'enabled': 't'},
+                                                       {'schedule_name': 'Random', 'enabled': 'f'}]})
+            if table == 'asset_tracker':
+                return mock_coro({'count': 3, 'rows': [{'service': 'Sine', 'asset': 'sinusoid'},
+                                                       {'service': 'Sine', 'asset': 'unread'},
+                                                       {'service': 'Random', 'asset': 'random'}]})
+
+        ServiceRegistry.register('Sine', 'Southbound', '127.0.0.1', 8090, 1090)
+        storage_client_mock = MagicMock(StorageClientAsync)
+        readings_client_mock = MagicMock(ReadingsStorageClientAsync)
+        with patch.object(connect, 'get_storage_async', return_value=storage_client_mock):
+            with patch.object(connect, 'get_readings_async', return_value=readings_client_mock):
+                with patch.object(ConfigurationManager, 'get_category_child',
+                                  side_effect=lambda name: mock_coro([{'key': 'Sine'}, {'key': 'Random'}])):
+                    with patch.object(storage_client_mock, 'query_tbl_with_payload', side_effect=q_result) as q_patch:
+                        with patch.object(readings_client_mock, 'query', side_effect=lambda payload: mock_coro(
+                                {'count': 2, 'rows': [{'asset_code': 'sinusoid', 'count': 10},
+                                                      {'asset_code': 'random', 'count': 5}]})) as query_patch:
+                            resp = await client.get('/foglamp/south')
+                            assert 200 == resp.status
+                            json_response = json.loads(await resp.text())
+                            # The asset counts are taken from the snapshot on the following requests
+                            resp = await client.get('/foglamp/south')
+                            assert 200 == resp.status
+                            assert json_response == json.loads(await resp.text())
+                        assert 1 == query_patch.call_count
+                        args, kwargs = query_patch.call_args
+                        assert {"aggregate": {"operation": "count", "column": "*", "alias": "count"},
+                                "group": "asset_code"} == json.loads(args[0])
+                    assert 4 == q_patch.call_count
+        services = json_response['services']
+        assert 2 == len(services)
+        assert 'Sine' == services[0]['name']
+        assert 'running' == services[0]['status']
+        assert [{'count': 10, 'asset': 'sinusoid'}] == services[0]['assets']
+        assert services[0]['schedule_enabled'] is True
+        assert {'name': 'Random', 'address': '', 'management_port': '', 'service_port': '', 'protocol': '',
+                'status': '', 'assets': [{'count': 5, 'asset': 'random'}], 'schedule_enabled': False} == services[1]
@@ -16,6 +16,7 @@ import pytest
 from foglamp.services.core.scheduler.scheduler import Scheduler, AuditLogger, ConfigurationManager
 from foglamp.services.core.scheduler.entities import *
 from foglamp.services.core.scheduler.exceptions import *
+from foglamp.services.core.scheduler.warm_worker_pool import WarmWorkerPool
 from foglamp.common.storage_client.storage_client import StorageClientAsync
 
 __author__ = "Amarendra K Sinha"
@@ -201,6 +202,40 @@ class TestScheduler:
         assert 'OMF to PI north' in args
         assert 'North Readings to PI' in args
 
+    @pytest.mark.parametrize("start_task_side_effect, subprocess_count", [
+        (lambda args: mock_process(), 0),
+        (EnvironmentError('The warm worker did not start the task'), 1)
+    ])
+    @pytest.mark.asyncio
+    async def test__start_task_warm_worker(self, mocker, start_task_side_effect, subprocess_count):
+        # GIVEN
+        scheduler = Scheduler()
+        scheduler._storage_async = MockStorageAsync(core_management_host=None, core_management_port=None)
+        mocker.patch.object(scheduler._logger, "info")
+        log_warning = mocker.patch.object(scheduler._logger, "warning")
+        schedule = scheduler._ScheduleRow(id=uuid.uuid4(), process_name="purge", name="purge", type=Schedule.Type.MANUAL,
+                                          repeat=None, repeat_seconds=None, time=None, day=None, exclusive=True,
+                                          enabled=True)
+        scheduler._schedule_executions[schedule.id] = scheduler._ScheduleExecution()
+        scheduler._process_scripts = {"purge": ["tasks/purge"]}
+        scheduler._warm_worker_pool = MagicMock(spec=WarmWorkerPool)
+        scheduler._warm_worker_pool.can_run.return_value = True
+        scheduler._warm_worker_pool.start_task.side_effect = start_task_side_effect
+        create_subprocess = mocker.patch.object(asyncio, 'create_subprocess_exec', side_effect=lambda *args, **kwargs: mock_process())
+        mocker.patch.object(scheduler, '_wait_for_task_completion', return_value=mock_task())
+
+        # WHEN
+        await scheduler._start_task(schedule)
+
+        # THEN
+        assert 1 == scheduler._warm_worker_pool.start_task.call_count
+        args, kwargs = scheduler._warm_worker_pool.start_task.call_args
+        assert "tasks/purge" == args[0][0]
+        assert "--name=purge" in args[0]
+        assert subprocess_count == create_subprocess.call_count
+        assert subprocess_count == log_warning.call_count
+        assert 1 == len(scheduler._schedule_executions[schedule.id].task_processes)
+
     @pytest.mark.asyncio
     async def test_purge_tasks(self, mocker):
         # TODO: Mandatory - Add negative tests for full code coverage
@@ -263,6 +298,112 @@ class TestScheduler:
         assert 'COAP listener south' in args1
         assert 'OMF to PI north' in args2
 
+    @pytest.mark.asyncio
+    async def test__check_schedules_timer_heap(self, mocker):
+        # GIVEN
+        scheduler = Scheduler()
+        log_info = mocker.patch.object(scheduler._logger, "info")
+        current_time = time.time()
+        mocker.patch.multiple(scheduler, _max_running_tasks=10, _start_time=current_time, _ready=True)
+
+        def interval_schedule(name, repeat_seconds, exclusive):
+            return scheduler._ScheduleRow(id=uuid.uuid4(), name=name, type=Schedule.Type.INTERVAL, time=None, day=None,
+                                          repeat=datetime.timedelta(seconds=repeat_seconds),
+                                          repeat_seconds=repeat_seconds, exclusive=exclusive, enabled=True,
+                                          process_name='test')
+
+        schedules = [interval_schedule('every 10', 10, False), interval_schedule('every 20', 20, True),
+                     interval_schedule('every 30', 30, False)]
+        for schedule in schedules:
+            scheduler._schedules[schedule.id] = schedule
+            scheduler._schedule_first_task(schedule, current_time)
+
+        started = []
+
+        async def start_task(schedule):
+            started.append(schedule.name)
+
+        mocker.patch.object(scheduler, '_start_task', side_effect=start_task)
+
+        # WHEN
+        scheduler.current_time = current_time + 20
+        earliest_start_time = await scheduler._check_schedules()
+
+        # THEN
+        # The nonexclusive schedule is pushed again, the exclusive one when its task completes
+        assert ['every 10', 'every 20'] == started
+        assert current_time + 20 == earliest_start_time
+
+        # WHEN
+        # The schedule at current_time + 30 is moved later, its heap entry is superseded
+        schedule_execution = scheduler._schedule_executions[schedules[2].id]
+        schedule_execution.next_start_time = current_time + 100
+        scheduler._push_schedule(schedules[2].id, schedule_execution)
+        await scheduler.queue_task(schedules[1].id)
+        scheduler.current_time = current_time + 40
+        started.clear()
+        earliest_start_time = await scheduler._check_schedules()
+
+        # THEN
+        assert ['every 20', 'every 10'] == started
+        assert current_time + 30 == earliest_start_time
+        assert not scheduler._start_now_schedules
+
+    @pytest.mark.asyncio
+    async def test__check_schedules_queued_and_due(self, mocker):
+        # GIVEN
+        scheduler = Scheduler()
+        log_info = mocker.patch.object(scheduler._logger, "info")
+        current_time = time.time()
+        mocker.patch.multiple(scheduler, _max_running_tasks=10, _start_time=current_time, _ready=True)
+        schedule = scheduler._ScheduleRow(id=uuid.uuid4(), name='every 10', type=Schedule.Type.INTERVAL, time=None,
+                                          day=None, repeat=datetime.timedelta(seconds=10), repeat_seconds=10,
+                                          exclusive=False, enabled=True, process_name='test')
+        scheduler._schedules[schedule.id] = schedule
+        scheduler._schedule_first_task(schedule, current_time)
+
+        started = []
+
+        async def start_task(schedule):
+            started.append(schedule.name)
+
+        mocker.patch.object(scheduler, '_start_task', side_effect=start_task)
+        mocker.patch.object(scheduler, '_resume_check_schedules')
+        await scheduler.queue_task(schedule.id)
+
+        # WHEN
+        scheduler.current_time = current_time + 10
+        earliest_start_time = await scheduler._check_schedules()
+
+        # THEN
+        # The queued manual execution stands for the due one, the next run is still scheduled
+        assert ['every 10'] == started
+        assert current_time + 20 == earliest_start_time
+        assert not scheduler._start_now_schedules
+
+    @pytest.mark.asyncio
+    async def test__check_schedules_max_running_tasks(self, mocker):
+        # GIVEN
+        scheduler = Scheduler()
+        log_info = mocker.patch.object(scheduler._logger, "info")
+        current_time = time.time()
+        mocker.patch.multiple(scheduler, _max_running_tasks=0, _start_time=current_time)
+        schedule = scheduler._ScheduleRow(id=uuid.uuid4(), name='startup', type=Schedule.Type.STARTUP, time=None,
+                                          day=None, repeat=None, repeat_seconds=None, exclusive=True, enabled=True,
+                                          process_name='test')
+        scheduler._schedules[schedule.id] = schedule
+        scheduler._schedule_first_task(schedule, current_time)
+        start_task = mocker.patch.object(scheduler, '_start_task', return_value=asyncio.ensure_future(mock_task()))
+
+        # WHEN
+        earliest_start_time = await scheduler._check_schedules()
+
+        # THEN
+        # The due schedule stays queued until a task completes
+        assert earliest_start_time is None
+        start_task.assert_not_called()
+        assert [current_time] == [entry[0] for entry in scheduler._schedule_heap]
+
     @pytest.mark.asyncio
     @pytest.mark.skip("_scheduler_loop() not suitable for unit testing. Will be tested during System tests.")
     async def test__scheduler_loop(self, mocker):
@@ -494,6 +635,12 @@ class TestScheduler:
                         "default": str(Scheduler._DEFAULT_MAX_COMPLETED_TASK_AGE_DAYS),
                         "value": str(Scheduler._DEFAULT_MAX_COMPLETED_TASK_AGE_DAYS)
                     },
+                    "warm_workers": {
+                        "description": "Start the Python tasks from a pre-forked worker process",
+                        "type": "boolean",
+                        "default": "false",
+                        "value": "true"
+                    },
             }
         # GIVEN
         scheduler = Scheduler()
@@ -512,6 +659,7 @@ class TestScheduler:
         assert 1 == get_cat.call_count
         assert scheduler._max_running_tasks is not None
         assert scheduler._max_completed_task_age is not None
+        assert scheduler._warm_workers_enabled is True
 
     @pytest.mark.asyncio
     async def test_start(self, mocker):
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# FOGLAMP_BEGIN
+# See: http://foglamp.readthedocs.io/
+# FOGLAMP_END
+
+import asyncio
+import os
+import signal
+import sys
+import textwrap
+
+import pytest
+
+from foglamp.services.core.scheduler.warm_worker_pool import WarmWorkerPool
+
+__copyright__ = "Copyright (c) 2018 OSIsoft, LLC"
+__license__ = "Apache 2.0"
+__version__ = "${VERSION}"
+
+# Runs the warm worker with stand-in task modules instead of the FogLAMP tasks
+_WORKER_SCRIPT = textwrap.dedent("""
+    import sys
+    from foglamp.tasks.common import warm_worker
+    warm_worker.TASK_MODULES.clear()
+    warm_worker.TASK_MODULES.update({'tasks/exit': 'warm_task_exit', 'tasks/sleep': 'warm_task_sleep',
+                                    'tasks/log': 'warm_task_log'})
+    warm_worker._PRELOAD_MODULES[:] = ['warm_task_exit']
+    worker = warm_worker.WarmWorker(sys.argv[1])
+    worker.preload()
+    worker.serve_forever()
+""")
+
+
+@pytest.fixture
+async def warm_worker_pool(tmpdir):
+    tmpdir.join('warm_task_exit.py').write('import sys\nif __name__ == "__main__":\n    sys.exit(int(sys.argv[1]))\n')
+    tmpdir.join('warm_task_sleep.py').write('import time\ntime.sleep(30)\n')
+    tmpdir.join('warm_task_log.py').write(textwrap.dedent("""
+        import sys
+        from foglamp.common import logger
+        sys.stdout = open(sys.argv[1], 'w')
+        _logger = logger.setup('warm_task_log', destination=logger.CONSOLE, queued=True)
+        for i in range(1000):
+            _logger.warning('entry %d', i)
+    """))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([str(tmpdir)] + sys.path)
+
+    pool = WarmWorkerPool()
+    pool._socket_dir = str(tmpdir)
+    pool._socket_path = str(tmpdir.join('worker.sock'))
+    pool._process = await asyncio.create_subprocess_exec(sys.executable, '-c', _WORKER_SCRIPT, pool._socket_path,
+                                                         env=env)
+    for _ in range(100):
+        if os.path.exists(pool._socket_path):
+            break
+        await asyncio.sleep(.1)
+    yield pool
+    await pool._stop_process()
+
+
+@pytest.allure.feature("unit")
+@pytest.allure.story("scheduler", "warm-worker")
+class TestWarmWorkerPool:
+
+    def test_can_run(self):
+        assert WarmWorkerPool.can_run(["tasks/purge", "--name=purge"]) is True
+        assert WarmWorkerPool.can_run(["tasks/north", "--stream_id", "1"]) is True
+        assert WarmWorkerPool.can_run(["tasks/backup"]) is False
+        assert WarmWorkerPool.can_run([]) is False
+
+    @pytest.mark.asyncio
+    async def test_exit_code(self, warm_worker_pool):
+        processes = [await warm_worker_pool.start_task(["tasks/exit", str(exit_code)]) for exit_code in (0, 3)]
+        assert processes[0].pid != processes[1].pid
+        assert [0, 3] == [await process.wait() for process in processes]
+        assert 3 == processes[1].returncode
+
+    @pytest.mark.asyncio
+    async def test_queued_log_entries_sent(self, warm_worker_pool, tmpdir):
+        log_path = str(tmpdir.join('task.log'))
+        process = await warm_worker_pool.start_task(["tasks/log", log_path])
+        assert 0 == await process.wait()
+        with open(log_path) as f:
+            lines = f.read().splitlines()
+        assert 1000 == len(lines)
+        assert lines[-1].endswith('entry 999')
+
+    @pytest.mark.asyncio
+    async def test_terminate(self, warm_worker_pool):
+        process = await warm_worker_pool.start_task(["tasks/sleep"])
+        process.terminate()
+        assert -signal.SIGTERM == await process.wait()
+
+    @pytest.mark.asyncio
+    async def test_unknown_task(self, warm_worker_pool):
+        with pytest.raises(EnvironmentError):
+            await warm_worker_pool.start_task(["tasks/unknown"])
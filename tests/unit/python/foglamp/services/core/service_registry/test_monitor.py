@@ -108,3 +108,73 @@ class TestMonitor:
                 assert excinfo.type in [TestMonitorException, TypeError]
 
         assert ServiceRegistry.get(idx=s_id_1)[0]._status is ServiceRecord.Status.Failed
+
+    @pytest.mark.asyncio
+    async def test__monitor_concurrent_pings(self):
+        class AsyncSessionContextManagerMock(MagicMock):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+
+            async def __aenter__(self):
+                await asyncio.sleep(0.2)
+                client_response_mock = MagicMock(spec=aiohttp.ClientResponse)
+                client_response_mock.text.side_effect = lambda: asyncio.sleep(0, '{"uptime": "bla"}')
+                return client_response_mock
+
+            async def __aexit__(self, *args):
+                return None
+
+        class TestMonitorException(Exception):
+            pass
+
+        with patch.object(ServiceRegistry._logger, 'info'):
+            s_ids = [ServiceRegistry.register('sname{}'.format(i), 'Southbound', 'saddress{}'.format(i), i, i,
+                                              'protocol{}'.format(i)) for i in range(1, 4)]
+        monitor = Monitor()
+        monitor._sleep_interval = Monitor._DEFAULT_SLEEP_INTERVAL
+        monitor._max_attempts = Monitor._DEFAULT_MAX_ATTEMPTS
+
+        with patch.object(Monitor, '_sleep', side_effect=TestMonitorException()):
+            with patch.object(aiohttp.ClientSession, 'get', return_value=AsyncSessionContextManagerMock()):
+                with pytest.raises(TestMonitorException):
+                    await monitor._monitor_loop()
+
+        # the services are pinged at the same time, so the round lasts about as long as one ping
+        assert 200 <= monitor.round_duration < 500
+        for s_id in s_ids:
+            assert ServiceRegistry.get(idx=s_id)[0]._status is ServiceRecord.Status.Running
+            assert 1 == len(monitor.ping_rtts[s_id])
+            assert 200 <= monitor.ping_rtts[s_id][0] < 500
+
+    @pytest.mark.asyncio
+    async def test__monitor_status_changed_during_round(self):
+        class TestMonitorException(Exception):
+            pass
+
+        with patch.object(ServiceRegistry._logger, 'info'):
+            s_id = ServiceRegistry.register('sname1', 'Southbound', 'saddress1', 1, 1, 'protocol1')
+        service_record = ServiceRegistry.get(idx=s_id)[0]
+
+        class AsyncSessionContextManagerMock(MagicMock):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+
+            async def __aenter__(self):
+                # the service is unregistered while it is pinged, its ping fails
+                service_record._status = ServiceRecord.Status.Shutdown
+                raise aiohttp.ClientConnectorError(MagicMock(), ConnectionRefusedError(111, 'Connection refused'))
+
+            async def __aexit__(self, *args):
+                return None
+
+        monitor = Monitor()
+        monitor._sleep_interval = Monitor._DEFAULT_SLEEP_INTERVAL
+        monitor._max_attempts = Monitor._DEFAULT_MAX_ATTEMPTS
+
+        with patch.object(Monitor, '_sleep', side_effect=TestMonitorException()):
+            with patch.object(aiohttp.ClientSession, 'get', return_value=AsyncSessionContextManagerMock()):
+                with pytest.raises(TestMonitorException):
+                    await monitor._monitor_loop()
+
+        # the status set during the round is kept
+        assert service_record._status is ServiceRecord.Status.Shutdown
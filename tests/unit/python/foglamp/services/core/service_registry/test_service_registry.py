@@ -4,6 +4,7 @@
 # See: http://foglamp.readthedocs.io/
 # FOGLAMP_END
 
+import asyncio
 from unittest.mock import patch
 import pytest
 
@@ -22,9 +23,11 @@ class TestServiceRegistry:
 
     def setup_method(self):
         ServiceRegistry._registry = list()
+        ServiceRegistry._waiters = dict()
 
     def teardown_method(self):
         ServiceRegistry._registry = list()
+        ServiceRegistry._waiters = dict()
 
     def test_register(self):
         with patch.object(ServiceRegistry._logger, 'info') as log_info:
@@ -153,3 +156,23 @@ class TestServiceRegistry:
                 assert 0 == len(ServiceRegistry._registry)
             assert 0 == log_info.call_count
         assert excinfo.type is DoesNotExist
+
+    def test_wait_for_registered(self):
+        with patch.object(ServiceRegistry._logger, 'info'):
+            s_id = ServiceRegistry.register("A name", "Storage", "127.0.0.1", 1234, 4321, 'http')
+        waiter = ServiceRegistry.wait_for(name="A name", loop=asyncio.new_event_loop())
+        assert waiter.done()
+        assert s_id == waiter.result()._id
+        assert {} == ServiceRegistry._waiters
+
+    def test_wait_for_registration(self):
+        loop = asyncio.new_event_loop()
+        waiter = ServiceRegistry.wait_for(name="A name", loop=loop)
+        other_waiter = ServiceRegistry.wait_for(name="Another name", loop=loop)
+        assert not waiter.done()
+        with patch.object(ServiceRegistry._logger, 'info'):
+            s_id = ServiceRegistry.register("A name", "Storage", "127.0.0.1", 1234, 4321, 'http')
+        assert waiter.done()
+        assert s_id == waiter.result()._id
+        assert not other_waiter.done()
+        assert ["Another name"] == list(ServiceRegistry._waiters)
@@ -27,7 +27,8 @@ from foglamp.services.core.service_registry.service_registry import ServiceRegis
 from foglamp.common.service_record import ServiceRecord
 from foglamp.services.core.service_registry import exceptions as service_registry_exceptions
 from foglamp.services.core.api import configuration as conf_api
-from foglamp.common.storage_client.storage_client import StorageClientAsync
+from foglamp.services.core.api import asset_tracker as asset_tracker_api
+from foglamp.common.storage_client.storage_client import StorageClientAsync, ReadingsStorageClientAsync
 from foglamp.common.configuration_manager import ConfigurationManager
 from foglamp.common.audit_logger import AuditLogger
 
@@ -116,9 +117,48 @@ class TestServer:
         pass
 
     @pytest.mark.asyncio
-    @pytest.mark.skip(reason="To be implemented")
     async def test__get_storage_client(self):
-        pass
+        ServiceRegistry._registry = list()
+        ServiceRegistry._waiters = dict()
+        Server._storage_client_async = None
+        Server._readings_client_async = None
+        # storage registers after the core starts waiting for it
+        asyncio.get_event_loop().call_later(0.1, ServiceRegistry.register, "FogLAMP Storage", "Storage", "127.0.0.1", 1234, 4321)
+        with patch.object(StorageClientAsync, '__init__', return_value=None) as storage_patch:
+            with patch.object(ReadingsStorageClientAsync, '__init__', return_value=None) as readings_patch:
+                await asyncio.wait_for(Server._get_storage_client(), 1)
+        assert isinstance(Server._storage_client_async, StorageClientAsync)
+        assert isinstance(Server._readings_client_async, ReadingsStorageClientAsync)
+        args, kwargs = storage_patch.call_args
+        assert "FogLAMP Storage" == kwargs['svc']._name
+        assert 1 == readings_patch.call_count
+        Server._storage_client_async = None
+        Server._readings_client_async = None
+        ServiceRegistry._registry = list()
+
+    @pytest.mark.parametrize("readings, streams, update_count", [
+        ([{"id": 1}], [{"id": 1}], 0),
+        ([], [{"id": 1}], 1),
+        ([], [], 0)
+    ])
+    def test__check_readings_table(self, readings, streams, update_count):
+        async def mock_coro(value):
+            return value
+
+        loop = asyncio.new_event_loop()
+        Server._readings_client_async = MagicMock(ReadingsStorageClientAsync)
+        Server._storage_client_async = MagicMock(StorageClientAsync)
+        with patch.object(Server._readings_client_async, 'query', side_effect=lambda *args: mock_coro({"rows": readings})) as query_patch:
+            with patch.object(Server._storage_client_async, 'query_tbl_with_payload', side_effect=lambda *args: mock_coro({"rows": streams})):
+                with patch.object(Server._storage_client_async, 'update_tbl', side_effect=lambda *args: mock_coro({})) as update_patch:
+                    Server._check_readings_table(loop)
+        # an existence probe, not a count of the readings
+        args, kwargs = query_patch.call_args
+        assert {"return": ["id"], "limit": 1} == json.loads(args[0])
+        assert update_count == update_patch.call_count
+        Server._readings_client_async = None
+        Server._storage_client_async = None
+        loop.close()
 
     @pytest.mark.asyncio
     @pytest.mark.skip(reason="To be implemented")
@@ -426,6 +466,67 @@ class TestServer:
         args, kwargs = patch_reg_interest_reg.call_args
         assert (request_data['service'], request_data['category']) == args
 
+    async def test_bootstrap(self, client):
+        async def mock_coro(value=None):
+            return value
+
+        Server._storage_client_async = MagicMock(StorageClientAsync)
+        Server._interest_registry = InterestRegistry(ConfigurationManager(Server._storage_client_async))
+        service_id = 'c6bbf3c8-f43c-4b0f-ac48-f597f510da0b'
+        reg_id = 'a404852d-d91c-47bd-8860-d4ff81b6e8cb'
+        config = {'plugin': {'value': 'sinusoid'}}
+        track = [{'asset': 'sinusoid', 'event': 'Ingest', 'service': 'Sine', 'plugin': 'sinusoid'}]
+        request_data = {"categories": [{"key": "Sine", "description": "Sine", "value": {}},
+                                       {"key": "South", "description": "South microservices", "value": {},
+                                        "children": ["Sine"]}],
+                        "children": [{"parent": "Sine", "children": ["SineAdvanced"]}],
+                        "service_id": service_id, "interests": ["Sine"], "track": True}
+        with patch.object(ConfigurationManager, 'create_category', side_effect=lambda **kwargs: mock_coro()) as patch_create_cat:
+            with patch.object(ConfigurationManager, 'create_child_category', side_effect=lambda *args: mock_coro()) as patch_create_child:
+                with patch.object(ConfigurationManager, 'get_category_all_items', side_effect=lambda *args: mock_coro(config)):
+                    with patch.object(Server._interest_registry, 'register', return_value=reg_id) as patch_reg_interest:
+                        with patch.object(asset_tracker_api, 'get_asset_tracker_events',
+                                          side_effect=lambda *args: mock_coro(web.json_response({'track': track}))):
+                            resp = await client.post('/foglamp/service/bootstrap', data=json.dumps(request_data))
+                            assert 200 == resp.status
+                            r = await resp.text()
+                            json_response = json.loads(r)
+                            assert {'categories': {'Sine': config, 'South': config}, 'interests': {'Sine': reg_id},
+                                    'track': track} == json_response
+                    patch_reg_interest.assert_called_once_with(service_id, 'Sine')
+            assert [mock.call('South', ['Sine']), mock.call('Sine', ['SineAdvanced'])] == patch_create_child.call_args_list
+        assert 2 == patch_create_cat.call_count
+        args, kwargs = patch_create_cat.call_args_list[0]
+        assert {'category_name': 'Sine', 'category_description': 'Sine', 'category_value': {}, 'display_name': None,
+                'keep_original_items': True} == kwargs
+
+    async def test_bootstrap_register_service(self, client):
+        async def mock_coro(value=None):
+            return value
+
+        Server._storage_client_async = None
+        request_data = {"service": {"name": "Sine", "type": "Southbound", "address": "127.0.0.1",
+                                    "service_port": 8090, "management_port": 1090}}
+        service_id = 'c6bbf3c8-f43c-4b0f-ac48-f597f510da0b'
+        with patch.object(ServiceRegistry, 'register', return_value=service_id) as patch_register:
+            resp = await client.post('/foglamp/service/bootstrap', data=json.dumps(request_data))
+            assert 200 == resp.status
+            r = await resp.text()
+            json_response = json.loads(r)
+            assert {'categories': {}, 'service': {'id': service_id, 'message': 'Service registered successfully'}} \
+                == json_response
+        patch_register.assert_called_once_with('Sine', 'Southbound', '127.0.0.1', 8090, 1090, 'http')
+
+    @pytest.mark.parametrize("request_data, message", [
+        ([], "Data payload must be a dictionary"),
+        ({"categories": [{"key": "Sine"}]}, "'description'")
+    ])
+    async def test_bad_bootstrap(self, client, request_data, message):
+        Server._storage_client_async = MagicMock(StorageClientAsync)
+        resp = await client.post('/foglamp/service/bootstrap', data=json.dumps(request_data))
+        assert 400 == resp.status
+        assert message == resp.reason
+
     async def test_bad_uuid_unregister_interest(self, client):
         resp = await client.delete('/foglamp/interest/blah')
         assert 400 == resp.status
@@ -8,12 +8,14 @@
 
 """
 import copy
+import json
 import pytest
 from unittest.mock import MagicMock
 from foglamp.services.south.ingest import *
 from foglamp.services.south import ingest
+from foglamp.common.asset_tracker_cache import AssetTrackerCache
 from foglamp.common.storage_client.storage_client import StorageClientAsync, ReadingsStorageClientAsync
-from foglamp.common.microservice_management_client.microservice_management_client import MicroserviceManagementClient
+from foglamp.common.microservice_management_client.microservice_management_client import MicroserviceManagementClientAsync
 
 __author__ = "Amarendra K Sinha"
 __copyright__ = "Copyright (c) 2017 OSIsoft, LLC"
@@ -25,6 +27,10 @@ def mock_coro():
     yield from false_coro()
 
 
+async def value_coro(value):
+    return value
+
+
 async def false_coro():
     return True
 
@@ -50,6 +56,7 @@ class TestIngest:
         Ingest._readings_stats = 0  # type: int
         Ingest._discarded_readings_stats = 0  # type: int
         Ingest._sensor_stats = {}  # type: dict
+        Ingest._poll_overruns_stats = 0  # type: int
         Ingest._write_statistics_task = None  # type: asyncio.Task
         Ingest._write_statistics_sleep_task = None  # type: asyncio.Task
         Ingest._stop = False
@@ -70,6 +77,8 @@ class TestIngest:
         Ingest._readings_insert_batch_timeout_seconds = 1
         Ingest._max_readings_insert_batch_connection_idle_seconds = 60
         Ingest._max_readings_insert_batch_reconnect_wait_seconds = 10
+        Ingest._parent_service = MagicMock()
+        Ingest._asset_tracker = MagicMock(spec=AssetTrackerCache)
         Ingest.category = 'South'
         Ingest.default_config = {
             "readings_buffer_size": {
@@ -109,34 +118,33 @@ class TestIngest:
         }
 
     @pytest.mark.asyncio
-    async def test_read_config(self, mocker):
+    async def test_read_config(self):
         # GIVEN
-        Ingest.storage_async = MagicMock(spec=StorageClientAsync)
-        Ingest.readings_storage_async = MagicMock(spec=ReadingsStorageClientAsync)
-        mocker.patch.object(MicroserviceManagementClient, "__init__", return_value=None)
-        create_cfg = mocker.patch.object(MicroserviceManagementClient, "create_configuration_category", return_value=None)
-        get_cfg = mocker.patch.object(MicroserviceManagementClient, "get_configuration_category", return_value=get_cat(Ingest.default_config))
-        mocker.patch.object(MicroserviceManagementClient, "create_child_category", return_value=None)
-        Ingest._parent_service = MagicMock(_core_microservice_management_client=MicroserviceManagementClient())
+        new_config = get_cat(Ingest.default_config)
+        new_config['readings_insert_batch_size']['value'] = '50'
 
         # WHEN
-        await Ingest._read_config()
+        await Ingest._read_config(new_config)
 
         # THEN
-        assert 1 == create_cfg.call_count
-        assert 1 == get_cfg.call_count
-        new_config = get_cat(Ingest.default_config)
         assert Ingest._readings_buffer_size == int(new_config['readings_buffer_size']['value'])
         assert Ingest._max_concurrent_readings_inserts == \
                int(new_config['max_concurrent_readings_inserts']['value'])
-        assert Ingest._readings_insert_batch_size == int(new_config['readings_insert_batch_size']['value'])
+        assert 50 == Ingest._readings_insert_batch_size
         assert Ingest._readings_insert_batch_timeout_seconds == \
                int(new_config['readings_insert_batch_timeout_seconds']['value'])
         assert Ingest._max_readings_insert_batch_connection_idle_seconds == \
                int(new_config['max_readings_insert_batch_connection_idle_seconds']['value'])
         assert Ingest._max_readings_insert_batch_reconnect_wait_seconds == \
                int(new_config['max_readings_insert_batch_reconnect_wait_seconds']['value'])
-        
+
+    def test_config_category(self):
+        payload = Ingest.config_category('Sine')
+        assert 'SineAdvanced' == payload['key']
+        assert 'Sine South Service Ingest configuration' == payload['description']
+        assert payload['keep_original_items'] is True
+        assert sorted(Ingest.default_config.keys()) == sorted(payload['value'].keys())
+
     @pytest.mark.asyncio
     async def test_start(self, mocker):
 
@@ -147,6 +155,12 @@ class TestIngest:
             async def register(self, key, desc):
                 return None
 
+            def start_deferred_writes(self):
+                pass
+
+            async def stop_deferred_writes(self):
+                pass
+
         async def mock_create(storage):
             return mock_stat()
 
@@ -154,22 +168,16 @@ class TestIngest:
         mocker.patch.object(StorageClientAsync, "__init__", return_value=None)
         mocker.patch.object(ReadingsStorageClientAsync, "__init__", return_value=None)
         log_warning = mocker.patch.object(ingest._LOGGER, "warning")
-        mocker.patch.object(MicroserviceManagementClient, "__init__", return_value=None)
-        create_cfg = mocker.patch.object(MicroserviceManagementClient, "create_configuration_category", return_value=None)
-        get_cfg = mocker.patch.object(MicroserviceManagementClient, "get_configuration_category", return_value=get_cat(Ingest.default_config))
-        mocker.patch.object(MicroserviceManagementClient, "get_asset_tracker_events", return_value={'track':[]})
-        mocker.patch.object(MicroserviceManagementClient, "create_child_category", return_value=None)
+        mocker.patch.object(MicroserviceManagementClientAsync, "__init__", return_value=None)
         mocker.patch.object(statistics, "create_statistics", return_value=mock_create(None))
-        parent_service = MagicMock(_core_microservice_management_client=MicroserviceManagementClient())
+        parent_service = MagicMock(_core_microservice_management_client_async=MicroserviceManagementClientAsync())
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
 
         # WHEN
-        await Ingest.start(parent=parent_service)
+        await Ingest.start(parent=parent_service, config=get_cat(Ingest.default_config), track=[])
 
         # THEN
-        assert 1 == create_cfg.call_count
-        assert 1 == get_cfg.call_count
         assert Ingest._stop is False
         assert Ingest._started is True
         assert Ingest._readings_list_size == int(Ingest._readings_buffer_size / (
@@ -191,6 +199,12 @@ class TestIngest:
             async def register(self, key, desc):
                 return None
 
+            def start_deferred_writes(self):
+                pass
+
+            async def stop_deferred_writes(self):
+                pass
+
         async def mock_create(storage):
             return mock_stat()
 
@@ -198,24 +212,18 @@ class TestIngest:
         mocker.patch.object(StorageClientAsync, "__init__", return_value=None)
         mocker.patch.object(ReadingsStorageClientAsync, "__init__", return_value=None)
         log_exception = mocker.patch.object(ingest._LOGGER, "exception")
-        mocker.patch.object(MicroserviceManagementClient, "__init__", return_value=None)
-        create_cfg = mocker.patch.object(MicroserviceManagementClient, "create_configuration_category", return_value=None)
-        get_cfg = mocker.patch.object(MicroserviceManagementClient, "get_configuration_category", return_value=get_cat(Ingest.default_config))
-        mocker.patch.object(MicroserviceManagementClient, "get_asset_tracker_events", return_value={'track':[]})
-        mocker.patch.object(MicroserviceManagementClient, "create_child_category", return_value=None)
+        mocker.patch.object(MicroserviceManagementClientAsync, "__init__", return_value=None)
         mocker.patch.object(statistics, "create_statistics", return_value=mock_create(None))
-        parent_service = MagicMock(_core_microservice_management_client=MicroserviceManagementClient())
+        parent_service = MagicMock(_core_microservice_management_client_async=MicroserviceManagementClientAsync())
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
 
         # WHEN
-        await Ingest.start(parent=parent_service)
+        await Ingest.start(parent=parent_service, config=get_cat(Ingest.default_config), track=[])
         await asyncio.sleep(1)
         await Ingest.stop()
 
         # THEN
-        assert 1 == create_cfg.call_count
-        assert 1 == get_cfg.call_count
         assert Ingest._stop is True
         assert Ingest._started is False
         assert Ingest._insert_readings_wait_tasks is None
@@ -235,15 +243,105 @@ class TestIngest:
         # THEN
         assert 1 == Ingest._discarded_readings_stats
 
-    @pytest.mark.skip(reason="This method uses a while True loop. Investigate as to how to write unit test for an infinite loop.")
+    @pytest.mark.asyncio
+    async def test_increment_poll_overruns(self, mocker):
+        # GIVEN
+        # WHEN
+        Ingest.increment_poll_overruns()
+        Ingest.increment_poll_overruns(3)
+
+        # THEN
+        assert 4 == Ingest._poll_overruns_stats
+
     @pytest.mark.asyncio
     async def test__insert_readings(self, mocker):
-        pass
 
-    @pytest.mark.skip(reason="This method uses a while True loop. Investigate as to how to write unit test for an infinite loop.")
+        class mock_stat:
+            def __init__(self):
+                self.updates = []
+
+            async def register(self, key, desc):
+                return None
+
+            async def update_bulk(self, updates):
+                self.updates.append(updates)
+
+            def start_deferred_writes(self):
+                pass
+
+            async def stop_deferred_writes(self):
+                pass
+
+        class mock_readings_storage:
+            def __init__(self):
+                self.in_flight = 0
+                self.max_in_flight = 0
+                self.appended = []
+
+            async def append(self, payload):
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                await asyncio.sleep(0.1)
+                self.appended.extend(json.loads(payload)["readings"])
+                self.in_flight -= 1
+
+        stat = mock_stat()
+
+        async def mock_create(storage):
+            return stat
+
+        # GIVEN
+        Ingest._readings_insert_batch_timeout_seconds = 0.1
+        mocker.patch.object(MicroserviceManagementClientAsync, "__init__", return_value=None)
+        mocker.patch.object(MicroserviceManagementClientAsync, "create_asset_tracker_event",
+                            side_effect=lambda *args, **kwargs: value_coro(None))
+        mocker.patch.object(statistics, "create_statistics", return_value=mock_create(None))
+        readings_storage = mock_readings_storage()
+        parent_service = MagicMock(_core_microservice_management_client_async=MicroserviceManagementClientAsync(),
+                                   _readings_storage_async=readings_storage)
+        await Ingest.start(parent=parent_service, config=get_cat(Ingest.default_config), track=[])
+        assert Ingest._max_concurrent_readings_inserts == len(Ingest._insert_readings_tasks)
+
+        # WHEN
+        for i in range(Ingest._readings_buffer_size):
+            await Ingest.add_readings(asset='pump1', timestamp='2017-01-02T01:02:03.23232Z-05:00',
+                                      key=str(uuid.uuid4()), readings={"velocity": i})
+        await asyncio.sleep(0.05)
+        await Ingest.stop()
+
+        # THEN
+        # a full batch for each list was in flight at the same time
+        assert Ingest._max_concurrent_readings_inserts == readings_storage.max_in_flight
+        assert Ingest._readings_buffer_size == len(readings_storage.appended)
+        # every reading is appended exactly once
+        assert list(range(Ingest._readings_buffer_size)) == sorted(
+            r['reading']['velocity'] for r in readings_storage.appended)
+        assert Ingest._readings_buffer_size == sum(u['READINGS'] for u in stat.updates)
+        assert Ingest._readings_buffer_size == sum(u.get('PUMP1', 0) for u in stat.updates)
+        assert 0 == sum(u['DISCARDED'] for u in stat.updates)
+
     @pytest.mark.asyncio
     async def test_write_statistics(self, mocker):
-        pass
+        # GIVEN
+        Ingest._parent_service._name = 'sine'
+        Ingest.stats = MagicMock()
+        Ingest.stats.register = MagicMock(side_effect=lambda key, description: mock_coro())
+        Ingest.stats.update_bulk = MagicMock(side_effect=lambda updates: mock_coro())
+        Ingest._readings_stats = 5
+        Ingest._discarded_readings_stats = 1
+        Ingest._sensor_stats = {'SINUSOID': 5}
+        Ingest.increment_poll_overruns(2)
+
+        # WHEN
+        await Ingest._write_statistics()
+
+        # THEN
+        Ingest.stats.update_bulk.assert_called_once_with(
+            {'READINGS': 5, 'DISCARDED': 1, 'SINUSOID': 5, 'SINE_POLL_OVERRUNS': 2})
+        assert 2 == Ingest.stats.register.call_count
+        assert 0 == Ingest._readings_stats
+        assert 0 == Ingest._poll_overruns_stats
+        assert {'SINUSOID': 0} == Ingest._sensor_stats
 
     @pytest.mark.asyncio
     async def test_is_available_at_start(self, mocker):
@@ -257,7 +355,7 @@ class TestIngest:
         Ingest._readings_lists[0].append(mock_coro())
         log_warning = mocker.patch.object(ingest._LOGGER, "warning")
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
 
         # WHEN
         retval = Ingest.is_available()
@@ -278,7 +376,7 @@ class TestIngest:
         log_warning = mocker.patch.object(ingest._LOGGER, "warning")
         Ingest._stop = True
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
 
         # WHEN
         retval = Ingest.is_available()
@@ -300,7 +398,7 @@ class TestIngest:
         Ingest._readings_lists[0].append(mock_coro())
         log_warning = mocker.patch.object(ingest._LOGGER, "warning")
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
 
         # WHEN
         retval = Ingest.is_available()
@@ -334,9 +432,10 @@ class TestIngest:
         Ingest._readings_list_not_empty.append(asyncio.Event())
         Ingest._started = True
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
-        mocker.patch.object(MicroserviceManagementClient, "__init__", return_value=None)
-        mocker.patch.object(MicroserviceManagementClient, "create_asset_tracker_event", return_value=None)
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
+        mocker.patch.object(MicroserviceManagementClientAsync, "__init__", return_value=None)
+        mocker.patch.object(MicroserviceManagementClientAsync, "create_asset_tracker_event",
+                            side_effect=lambda *args, **kwargs: value_coro(None))
         assert 0 == len(Ingest._readings_lists[0])
         assert 'PUMP1' not in list(Ingest._sensor_stats.keys())
 
@@ -374,7 +473,7 @@ class TestIngest:
         Ingest._stop = True
         log_warning = mocker.patch.object(ingest._LOGGER, "warning")
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
         assert 0 == len(Ingest._readings_lists[0])
 
         # WHEN
@@ -412,7 +511,7 @@ class TestIngest:
         Ingest._readings_list_not_empty.append(asyncio.Event())
         Ingest._started = False
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
         assert 0 == len(Ingest._readings_lists[0])
 
         # WHEN
@@ -449,7 +548,7 @@ class TestIngest:
         Ingest._readings_list_not_empty.append(asyncio.Event())
         Ingest._started = True
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
         assert 0 == len(Ingest._readings_lists[0])
 
         # WHEN
@@ -520,9 +619,10 @@ class TestIngest:
         Ingest._readings_list_batch_size_reached.append(asyncio.Event())
         Ingest._started = True
         mocker.patch.object(Ingest, "_write_statistics", return_value=mock_coro())
-        mocker.patch.object(Ingest, "_insert_readings", return_value=mock_coro())
-        mocker.patch.object(MicroserviceManagementClient, "__init__", return_value=None)
-        mocker.patch.object(MicroserviceManagementClient, "create_asset_tracker_event", return_value=None)
+        mocker.patch.object(Ingest, "_insert_readings", side_effect=lambda list_index: mock_coro())
+        mocker.patch.object(MicroserviceManagementClientAsync, "__init__", return_value=None)
+        mocker.patch.object(MicroserviceManagementClientAsync, "create_asset_tracker_event",
+                            side_effect=lambda *args, **kwargs: value_coro(None))
 
         assert 0 == len(Ingest._readings_lists[0])
         assert 'PUMP1' not in list(Ingest._sensor_stats.keys())
@@ -541,3 +641,62 @@ class TestIngest:
         # THEN
         assert 1 == len(Ingest._readings_lists[0])
         assert 1 == len(Ingest._readings_lists[1])
+
+    @pytest.mark.asyncio
+    async def test_add_readings_bulk(self, mocker):
+        # GIVEN
+        data = [{"timestamp": "2017-01-02T01:02:03.23232Z-05:00", "asset": "pump1", "key": str(uuid.uuid4()),
+                 "readings": {"velocity": "500"}},
+                {"timestamp": "2017-01-02T01:02:03.23232Z-05:00", "asset": "pump1", "key": "not a uuid",
+                 "readings": {"velocity": "501"}},
+                {"timestamp": "2017-01-02T01:02:03.23232Z-05:00", "asset": "pump2", "key": None,
+                 "readings": {"velocity": "502"}},
+                {"timestamp": "2017-01-02T01:02:03.23232Z-05:00", "asset": "pump1", "key": None,
+                 "readings": {"velocity": "503"}}]
+        Ingest._max_concurrent_readings_inserts = 2
+        Ingest._readings_list_size = 2
+        Ingest._readings_insert_batch_size = 2
+        Ingest._current_readings_list_index = 0
+        Ingest._readings_lists = [[], []]
+        Ingest._readings_list_not_empty = [asyncio.Event(), asyncio.Event()]
+        Ingest._readings_list_batch_size_reached = [asyncio.Event(), asyncio.Event()]
+        Ingest._started = True
+        log_warning = mocker.patch.object(ingest._LOGGER, "warning")
+
+        # WHEN
+        await Ingest.add_readings_bulk(data)
+
+        # THEN
+        assert ['500', '502'] == [r['reading']['velocity'] for r in Ingest._readings_lists[0]]
+        assert ['503'] == [r['reading']['velocity'] for r in Ingest._readings_lists[1]]
+        assert Ingest._readings_list_batch_size_reached[0].is_set()
+        assert Ingest._readings_list_not_empty[1].is_set()
+        assert {'PUMP1': 2, 'PUMP2': 1} == Ingest._sensor_stats
+        assert 1 == Ingest._discarded_readings_stats
+        assert 3 == Ingest._asset_tracker.add.call_count
+        log_warning.assert_called_once_with('%s invalid readings discarded, last error: %s', 1,
+                                            'badly formed hexadecimal UUID string')
+
+    @pytest.mark.asyncio
+    async def test_add_readings_bulk_when_all_lists_full(self, mocker):
+        # GIVEN
+        data = [{"timestamp": "2017-01-02T01:02:03.23232Z-05:00", "asset": "pump1", "key": None,
+                 "readings": {"velocity": v}} for v in range(5)]
+        Ingest._max_concurrent_readings_inserts = 2
+        Ingest._readings_list_size = 1
+        Ingest._readings_insert_batch_size = 1
+        Ingest._current_readings_list_index = 0
+        Ingest._readings_lists = [[], []]
+        Ingest._readings_list_not_empty = [asyncio.Event(), asyncio.Event()]
+        Ingest._readings_list_batch_size_reached = [asyncio.Event(), asyncio.Event()]
+        Ingest._started = True
+        mocker.patch.object(ingest._LOGGER, "warning")
+
+        # WHEN
+        await Ingest.add_readings_bulk(data)
+
+        # THEN
+        assert 1 == len(Ingest._readings_lists[0])
+        assert 1 == len(Ingest._readings_lists[1])
+        assert {'PUMP1': 2} == Ingest._sensor_stats
+        assert 3 == Ingest._discarded_readings_stats
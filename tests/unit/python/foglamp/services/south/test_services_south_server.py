@@ -5,8 +5,12 @@
 # FOGLAMP_END
 
 import asyncio
+import concurrent.futures
 import copy
 import sys
+import threading
+import time
+import uuid
 from unittest.mock import MagicMock, Mock, call, patch
 import pytest
 
@@ -26,6 +30,13 @@ _TEST_CONFIG = {
         'description': 'Python module name of the plugin to load',
         'type': 'string',
         'default': 'test'
+    },
+    'poll_executor': {
+        'description': 'Run the plugin poll calls in a separate thread or process',
+        'type': 'enumeration',
+        'options': ['thread', 'process'],
+        'default': 'thread',
+        'value': 'thread'
     }
 }
 plugin_attrs = {
@@ -93,6 +104,10 @@ async def false_coro():
     return True
 
 
+async def value_coro(value):
+    return value
+
+
 @pytest.allure.feature("unit")
 @pytest.allure.story("south")
 class TestServicesSouthServer:
@@ -114,6 +129,14 @@ class TestServicesSouthServer:
         }
         south_server._core_microservice_management_client = Mock()
         south_server._core_microservice_management_client.configure_mock(**attrs)
+        async_attrs = {
+                    'get_configuration_category.side_effect': lambda **kwargs: value_coro(cat_get()),
+                    'bootstrap.side_effect': lambda *args: value_coro(
+                        {'categories': {'test': cat_get(), 'testAdvanced': cat_get()}, 'interests': {'test': 1234},
+                         'track': []})
+        }
+        south_server._core_microservice_management_client_async = Mock()
+        south_server._core_microservice_management_client_async.configure_mock(**async_attrs)
 
         mocker.patch.object(south_server, '_name', 'test')
 
@@ -141,10 +164,20 @@ class TestServicesSouthServer:
 
         # THEN
         assert 1 == ingest_start.call_count
-        ingest_start.assert_called_with(south_server)
+        ingest_start.assert_called_with(south_server, config=cat_get(), track=[])
         assert 1 == log_info.call_count
         assert 0 == log_exception.call_count
         assert south_server._task_main.done() is True
+        client = south_server._core_microservice_management_client_async
+        assert 2 == client.bootstrap.call_count
+        args, kwargs = client.bootstrap.call_args
+        assert ['test', 'testAdvanced'] == [category['key'] for category in args[0]['categories']]
+        assert 'poll_executor' not in args[0]['categories'][1]['value']
+        assert [{'parent': 'test', 'children': ['testAdvanced']}] == args[0]['children']
+        assert ['test'] == args[0]['interests']
+        assert args[0]['track'] is True
+        assert 0 == south_server._core_microservice_management_client.create_configuration_category.call_count
+        assert 0 == south_server._core_microservice_management_client.register_interest.call_count
 
     @pytest.mark.asyncio
     async def test__start_async_plugin_bad_plugin_value(self, mocker, loop):
@@ -241,7 +274,7 @@ class TestServicesSouthServer:
 
         # THEN
         assert 1 == ingest_start.call_count
-        ingest_start.assert_called_with(south_server)
+        ingest_start.assert_called_with(south_server, config=cat_get(), track=[])
         assert 1 == log_info.call_count
         assert 0 == log_warning.call_count
         assert south_server._task_main.done() is False  # because of exception occurred
@@ -351,6 +384,106 @@ class TestServicesSouthServer:
                  call('Stopped all polling tasks for plugin: test')]
         log_warning.assert_has_calls(calls, any_order=True)
 
+    def poll_fixture(self, mocker, plugin_poll, async_safe=False):
+        cat_get, south_server, ingest_start, log_exception, log_error, log_info, log_warning = self.south_fixture(mocker)
+        south_server._event_loop = asyncio.get_event_loop()
+        south_server._plugin = MagicMock()
+        south_server._plugin.plugin_poll.side_effect = plugin_poll
+        south_server._plugin_info = {'mode': 'poll', 'async_safe': async_safe}
+        south_server._plugin_handle = {'pollInterval': {'value': '100'}}
+        south_server._create_poll_executor({'poll_executor': {'value': 'thread'}})
+        return south_server
+
+    @pytest.mark.parametrize("async_safe, executor_expected", [(False, True), (True, False)])
+    @pytest.mark.asyncio
+    async def test__exec_plugin_poll_executor(self, loop, mocker, async_safe, executor_expected):
+        # GIVEN
+        poll_threads = []
+
+        def plugin_poll(handle):
+            poll_threads.append(threading.get_ident())
+            return {'asset': 'sinusoid', 'timestamp': '2018-10-16 00:00:00.000', 'key': str(uuid.uuid4()),
+                    'readings': {'sinusoid': 0.5}}
+
+        south_server = self.poll_fixture(mocker, plugin_poll, async_safe)
+        add_readings = mocker.patch.object(Ingest, 'add_readings', side_effect=lambda **kwargs: mock_coro())
+
+        # WHEN
+        task = asyncio.ensure_future(south_server._exec_plugin_poll())
+        await asyncio.sleep(.25)
+        task.cancel()
+        await task
+
+        # THEN
+        assert executor_expected == isinstance(south_server._poll_executor, concurrent.futures.ThreadPoolExecutor)
+        assert 3 == len(poll_threads)
+        assert executor_expected == (threading.get_ident() not in poll_threads)
+        assert 3 == add_readings.call_count
+        if south_server._poll_executor is not None:
+            south_server._poll_executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test__exec_plugin_poll_overrun(self, loop, mocker):
+        # GIVEN
+        def plugin_poll(handle):
+            time.sleep(.25)
+            return []
+
+        south_server = self.poll_fixture(mocker, plugin_poll)
+        increment_poll_overruns = mocker.patch.object(Ingest, 'increment_poll_overruns')
+
+        # WHEN
+        task = asyncio.ensure_future(south_server._exec_plugin_poll())
+        await asyncio.sleep(.3)
+        task.cancel()
+        await task
+
+        # THEN
+        # The poll lasts 2.5 poll intervals, the next poll is scheduled on the third interval
+        increment_poll_overruns.assert_called_once_with(2)
+        south_server._poll_executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test__call_after_poll(self, loop, mocker):
+        # GIVEN
+        calls = []
+
+        def plugin_poll(handle):
+            calls.append('poll start')
+            time.sleep(.2)
+            calls.append('poll end')
+            return []
+
+        south_server = self.poll_fixture(mocker, plugin_poll)
+        south_server._plugin.plugin_reconfigure.side_effect = lambda handle, config: calls.append('reconfigure')
+        task = asyncio.ensure_future(south_server._exec_plugin_poll())
+        await asyncio.sleep(.1)
+        # The poll keeps running in the executor once its task is cancelled
+        task.cancel()
+        await task
+
+        # WHEN
+        await south_server._call_after_poll(south_server._plugin.plugin_reconfigure, south_server._plugin_handle, {})
+
+        # THEN
+        assert ['poll start', 'poll end', 'reconfigure'] == calls
+        south_server._poll_executor.shutdown()
+
+    @pytest.mark.parametrize("process_safe, handle, process_expected", [
+        (True, {'pollInterval': {'value': '100'}}, True),
+        (False, {'pollInterval': {'value': '100'}}, False),
+        (True, {'pollInterval': {'value': '100'}, 'lock': threading.Lock()}, False)
+    ])
+    def test__create_poll_executor_process(self, mocker, process_safe, handle, process_expected):
+        cat_get, south_server, ingest_start, log_exception, log_error, log_info, log_warning = self.south_fixture(mocker)
+        south_server._plugin_info = {'mode': 'poll', 'process_safe': process_safe}
+        south_server._plugin_handle = handle
+        south_server._create_poll_executor({'poll_executor': {'value': 'process'}})
+        assert process_expected == isinstance(south_server._poll_executor, concurrent.futures.ProcessPoolExecutor)
+        assert (not process_expected) == isinstance(south_server._poll_executor, concurrent.futures.ThreadPoolExecutor)
+        assert (not process_expected) == log_warning.called
+        south_server._poll_executor.shutdown()
+
     @pytest.mark.asyncio
     async def test_run(self, mocker):
         """Not fit for Unit test"""
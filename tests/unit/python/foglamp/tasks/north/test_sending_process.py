@@ -16,6 +16,7 @@ import pytest
 
 import foglamp.tasks.north.sending_process as sp_module
 from foglamp.common.audit_logger import AuditLogger
+from foglamp.common.asset_tracker_cache import AssetTrackerCache
 from foglamp.common.storage_client.storage_client import StorageClientAsync, ReadingsStorageClientAsync
 from foglamp.tasks.north.sending_process import SendingProcess
 from foglamp.common.process import FoglampProcess, SilentArgParse, ArgumentParserError
@@ -249,6 +250,30 @@ async def test_handling_input_parameters(
 class TestSendingProcess:
     """Unit tests for the sending_process.py"""
 
+    @pytest.mark.parametrize("plugin_close_session", [True, False])
+    async def test_close_storage_connections(self, plugin_close_session, fixture_sp):
+        """ Tests that the connections of the plugin with the destination are closed before the storage ones """
+
+        sp = fixture_sp
+        calls = []
+
+        async def mock_plugin_close_session(handle):
+            calls.append(('plugin', handle))
+
+        async def mock_close_storage_connections(self):
+            calls.append(('storage',))
+
+        sp._plugin = MagicMock(spec=['plugin_shutdown'])
+        if plugin_close_session:
+            sp._plugin.plugin_close_session = mock_plugin_close_session
+        sp._plugin_handle = {'handle': 1}
+
+        with patch.object(FoglampProcess, 'close_storage_connections', mock_close_storage_connections):
+            await sp.close_storage_connections()
+
+        expected = [('plugin', {'handle': 1}), ('storage',)] if plugin_close_session else [('storage',)]
+        assert expected == calls
+
     @pytest.mark.parametrize(
         "p_stream_id, "
         "p_rows, "
@@ -957,7 +982,9 @@ class TestSendingProcess:
         start_time = time.time()
 
         with patch.object(sp, '_last_object_id_read', return_value=0):
-            await sp.send_data()
+            with patch.object(sp._core_microservice_management_client_async, 'get_asset_tracker_events',
+                              side_effect=lambda: mock_coro({'track': []})):
+                await sp.send_data()
 
         # It considers a reasonable tolerance
         elapsed_seconds = time.time() - start_time
@@ -1797,12 +1824,13 @@ class TestSendingProcess:
         SendingProcess._logger = MagicMock(spec=logging)
         sp._audit = MagicMock(spec=AuditLogger)
         sp._stream_id = 1
-        sp._tracked_assets = []
+        sp._asset_tracker = MagicMock(spec=AssetTrackerCache)
 
         # Configures properly the SendingProcess, enabling JQFilter
         sp._config = {
             'memory_buffer_size': p_buffer_size,
-            'plugin': 'pi_server'
+            'plugin': 'pi_server',
+            'maxConcurrentSends': 1
         }
 
         sp._config_from_manager = {
@@ -1979,12 +2007,13 @@ class TestSendingProcess:
         SendingProcess._logger = MagicMock(spec=logging)
         sp._audit = MagicMock(spec=AuditLogger)
         sp._stream_id = 1
-        sp._tracked_assets = []
+        sp._asset_tracker = MagicMock(spec=AssetTrackerCache)
 
         # Configures properly the SendingProcess, enabling JQFilter
         sp._config = {
             'memory_buffer_size': p_buffer_size,
-            'plugin': 'pi_server'
+            'plugin': 'pi_server',
+            'maxConcurrentSends': 1
         }
 
         sp._config_from_manager = {
@@ -2152,10 +2181,11 @@ class TestSendingProcess:
             return p_send_result[x]["data_sent"], p_send_result[x]["new_last_object_id"], p_send_result[x]["num_sent"]
 
         # Configures properly the SendingProcess, enabling JQFilter
-        fixture_sp._tracked_assets = []
+        fixture_sp._asset_tracker = MagicMock(spec=AssetTrackerCache)
         fixture_sp._config = {
             'memory_buffer_size': p_buffer_size,
-            'plugin': 'pi_server'
+            'plugin': 'pi_server',
+            'maxConcurrentSends': 1
         }
 
         # Allocates the in memory buffer
@@ -2196,6 +2226,71 @@ class TestSendingProcess:
 
         assert fixture_sp._memory_buffer == expected_buffer
 
+    @pytest.mark.asyncio
+    async def test_task_send_data_concurrent(self, event_loop, fixture_sp):
+        """ Unit tests - _task_send_data - the blocks are sent at the same time, the first one completes last
+            and the position is updated only once all of them are sent """
+
+        in_flight = []
+        max_in_flight = []
+
+        async def mock_send_rows(handle, rows, stream_id):
+            """ mock the sending operation, the first block is the slowest """
+            in_flight.append(rows)
+            max_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.5 if rows[0]["id"] == 1 else 0.1)
+            in_flight.remove(rows)
+            return True, rows[0]["id"], 1
+
+        fixture_sp._asset_tracker = MagicMock(spec=AssetTrackerCache)
+        fixture_sp._config = {
+            'memory_buffer_size': 3,
+            'plugin': 'pi_server',
+            'maxConcurrentSends': 3
+        }
+
+        fixture_sp._memory_buffer = [[{"id": x, "asset_code": "test_asset_code"}] for x in range(1, 4)]
+
+        with patch.object(fixture_sp, '_update_position_reached', return_value=mock_async_call()) \
+                as patched_update_position_reached:
+            with patch.object(fixture_sp._plugin, 'plugin_send', side_effect=mock_send_rows):
+                task_id = asyncio.ensure_future(fixture_sp._task_send_data())
+
+                # Lets the _task_send_data to run for a while
+                await asyncio.sleep(2)
+
+                # Tear down
+                fixture_sp._task_send_data_run = False
+                fixture_sp._task_fetch_data_sem.release()
+
+                await task_id
+
+        assert max(max_in_flight) == 3
+        assert fixture_sp._memory_buffer == [None, None, None]
+        patched_update_position_reached.assert_called_once_with(3, 3)
+
+    @pytest.mark.asyncio
+    async def test_send_block_partial(self, event_loop, fixture_sp):
+        """ Unit tests - _send_block - the plugin sends a part of the block, only the rows following it are sent again """
+
+        sent = []
+
+        async def mock_send_rows(handle, rows, stream_id):
+            sent.append([row["id"] for row in rows])
+            if len(sent) == 1:
+                return False, 2, 2
+            return True, 3, 1
+
+        fixture_sp._asset_tracker = MagicMock(spec=AssetTrackerCache)
+        fixture_sp._config = {'plugin': 'pi_server'}
+        fixture_sp.TASK_SEND_SLEEP = 0.01
+
+        with patch.object(fixture_sp._plugin, 'plugin_send', side_effect=mock_send_rows):
+            result = await fixture_sp._send_block([{"id": x, "asset_code": "test_asset_code"} for x in range(1, 4)])
+
+        assert [[1, 2, 3], [3]] == sent
+        assert (3, 3) == result
+
     @pytest.mark.asyncio
     async def test_update_position_reached(self, event_loop):
         """ Unit tests - _update_position_reached """
@@ -2266,6 +2361,7 @@ class TestSendingProcess:
                     "source": {"value": 'readings'},
                     "blockSize": {"value": "10"},
                     "memory_buffer_size": {"value": "10"},
+                    "maxConcurrentSends": {"value": "2"},
                     "sleepInterval": {"value": "10"},
                     "plugin": {"value": "omf"},
                     "stream_id": {"value": "1"}
@@ -2277,6 +2373,7 @@ class TestSendingProcess:
                     "source": 'readings',
                     "blockSize": 10,
                     "memory_buffer_size": 10,
+                    "maxConcurrentSends": 2,
                     "sleepInterval": 10,
                     "plugin": "omf",
                     "stream_id": 1
@@ -2305,6 +2402,7 @@ class TestSendingProcess:
         assert sp._config['source'] == expected_config['source']
         assert sp._config['blockSize'] == expected_config['blockSize']
         assert sp._config['memory_buffer_size'] == expected_config['memory_buffer_size']
+        assert sp._config['maxConcurrentSends'] == expected_config['maxConcurrentSends']
         assert sp._config['sleepInterval'] == expected_config['sleepInterval']
         assert sp._config['plugin'] == expected_config['plugin']
         assert sp._config['stream_id'] == expected_config['stream_id']
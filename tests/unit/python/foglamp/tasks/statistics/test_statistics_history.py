@@ -63,18 +63,16 @@ class TestStatisticsHistory:
                 assert "Bla" == payload["key"]
                 assert 1 == payload["value"]
 
-    async def test_update_previous_value(self):
+    async def test_bulk_update_previous_value(self):
         with patch.object(FoglampProcess, '__init__'):
             with patch.object(logger, "setup"):
                 sh = StatisticsHistory()
                 sh._storage_async = MagicMock(spec=StorageClientAsync)
                 with patch.object(sh._storage_async, "update_tbl", return_value=mock_coro(None)) as patch_storage:
-                    await sh._update_previous_value(key='Bla', value=1)
-                args, kwargs = patch_storage.call_args
-                assert "statistics" == args[0]
-                payload = ast.literal_eval(args[1])
-                assert "Bla" == payload["where"]["value"]
-                assert 1 == payload["values"]["previous_value"]
+                    await sh._bulk_update_previous_value({'Bla': 1, 'Foo': 2})
+                patch_storage.assert_called_once_with(
+                    "statistics", '{"updates": [{"values": {"previous_value": 1}, "where": {"column": "key", "condition": "=", "value": "Bla"}}, '
+                                  '{"values": {"previous_value": 2}, "where": {"column": "key", "condition": "=", "value": "Foo"}}]}')
 
     async def test_run(self):
         with patch.object(FoglampProcess, '__init__'):
@@ -86,15 +84,42 @@ class TestStatisticsHistory:
                                     'value': 0, 'key': 'PURGED', 'previous_value': 0,
                                     'ts': '2018-08-31 17:03:17.597055+05:30'},
                                    {'description': 'Readings received by FogLAMP',
-                                    'value': 0, 'key': 'READINGS', 'previous_value': 0,
+                                    'value': 10, 'key': 'READINGS', 'previous_value': 4,
                                     'ts': '2018-08-31 17:03:17.597055+05:30'
                                     }]
                           }
                 with patch.object(sh._storage_async, "query_tbl", return_value=mock_coro(retval)) as mock_keys:
-                    with patch.object(sh, "_insert_into_stats_history", return_value=mock_coro(None)) as mock_insert_history:
-                        with patch.object(sh, "_update_previous_value", return_value=mock_coro(None)) as mock_update:
+                    with patch.object(sh, "_insert_into_stats_history", side_effect=[mock_coro(None), mock_coro(None)]) as mock_insert_history:
+                        with patch.object(sh, "_bulk_update_previous_value", return_value=mock_coro(None)) as mock_update:
                             await sh.run()
-                        assert 2 == mock_update.call_count
+                        mock_update.assert_called_once_with({'PURGED': 0, 'READINGS': 10})
+                    assert 2 == mock_insert_history.call_count
                     args, kwargs = mock_insert_history.call_args
                     assert "READINGS" == kwargs["key"]
+                    assert 6 == kwargs["value"]
                 mock_keys.assert_called_once_with('statistics')
+
+    async def test_run_insert_error(self):
+        with patch.object(FoglampProcess, '__init__'):
+            with patch.object(logger, "setup"):
+                sh = StatisticsHistory()
+                sh._storage_async = MagicMock(spec=StorageClientAsync)
+                sh._logger = MagicMock()
+                retval = {'count': 2,
+                          'rows': [{'value': 3, 'key': 'PURGED', 'previous_value': 1},
+                                   {'value': 10, 'key': 'READINGS', 'previous_value': 4}]
+                          }
+
+                @asyncio.coroutine
+                def insert_error():
+                    raise RuntimeError('insert failed')
+
+                with patch.object(sh._storage_async, "query_tbl", return_value=mock_coro(retval)):
+                    with patch.object(sh, "_insert_into_stats_history", side_effect=[insert_error(), mock_coro(None)]):
+                        with patch.object(sh, "_bulk_update_previous_value", return_value=mock_coro(None)) as mock_update:
+                            with pytest.raises(RuntimeError):
+                                await sh.run()
+                # The previous value of the key not stored is left, its delta is stored with the next run
+                mock_update.assert_called_once_with({'READINGS': 10})
+                sh._logger.error.assert_called_once_with("Unable to store the statistics history of %s: %s",
+                                                         'PURGED', 'insert failed')